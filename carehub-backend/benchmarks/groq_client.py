@@ -0,0 +1,109 @@
+"""
+Benchmark the per-call overhead of building a GROQ client and prompt.
+
+Compares the old per-request setup (read system_prompt.txt from disk, build a
+new Groq client and HTTP connection) against the shared pooled client and the
+preloaded prompt template, both talking to a local stub LLM server.
+
+Usage:
+    python -m benchmarks.groq_client [--calls 200] [--latency-ms 0]
+"""
+import argparse
+import json
+import statistics
+import time
+from django.conf import settings
+
+from benchmarks.stub_llm import StubLLMServer
+
+MEDICAL_DATA = {"medicine_info": {"name": "Paracetamol"}, "alternatives": [], "contraindications": []}
+PATIENT_INFO = {"age": 40, "allergies": ["penicillin"]}
+
+
+def _completion(client, system_prompt):
+    return client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "Provide medicine recommendations for Paracetamol"},
+        ],
+        model="mixtral-8x7b-32768",
+        temperature=0.3,
+        max_tokens=2000,
+        response_format={"type": "json_object"},
+    )
+
+
+def per_call_setup(base_url):
+    """The pre-pooling code path: reload prompt and build a client every call."""
+    from groq import Groq
+    from recommendations.llm import SYSTEM_PROMPT_PATH, PromptTemplate
+
+    with open(SYSTEM_PROMPT_PATH, 'r') as f:
+        template = PromptTemplate(f.read(), ['medical_data', 'patient_info', 'medicine_name'])
+    system_prompt = template.render(
+        medical_data=json.dumps(MEDICAL_DATA, indent=2),
+        patient_info=json.dumps(PATIENT_INFO, indent=2),
+        medicine_name='Paracetamol',
+    )
+    client = Groq(api_key='stub', base_url=base_url)
+    try:
+        _completion(client, system_prompt)
+    finally:
+        client.close()
+
+
+def pooled(base_url):
+    """The current code path: shared client and preloaded prompt."""
+    from recommendations.llm import SYSTEM_PROMPT, get_groq_client
+
+    system_prompt = SYSTEM_PROMPT.render(
+        medical_data=json.dumps(MEDICAL_DATA, indent=2),
+        patient_info=json.dumps(PATIENT_INFO, indent=2),
+        medicine_name='Paracetamol',
+    )
+    _completion(get_groq_client(), system_prompt)
+
+
+def run(fn, base_url, calls):
+    fn(base_url)  # Warm up imports and the connection pool
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn(base_url)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<16} mean={statistics.mean(timings):7.2f}ms  "
+          f"p50={statistics.median(timings):7.2f}ms  p95={p95:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--latency-ms', type=int, default=0, help='Artificial stub LLM latency')
+    args = parser.parse_args()
+
+    with StubLLMServer(latency_ms=args.latency_ms) as server:
+        if not settings.configured:
+            settings.configure(
+                GROQ_API_KEY='stub',
+                GROQ_BASE_URL=server.base_url,
+                GROQ_MAX_CONNECTIONS=20,
+                GROQ_KEEPALIVE_EXPIRY_SECONDS=60,
+            )
+
+        per_call = run(per_call_setup, server.base_url, args.calls)
+        shared = run(pooled, server.base_url, args.calls)
+
+    report('per-call setup', per_call)
+    report('pooled client', shared)
+    saved = statistics.mean(per_call) - statistics.mean(shared)
+    print(f"Overhead removed per call: {saved:.2f}ms (excluding TLS handshakes, which the stub does not use)")
+
+
+if __name__ == '__main__':
+    main()
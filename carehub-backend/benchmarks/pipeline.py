@@ -0,0 +1,222 @@
+"""
+Benchmark the recommendation pipeline end to end against a stub LLM.
+
+Drives get_medicine_recommendations and MedicineRecommendationView from
+concurrent threads while the GROQ client talks to a local stub LLM server
+with configurable latency and failure rate. Reports latency percentiles,
+throughput and where answers came from (cache, coalesced, LLM, stale or
+mock), so cache, coalescing and pooling changes can be measured before
+they ship.
+
+Requested medicines are drawn from the catalog with a Zipf-like skew, so a
+few popular medicines repeat the way they do in production. Every target
+starts from an empty recommendation cache and a closed circuit breaker.
+
+Usage:
+    python -m benchmarks.pipeline [--requests 500] [--concurrency 16]
+        [--medicines 40] [--latency-ms 200] [--failure-rate 0.05]
+        [--target all|service|view] [--json]
+
+Uses a throwaway SQLite database and the local-memory cache
+(benchmarks/settings.py) unless DJANGO_SETTINGS_MODULE is set. Timeouts,
+retries and breaker thresholds come from the usual GROQ_* settings.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_llm import StubLLMServer
+
+SOURCES = ['cache', 'coalesced', 'stale', 'llm', 'mock']
+CACHED_SOURCES = {'cache', 'coalesced', 'stale'}
+
+
+def setup_django():
+    """Configure Django, creating a fresh database when using benchmarks.settings."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+
+    database_path = getattr(settings, 'BENCHMARK_DATABASE_PATH', None)
+    if database_path is not None:
+        database_path.unlink(missing_ok=True)
+        call_command('migrate', verbosity=0)
+
+
+def point_at_stub(server):
+    """Send GROQ calls to the stub server through a fresh pooled client."""
+    from django.conf import settings
+    from recommendations.llm import reset_groq_client
+
+    settings.GROQ_API_KEY = 'stub'
+    settings.GROQ_BASE_URL = server.base_url
+    reset_groq_client()
+
+
+def workload(medicine_names, requests, seed):
+    """Medicine names to request, Zipf-distributed over the given names."""
+    weights = [1 / rank for rank in range(1, len(medicine_names) + 1)]
+    return random.Random(seed).choices(medicine_names, weights=weights, k=requests)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of already sorted values."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def service_caller():
+    """Call the service directly, as the views and Celery tasks do."""
+    from recommendations.service import get_medicine_recommendations
+
+    def call(medicine_name):
+        return get_medicine_recommendations(medicine_name).source
+
+    return call
+
+
+def view_caller():
+    """Call MedicineRecommendationView, including serialization and the history write."""
+    from accounts.models import User
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from recommendations.views import MedicineRecommendationView
+
+    user, _ = User.objects.get_or_create(
+        username='benchmark_doctor',
+        defaults={'email': 'benchmark@example.com', 'user_type': 'DOCTOR'}
+    )
+    factory = APIRequestFactory()
+    view = MedicineRecommendationView.as_view()
+
+    def call(medicine_name):
+        request = factory.post('/api/recommendations/', {'medicine_name': medicine_name}, format='json')
+        force_authenticate(request, user=user)
+        response = view(request)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return response.data['source']
+
+    return call
+
+
+def run(call, medicine_names, concurrency, server):
+    """
+    Send every request through ``call`` from ``concurrency`` threads.
+
+    Returns:
+        dict: Request count, wall time, throughput, latency percentiles,
+            answer sources, cache hit ratio, stub LLM calls and breaker state
+    """
+    from recommendations.llm import get_llm_circuit_breaker, reset_llm_circuit_breaker
+    from recommendations.service import clear_recommendation_cache
+
+    clear_recommendation_cache()
+    reset_llm_circuit_breaker()
+    llm_calls, llm_failures = server.request_count, server.failure_count
+
+    def timed(medicine_name):
+        start = time.perf_counter()
+        try:
+            source = call(medicine_name)
+        except Exception:
+            source = 'error'
+        return (time.perf_counter() - start) * 1000, source
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, medicine_names))
+    wall_seconds = time.perf_counter() - start
+
+    timings = sorted(elapsed for elapsed, _ in results)
+    sources = Counter(source for _, source in results)
+    answered = len(results) - sources['error']
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'wall_seconds': wall_seconds,
+        'throughput_rps': len(results) / wall_seconds,
+        'latency_ms': {
+            'mean': statistics.mean(timings),
+            'p50': percentile(timings, 0.50),
+            'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99),
+            'max': timings[-1],
+        },
+        'sources': {source: sources[source] for source in SOURCES},
+        'errors': sources['error'],
+        'cache_hit_ratio': (
+            sum(sources[source] for source in CACHED_SOURCES) / answered if answered else None
+        ),
+        'llm_calls': server.request_count - llm_calls,
+        'llm_failures': server.failure_count - llm_failures,
+        'circuit_breaker': get_llm_circuit_breaker().snapshot()['state'],
+    }
+
+
+def report(name, result):
+    latency = result['latency_ms']
+    answered = result['requests'] - result['errors']
+    shares = '  '.join(
+        f"{source} {count / answered:6.1%}" if answered else f"{source} -"
+        for source, count in result['sources'].items()
+    )
+    hit_ratio = f"{result['cache_hit_ratio']:.1%}" if result['cache_hit_ratio'] is not None else '-'
+    print(f"{name}: {result['requests']} requests, concurrency {result['concurrency']}, "
+          f"{result['wall_seconds']:.2f}s, {result['throughput_rps']:.1f} req/s")
+    print(f"  latency  mean={latency['mean']:8.2f}ms  p50={latency['p50']:8.2f}ms  "
+          f"p95={latency['p95']:8.2f}ms  p99={latency['p99']:8.2f}ms  max={latency['max']:8.2f}ms")
+    print(f"  sources  {shares}  errors {result['errors']}")
+    print(f"  cache hit ratio {hit_ratio}  stub LLM calls {result['llm_calls']} "
+          f"({result['llm_failures']} failed)  breaker {result['circuit_breaker']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--medicines', type=int, default=40, help='Distinct catalog medicines to request')
+    parser.add_argument('--latency-ms', type=int, default=200, help='Artificial stub LLM latency')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of stub LLM calls answered with 503')
+    parser.add_argument('--target', choices=['all', 'service', 'view'], default='all')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Keep application logging')
+    args = parser.parse_args()
+
+    setup_django()
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    from recommendations.knowledge_base import load_catalog
+
+    catalog_names = [medicine['name'] for medicine in load_catalog()][:args.medicines]
+    medicine_names = workload(catalog_names, args.requests, args.seed)
+    targets = {'service': service_caller, 'view': view_caller}
+    if args.target != 'all':
+        targets = {args.target: targets[args.target]}
+
+    results = {}
+    with StubLLMServer(latency_ms=args.latency_ms, failure_rate=args.failure_rate, seed=args.seed) as server:
+        point_at_stub(server)
+        for name, make_caller in targets.items():
+            results[name] = run(make_caller(), medicine_names, args.concurrency, server)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, result in results.items():
+        report(name, result)
+
+
+if __name__ == '__main__':
+    main()
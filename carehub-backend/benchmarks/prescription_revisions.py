@@ -0,0 +1,210 @@
+"""
+Benchmark prescription revision storage and reconstruction.
+
+Builds prescription histories where every revision changes one dosage
+(and now and then adds a medicine or edits the notes), the way doctors
+revise prescriptions, once per snapshot interval. Reports the bytes stored
+for superseded versions against copying every version in full, and how
+long reading histories back takes: ``history()`` including the database,
+and rebuilding every version from its revisions in memory (``reconstruct``).
+
+Usage:
+    python -m benchmarks.prescription_revisions [--prescriptions 50]
+        [--versions 30] [--intervals 1,5,10,25] [--json]
+
+An interval of 1 stores a snapshot of every version, which is the cost of
+full copies plus the revision bookkeeping. Uses a throwaway SQLite database
+(benchmarks/settings.py) unless DJANGO_SETTINGS_MODULE is set.
+"""
+import argparse
+import json
+import logging
+import random
+import statistics
+import time
+
+from benchmarks.pipeline import setup_django
+
+MEDICINES = ['Amlodipine', 'Metformin', 'Atorvastatin', 'Aspirin', 'Omeprazole', 'Losartan']
+
+NOTES = (
+    'Patient reports mild dizziness in the mornings. Blood pressure diary '
+    'reviewed; readings remain above target. Continue home monitoring and '
+    'reduce salt intake. Return earlier if chest pain or shortness of breath.'
+)
+
+
+def create_doctor():
+    """Doctor profile (and hospital) the prescriptions are written by."""
+    from accounts.models import User
+    from hospitals.models import Hospital, HospitalDoctorProfile
+
+    hospital_user, _ = User.objects.get_or_create(
+        username='benchmark_hospital',
+        defaults={'email': 'hospital@example.com', 'user_type': 'HOSPITAL'}
+    )
+    hospital, _ = Hospital.objects.get_or_create(
+        user=hospital_user,
+        defaults={
+            'name': 'Benchmark Hospital', 'license_number': 'BENCH-001', 'email': 'hospital@example.com',
+            'phone': '+923001234567', 'address': '1 Benchmark Road', 'location': 'Benchmark',
+            'is_approved': True,
+        }
+    )
+    doctor_user, _ = User.objects.get_or_create(
+        username='benchmark_doctor',
+        defaults={'email': 'doctor@example.com', 'user_type': 'DOCTOR'}
+    )
+    doctor, _ = HospitalDoctorProfile.objects.get_or_create(
+        user=doctor_user,
+        defaults={
+            'hospital': hospital, 'license_number': 'BENCH-DOC-001',
+            'specialization': 'Cardiology', 'phone_number': '+923009876543',
+        }
+    )
+    patient, _ = User.objects.get_or_create(
+        username='benchmark_patient',
+        defaults={'email': 'patient@example.com', 'user_type': 'PATIENT'}
+    )
+    return doctor, patient
+
+
+def next_changes(prescription, rng):
+    """Content changes of one revision: usually a single dosage."""
+    medicines = [dict(medicine) for medicine in prescription.medicines]
+    changes = {'medicines': medicines}
+    roll = rng.random()
+    if roll < 0.1:
+        medicines.append({
+            'name': rng.choice(MEDICINES), 'dosage': f'{rng.randint(1, 20) * 5}mg', 'frequency': 'Once daily'
+        })
+    elif roll < 0.2:
+        changes['doctor_notes'] = f'{NOTES} Reviewed on visit {prescription.version + 1}.'
+    else:
+        medicine = rng.choice(medicines)
+        medicine['dosage'] = f'{rng.randint(1, 20) * 5}mg'
+    return changes
+
+
+def build_histories(doctor, patient, prescriptions, versions, seed):
+    """Create the prescription histories; returns (seconds, latest versions)."""
+    from records.models import Prescription
+
+    rng = random.Random(seed)
+    latest = []
+    start = time.perf_counter()
+    for _ in range(prescriptions):
+        prescription = Prescription.objects.create(
+            doctor=doctor,
+            patient=patient,
+            diagnosis='Essential hypertension with dyslipidaemia',
+            investigations='ECG, lipid profile, renal function tests, HbA1c',
+            treatment_plan='Medication therapy, low-salt diet and 30 minutes of walking daily',
+            medicines=[
+                {'name': name, 'dosage': f'{rng.randint(1, 20) * 5}mg', 'frequency': 'Once daily'}
+                for name in rng.sample(MEDICINES, 3)
+            ],
+            doctor_notes=NOTES,
+        )
+        for _ in range(versions - 1):
+            prescription = prescription.create_revision(**next_changes(prescription, rng))
+        latest.append(prescription)
+    return time.perf_counter() - start, latest
+
+
+def run(interval, prescriptions, versions, seed):
+    """
+    Build and read back histories with one snapshot interval.
+
+    Returns:
+        dict: Stored bytes (full copies, snapshots, deltas), write time and
+            read times per history
+    """
+    from django.conf import settings
+    from records.models import Prescription, PrescriptionRevision
+    from records.revisions import reconstruct
+
+    Prescription.objects.all().delete()
+    settings.PRESCRIPTION_SNAPSHOT_INTERVAL = interval
+    doctor, patient = create_doctor()
+    write_seconds, latest = build_histories(doctor, patient, prescriptions, versions, seed)
+
+    read_timings = []
+    full_bytes = 0
+    for prescription in latest:
+        start = time.perf_counter()
+        history = list(prescription.history())
+        read_timings.append((time.perf_counter() - start) * 1000)
+        full_bytes += sum(len(json.dumps(version.get_content())) for version in history[:-1])
+
+    revisions = {}
+    snapshot_bytes = delta_bytes = 0
+    for revision in PrescriptionRevision.objects.all():
+        revisions.setdefault(revision.root_id, []).append(revision)
+        if revision.snapshot is not None:
+            snapshot_bytes += len(json.dumps(revision.snapshot))
+        else:
+            delta_bytes += len(json.dumps(revision.delta))
+
+    rebuild_timings = []
+    for history in revisions.values():
+        start = time.perf_counter()
+        for version in range(1, versions):
+            reconstruct(history, version)
+        rebuild_timings.append((time.perf_counter() - start) * 1000)
+
+    stored_bytes = snapshot_bytes + delta_bytes
+    return {
+        'interval': interval,
+        'prescriptions': prescriptions,
+        'versions': versions,
+        'full_copy_bytes': full_bytes,
+        'snapshot_bytes': snapshot_bytes,
+        'delta_bytes': delta_bytes,
+        'stored_ratio': stored_bytes / full_bytes if full_bytes else None,
+        'write_seconds': write_seconds,
+        'history_read_ms': {'mean': statistics.mean(read_timings), 'max': max(read_timings)},
+        'reconstruct_ms': {'mean': statistics.mean(rebuild_timings), 'max': max(rebuild_timings)},
+    }
+
+
+def report(result):
+    ratio = f"{result['stored_ratio']:.1%}" if result['stored_ratio'] is not None else '-'
+    print(f"interval {result['interval']}: {result['prescriptions']} prescriptions x "
+          f"{result['versions']} versions, written in {result['write_seconds']:.2f}s")
+    print(f"  stored   full copies {result['full_copy_bytes']:>10} B  snapshots {result['snapshot_bytes']:>10} B  "
+          f"deltas {result['delta_bytes']:>10} B  ({ratio} of full copies)")
+    print(f"  read     history() mean={result['history_read_ms']['mean']:7.2f}ms "
+          f"max={result['history_read_ms']['max']:7.2f}ms  "
+          f"reconstruct all mean={result['reconstruct_ms']['mean']:7.2f}ms "
+          f"max={result['reconstruct_ms']['max']:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--prescriptions', type=int, default=50)
+    parser.add_argument('--versions', type=int, default=30, help='Versions per prescription history')
+    parser.add_argument('--intervals', default='1,5,10,25', help='Comma-separated snapshot intervals')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+    if args.versions < 2:
+        parser.error('--versions must be at least 2')
+
+    setup_django()
+    logging.disable(logging.CRITICAL)
+
+    results = [
+        run(int(interval), args.prescriptions, args.versions, args.seed)
+        for interval in args.intervals.split(',')
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        report(result)
+
+
+if __name__ == '__main__':
+    main()
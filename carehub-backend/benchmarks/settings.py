@@ -0,0 +1,40 @@
+"""
+Django settings for benchmarks that need the full project.
+
+Same as carehub.settings, but with a throwaway SQLite database, the
+local-memory cache, rate limiting off and Celery tasks run inline, so the
+recommendation pipeline can be benchmarked without Postgres, Redis or a
+broker. Run with DJANGO_SETTINGS_MODULE=carehub.settings to benchmark
+against the real database and cache instead.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+# carehub.settings requires the PostgreSQL settings even though the database
+# is replaced below; placeholders let the benchmarks run on a plain checkout
+for name in ('POSTGRES_DB', 'POSTGRES_USER', 'POSTGRES_PASSWORD'):
+    os.environ.setdefault(name, 'benchmark')
+
+from carehub.settings import *  # noqa: E402,F401,F403
+
+BENCHMARK_DATABASE_PATH = Path(tempfile.gettempdir()) / 'carehub_benchmark.sqlite3'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCHMARK_DATABASE_PATH,
+        'OPTIONS': {'timeout': 30},  # Concurrent requests wait for the write lock
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+
+RATELIMIT_ENABLE = False
+
+CELERY_TASK_ALWAYS_EAGER = True
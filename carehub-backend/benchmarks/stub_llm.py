@@ -0,0 +1,142 @@
+"""
+Local stub of the GROQ chat completions API for benchmarks.
+
+Answers every POST with an OpenAI-compatible chat completion whose content is
+a recommendation JSON document, after an optional artificial latency. Requests
+with ``"stream": true`` get the same content as server-sent chunks. A
+configurable fraction of requests fails with HTTP 503 instead.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_RECOMMENDATION = {
+    "alternatives": [
+        {"name": "Ibuprofen", "reason": "Similar analgesic effect", "notes": "Take with food"},
+        {"name": "Aspirin", "reason": "Similar analgesic effect", "notes": "Avoid in children"},
+    ],
+    "warnings": [
+        {"condition": "Liver disease", "message": "Use with caution", "severity": "MODERATE"},
+    ],
+    "suggestion": "Stub recommendation for benchmarking.",
+}
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Request handler returning canned chat completions."""
+
+    protocol_version = 'HTTP/1.1'  # Allow keep-alive connections
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        self.server.request_count += 1
+
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+
+        if self.server.failure_rate and self.server.random.random() < self.server.failure_rate:
+            self.server.failure_count += 1
+            self._fail()
+            return
+
+        if request.get('stream'):
+            self._stream(request)
+            return
+
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(STUB_RECOMMENDATION)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self):
+        body = json.dumps({"error": {"message": "Stub upstream unavailable", "type": "service_unavailable"}})
+        body = body.encode('utf-8')
+        self.send_response(503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, request, chunk_size=16):
+        content = json.dumps(STUB_RECOMMENDATION)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for start in range(0, len(content), chunk_size):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": content[start:start + chunk_size]},
+                    "finish_reason": None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubLLMServer:
+    """
+    Stub LLM server running on a background thread.
+
+    Usage:
+        with StubLLMServer(latency_ms=50, failure_rate=0.1) as server:
+            client = Groq(api_key='stub', base_url=server.base_url)
+    """
+
+    def __init__(self, latency_ms=0, host='127.0.0.1', port=0, failure_rate=0.0, seed=None):
+        self.httpd = ThreadingHTTPServer((host, port), StubLLMHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency_ms = latency_ms
+        self.httpd.failure_rate = failure_rate
+        self.httpd.random = random.Random(seed)
+        self.httpd.request_count = 0
+        self.httpd.failure_count = 0
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    @property
+    def failure_count(self):
+        return self.httpd.failure_count
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -3,6 +3,10 @@ ASGI config for carehub project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve through ASGI (``make run-asgi``) when using the streaming
+recommendation endpoint (/api/recommendations/stream/): its async view then
+waits on the LLM without holding a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -192,6 +192,24 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'warm-recommendation-cache': {
+        'task': 'recommendations.tasks.warm_recommendation_cache',
+        'schedule': config('RECOMMENDATION_WARM_INTERVAL_SECONDS', default=45 * 60, cast=int),
+    },
+    'cleanup-upload-sessions': {
+        'task': 'records.tasks.cleanup_upload_sessions',
+        'schedule': 60 * 60,
+    },
+    'cleanup-unreferenced-blobs': {
+        'task': 'records.tasks.cleanup_unreferenced_blobs',
+        'schedule': 60 * 60,
+    },
+    'cleanup-record-exports': {
+        'task': 'records.tasks.cleanup_record_exports',
+        'schedule': 60 * 60,
+    },
+}
 
 
 # File Upload Settings
@@ -202,6 +220,38 @@ ALLOWED_UPLOAD_EXTENSIONS = config(
     cast=Csv()
 )
 
+# Resumable chunked uploads for large reports (MRI, CT). Keep CHUNKED_UPLOAD_DIR on the
+# same filesystem as MEDIA_ROOT so completed files are moved into place, not copied
+CHUNKED_UPLOAD_DIR = config('CHUNKED_UPLOAD_DIR', default=str(BASE_DIR / 'chunked_uploads'))
+CHUNKED_UPLOAD_CHUNK_SIZE = config('CHUNKED_UPLOAD_CHUNK_SIZE_MB', default=5, cast=int) * 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = config('CHUNKED_UPLOAD_MAX_SIZE_MB', default=1024, cast=int) * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY_HOURS = config('CHUNKED_UPLOAD_EXPIRY_HOURS', default=24, cast=int)
+
+# Longest side of report thumbnails (pixels); PDF previews need poppler's pdftoppm
+REPORT_THUMBNAIL_SIZE = config('REPORT_THUMBNAIL_SIZE', default=320, cast=int)
+
+# Report photos (JPEGs, not imaging reports) are re-encoded after upload:
+# EXIF stripped, longest side limited to REPORT_IMAGE_MAX_DIMENSION pixels
+REPORT_IMAGE_MAX_DIMENSION = config('REPORT_IMAGE_MAX_DIMENSION', default=2048, cast=int)
+REPORT_IMAGE_JPEG_QUALITY = config('REPORT_IMAGE_JPEG_QUALITY', default=85, cast=int)
+REPORT_KEEP_ORIGINAL_IMAGES = config('REPORT_KEEP_ORIGINAL_IMAGES', default=False, cast=bool)
+
+# Superseded prescription versions are stored as JSON Patch deltas, with a
+# full snapshot every PRESCRIPTION_SNAPSHOT_INTERVAL versions
+PRESCRIPTION_SNAPSHOT_INTERVAL = config('PRESCRIPTION_SNAPSHOT_INTERVAL', default=10, cast=int)
+
+# Patient record exports: records whose files total more than this many bytes
+# (set in MB) are built by a Celery worker and downloaded later instead of
+# being streamed in the request
+RECORD_EXPORT_STREAM_MAX_SIZE = config('RECORD_EXPORT_STREAM_MAX_SIZE_MB', default=200, cast=int) * 1024 * 1024
+RECORD_EXPORT_EXPIRY_HOURS = config('RECORD_EXPORT_EXPIRY_HOURS', default=24, cast=int)
+
+# File downloads: 'django' streams files itself (with Range support, for local use),
+# 'nginx' hands them to nginx with X-Accel-Redirect to an internal location serving
+# MEDIA_ROOT at FILE_DOWNLOAD_ACCEL_PREFIX, 'sendfile' uses X-Sendfile (Apache, lighttpd)
+FILE_DOWNLOAD_BACKEND = config('FILE_DOWNLOAD_BACKEND', default='django')
+FILE_DOWNLOAD_ACCEL_PREFIX = config('FILE_DOWNLOAD_ACCEL_PREFIX', default='/protected-media/')
+
 
 # OTP Settings
 OTP_EXPIRY_MINUTES = config('OTP_EXPIRY_MINUTES', default=10, cast=int)
@@ -210,6 +260,49 @@ OTP_LENGTH = config('OTP_LENGTH', default=6, cast=int)
 
 # GROQ Configuration
 GROQ_API_KEY = config('GROQ_API_KEY', default='')
+GROQ_BASE_URL = config('GROQ_BASE_URL', default='')  # Empty uses the GROQ default endpoint
+GROQ_MODEL = config('GROQ_MODEL', default='mixtral-8x7b-32768')
+GROQ_MAX_CONNECTIONS = config('GROQ_MAX_CONNECTIONS', default=20, cast=int)
+GROQ_KEEPALIVE_EXPIRY_SECONDS = config('GROQ_KEEPALIVE_EXPIRY_SECONDS', default=60, cast=float)
+# Total time budget for one recommendation's LLM call, retries included
+GROQ_TIMEOUT_SECONDS = config('GROQ_TIMEOUT_SECONDS', default=15, cast=float)
+GROQ_MAX_RETRIES = config('GROQ_MAX_RETRIES', default=2, cast=int)
+GROQ_RETRY_BASE_DELAY_SECONDS = config('GROQ_RETRY_BASE_DELAY_SECONDS', default=0.5, cast=float)
+GROQ_RETRY_MAX_DELAY_SECONDS = config('GROQ_RETRY_MAX_DELAY_SECONDS', default=4, cast=float)
+# After this many consecutive failed calls, stop calling GROQ for GROQ_BREAKER_RESET_SECONDS
+GROQ_BREAKER_FAILURE_THRESHOLD = config('GROQ_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)
+GROQ_BREAKER_RESET_SECONDS = config('GROQ_BREAKER_RESET_SECONDS', default=30, cast=float)
+
+
+# Recommendation Settings
+# Concurrent identical cache misses are coalesced so only one calls the LLM
+RECOMMENDATION_COALESCE_WAIT_SECONDS = config('RECOMMENDATION_COALESCE_WAIT_SECONDS', default=30, cast=float)
+RECOMMENDATION_COALESCE_LOCK_SECONDS = config('RECOMMENDATION_COALESCE_LOCK_SECONDS', default=60, cast=int)
+RECOMMENDATION_COALESCE_POLL_SECONDS = config('RECOMMENDATION_COALESCE_POLL_SECONDS', default=0.1, cast=float)
+RECOMMENDATION_CACHE_TTL = config('RECOMMENDATION_CACHE_TTL', default=3600, cast=int)
+# 'exact' caches per exact patient info; 'risk' shares cached recommendations between
+# patients with the same clinical risk signature (recommendations/risk.py)
+RECOMMENDATION_CACHE_MATCHING = config('RECOMMENDATION_CACHE_MATCHING', default='exact')
+# Expired recommendations are kept this much longer, to serve while GROQ is unavailable
+RECOMMENDATION_STALE_TTL = config('RECOMMENDATION_STALE_TTL', default=24 * 3600, cast=int)
+# Batch requests generate at most this many uncached recommendations at once
+RECOMMENDATION_BATCH_CONCURRENCY = config('RECOMMENDATION_BATCH_CONCURRENCY', default=4, cast=int)
+RECOMMENDATION_BATCH_MAX_SIZE = config('RECOMMENDATION_BATCH_MAX_SIZE', default=20, cast=int)
+# Cache warm-up (Celery beat): refresh the most requested medicines for their most
+# common patient profiles before RECOMMENDATION_CACHE_TTL expires
+RECOMMENDATION_WARM_TOP_MEDICINES = config('RECOMMENDATION_WARM_TOP_MEDICINES', default=20, cast=int)
+RECOMMENDATION_WARM_PROFILES = config('RECOMMENDATION_WARM_PROFILES', default=3, cast=int)
+RECOMMENDATION_WARM_LOOKBACK_DAYS = config('RECOMMENDATION_WARM_LOOKBACK_DAYS', default=7, cast=int)
+RECOMMENDATION_WARM_CONCURRENCY = config('RECOMMENDATION_WARM_CONCURRENCY', default=2, cast=int)
+
+
+# Local medicine catalog; build the memory-mapped index with
+# `python manage.py build_medicine_index`
+MEDICINE_CATALOG_PATH = config('MEDICINE_CATALOG_PATH', default=str(BASE_DIR / 'recommendations' / 'data' / 'medicines.json'))
+MEDICINE_INDEX_PATH = config('MEDICINE_INDEX_PATH', default=str(BASE_DIR / 'recommendations' / 'data' / 'medicines.idx'))
+MEDICINE_INTERACTIONS_PATH = config(
+    'MEDICINE_INTERACTIONS_PATH', default=str(BASE_DIR / 'recommendations' / 'data' / 'interactions.json')
+)
 
 
 # SMS Provider Configuration
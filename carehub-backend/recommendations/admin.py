@@ -2,17 +2,17 @@
 Admin configuration for recommendations app.
 """
 from django.contrib import admin
-from .models import MedicineRecommendation
+from .models import MedicineRecommendation, RecommendationRollup, RecommendationUserRollup
 
 
 @admin.register(MedicineRecommendation)
 class MedicineRecommendationAdmin(admin.ModelAdmin):
     """Admin for MedicineRecommendation model."""
     
-    list_display = ['id', 'medicine_name', 'requested_by', 'created_at', 'response_time_ms']
-    list_filter = ['created_at']
+    list_display = ['id', 'medicine_name', 'requested_by', 'status', 'source', 'created_at', 'response_time_ms']
+    list_filter = ['status', 'source', 'created_at']
     search_fields = ['medicine_name', 'requested_by__username', 'requested_by__email']
-    readonly_fields = ['created_at', 'response_time_ms']
+    readonly_fields = ['created_at', 'response_time_ms', 'source', 'model_name']
     ordering = ['-created_at']
     
     fieldsets = (
@@ -22,7 +22,42 @@ class MedicineRecommendationAdmin(admin.ModelAdmin):
         ('Recommendation', {
             'fields': ('alternatives', 'warnings', 'suggestion')
         }),
+        ('Job', {
+            'fields': ('status', 'error_message', 'completed_at')
+        }),
         ('Metadata', {
-            'fields': ('created_at', 'response_time_ms')
+            'fields': ('created_at', 'response_time_ms', 'source', 'model_name')
         }),
     )
+
+
+@admin.register(RecommendationRollup)
+class RecommendationRollupAdmin(admin.ModelAdmin):
+    """Read-only admin for recommendation rollups."""
+    
+    list_display = ['bucket_start', 'granularity', 'medicine_name', 'request_count', 'cache_hit_count']
+    list_filter = ['granularity']
+    search_fields = ['medicine_name']
+    ordering = ['-bucket_start']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RecommendationUserRollup)
+class RecommendationUserRollupAdmin(admin.ModelAdmin):
+    """Read-only admin for per-user recommendation rollups."""
+    
+    list_display = ['bucket_start', 'granularity', 'user', 'request_count']
+    list_filter = ['granularity']
+    search_fields = ['user__username']
+    ordering = ['-bucket_start']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,114 @@
+"""
+Single-flight coalescing for concurrent identical recommendation requests.
+
+When many requests miss the cache for the same key at once, only one of them
+(the leader) computes the result. Threads in the same process wait on an
+in-flight future; workers in other processes wait on a lock held in the
+shared cache and pick up the result the leader publishes there.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+# How long a leader's published result is offered to followers already
+# polling for it; later callers must not pick it up after the real cache
+# entry was invalidated or refreshed
+RESULT_TTL_SECONDS = 5
+
+
+def _lock_key(key):
+    return f"{key}:lock"
+
+
+def _result_key(key):
+    return f"{key}:flight"
+
+
+def single_flight(key, compute, wait_timeout=None):
+    """
+    Run ``compute()`` at most once per key across concurrent callers.
+
+    Args:
+        key: Canonical cache key identifying the computation
+        compute: Zero-argument callable producing the result
+        wait_timeout: Seconds a follower waits for the leader before
+            computing the result itself (default from settings)
+
+    Returns:
+        The result computed by the leader (or by this caller on timeout)
+    """
+    if wait_timeout is None:
+        wait_timeout = settings.RECOMMENDATION_COALESCE_WAIT_SECONDS
+
+    # Coalesce threads within this process on a shared future
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _in_flight[key] = future
+
+    if not is_leader:
+        try:
+            return future.result(timeout=wait_timeout)
+        except FutureTimeoutError:
+            logger.warning(f"Timed out waiting for in-flight computation of {key}")
+            return compute()
+
+    try:
+        result = _distributed_single_flight(key, compute, wait_timeout)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+def _distributed_single_flight(key, compute, wait_timeout):
+    """Coalesce across processes using a lock held in the shared cache."""
+    lock_key = _lock_key(key)
+    result_key = _result_key(key)
+    lock_ttl = settings.RECOMMENDATION_COALESCE_LOCK_SECONDS
+    poll_interval = settings.RECOMMENDATION_COALESCE_POLL_SECONDS
+    deadline = time.monotonic() + wait_timeout
+    token = uuid.uuid4().hex
+
+    while True:
+        if cache.add(lock_key, token, lock_ttl):
+            # A previous leader's result must not reach this round's followers
+            cache.delete(result_key)
+            try:
+                result = compute()
+                # Publish for followers even if compute() chose not to cache it
+                cache.set(result_key, result, max(RESULT_TTL_SECONDS, 2 * poll_interval))
+                return result
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        # Another worker is computing; wait for it to publish the result
+        while time.monotonic() < deadline:
+            result = cache.get(result_key)
+            if result is not None:
+                logger.info(f"Served coalesced result for {key}")
+                return result
+            if cache.get(lock_key) is None:
+                # Leader finished without publishing (e.g. it failed); take over
+                break
+            time.sleep(poll_interval)
+        else:
+            logger.warning(f"Timed out waiting for leader computing {key}")
+            return compute()
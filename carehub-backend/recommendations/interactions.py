@@ -0,0 +1,177 @@
+"""
+Drug-interaction checks against a precomputed sparse interaction matrix.
+
+Known interactions between generic ingredients (``data/interactions.json``)
+are loaded once into a symmetric matrix in compressed sparse row form:
+``indptr[i]:indptr[i + 1]`` slices ``indices`` (interacting ingredient IDs)
+and ``entries`` (severity and effect) for ingredient ID ``i``. A check maps
+every medicine to its ingredient IDs via the medicine catalog and scans the
+matrix rows of the requested medicines once, so recommendations and
+prescriptions can be checked without an LLM round trip.
+"""
+import json
+import logging
+import threading
+from array import array
+from django.conf import settings
+
+from .knowledge_base import get_medicine_index, load_catalog, normalize_medicine_name
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_RANK = {'LOW': 0, 'MODERATE': 1, 'HIGH': 2, 'CRITICAL': 3}
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+class InteractionMatrix:
+    """Symmetric sparse matrix of interactions keyed by generic ingredient ID."""
+
+    def __init__(self, generics, interactions):
+        """
+        Args:
+            generics: Generic ingredient names to assign IDs to
+            interactions: Records with a 'generics' pair, 'severity' and 'effect'
+        """
+        names = set(generics)
+        for interaction in interactions:
+            names.update(interaction['generics'])
+        self.generic_ids = {name: i for i, name in enumerate(sorted(names))}
+        self.generic_names = sorted(names)
+        self.details = [(interaction['severity'], interaction['effect']) for interaction in interactions]
+
+        rows = [[] for _ in self.generic_names]
+        for entry, interaction in enumerate(interactions):
+            first, second = (self.generic_ids[name] for name in interaction['generics'])
+            rows[first].append((second, entry))
+            rows[second].append((first, entry))
+
+        self.indptr = array('I', [0])
+        self.indices = array('I')
+        self.entries = array('I')
+        for row in rows:
+            for column, entry in sorted(row):
+                self.indices.append(column)
+                self.entries.append(entry)
+            self.indptr.append(len(self.indices))
+
+    def ingredient_ids(self, medicine_name: str):
+        """
+        Generic ingredient IDs of a medicine.
+
+        Catalog medicines resolve through their generics (so brand names and
+        combination products work); other names are tried as a generic.
+        Unknown medicines have no IDs and are not checked.
+        """
+        medicine = get_medicine_index().get(medicine_name)
+        names = medicine['generics'] if medicine else [normalize_medicine_name(medicine_name)]
+        return [self.generic_ids[name] for name in names if name in self.generic_ids]
+
+    def check(self, requested, taking):
+        """
+        Find interactions between requested medicines and everything being taken.
+
+        Args:
+            requested: (label, ingredient IDs) for each medicine being checked
+            taking: (label, ingredient IDs) for each medicine being taken,
+                including the requested ones
+
+        Returns:
+            list: Interaction dicts, most severe first
+        """
+        holders = {}
+        for label, ids in taking:
+            for generic_id in ids:
+                holders.setdefault(generic_id, []).append(label)
+
+        found = {}
+        for label, ids in requested:
+            for generic_id in ids:
+                for other_label in holders[generic_id]:
+                    if other_label != label:
+                        pair = (frozenset((label, other_label)), generic_id, None)
+                        found.setdefault(pair, (label, other_label, 'HIGH', (
+                            f"Duplicate therapy: both contain {self.generic_names[generic_id]}"
+                        )))
+                for k in range(self.indptr[generic_id], self.indptr[generic_id + 1]):
+                    for other_label in holders.get(self.indices[k], ()):
+                        if other_label == label:
+                            continue  # Ingredients of one combination product
+                        pair = (frozenset((label, other_label)), None, self.entries[k])
+                        severity, effect = self.details[self.entries[k]]
+                        found.setdefault(pair, (label, other_label, severity, effect))
+
+        results = [
+            {'medicine': label, 'interacts_with': other_label, 'severity': severity, 'effect': effect}
+            for label, other_label, severity, effect in found.values()
+        ]
+        results.sort(key=lambda result: -SEVERITY_RANK.get(result['severity'], 0))
+        return results
+
+
+def load_interaction_matrix():
+    """Build the interaction matrix from the catalog and interaction data."""
+    with open(settings.MEDICINE_INTERACTIONS_PATH, 'r', encoding='utf-8') as f:
+        interactions = json.load(f)['interactions']
+    generics = [name for medicine in load_catalog() for name in medicine['generics']]
+    matrix = InteractionMatrix(generics, interactions)
+    logger.info(
+        f"Loaded interaction matrix: {len(matrix.generic_names)} ingredients, "
+        f"{len(interactions)} interactions"
+    )
+    return matrix
+
+
+def get_interaction_matrix():
+    """Get the process-wide interaction matrix, building it on first use."""
+    global _matrix
+    if _matrix is None:
+        with _matrix_lock:
+            if _matrix is None:
+                _matrix = load_interaction_matrix()
+    return _matrix
+
+
+def medication_names(medications):
+    """
+    Medicine names from a list of names or ``{"name": ...}`` entries.
+
+    Accepts both ``patient_info.current_medications`` and
+    ``Prescription.medicines``.
+    """
+    names = []
+    for medication in medications or []:
+        if isinstance(medication, dict):
+            medication = medication.get('name')
+        if isinstance(medication, str) and medication.strip():
+            names.append(medication.strip())
+    return names
+
+
+def check_interactions(medicines, current_medications=()):
+    """
+    Check medicines against current medications and against each other.
+
+    Args:
+        medicines: Names of the medicines being prescribed or requested
+        current_medications: Names of medicines the patient already takes
+
+    Returns:
+        list: Dicts with medicine, interacts_with, severity and effect,
+            most severe first
+
+    Example:
+        >>> check_interactions(['Brufen'], ['Warfarin'])
+        [{'medicine': 'Brufen', 'interacts_with': 'Warfarin', 'severity': 'HIGH',
+          'effect': 'Increased risk of serious bleeding'}]
+    """
+    matrix = get_interaction_matrix()
+    requested = [(name, matrix.ingredient_ids(name)) for name in medicines]
+    # A medicine already taken is the same medicine whatever its spelling
+    requested_keys = {normalize_medicine_name(name) for name in medicines}
+    current = [
+        (name, matrix.ingredient_ids(name)) for name in current_medications
+        if normalize_medicine_name(name) not in requested_keys
+    ]
+    return matrix.check(requested, requested + current)
@@ -0,0 +1,408 @@
+"""
+Local medicine knowledge base.
+
+The catalog (``data/medicines.json``) lists medicine names, generics, drug
+classes, contraindications and alternatives. It is served from a compact
+in-memory index: a hash of normalized names, brand names and generics for
+exact lookups, and a prefix trie for prefix matching.
+
+``python manage.py build_medicine_index`` compiles the catalog into a binary
+file which is memory-mapped at startup, so loading costs a header read and a
+key table scan instead of parsing the whole catalog. Records are decoded
+lazily on first lookup.
+
+Index file layout (little-endian):
+    header    magic b'CHMI', format version, record count, key count and the
+              offsets of the key table, key blob and record blob
+    offsets   (record count + 1) uint32 offsets into the record blob
+    keys      (key offset, key length, record id) uint32 triples, sorted by key
+    key blob  UTF-8 normalized keys
+    records   compact JSON documents, one per record
+"""
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b'CHMI'
+INDEX_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHHIIIII')
+_OFFSET = struct.Struct('<I')
+_KEY_ENTRY = struct.Struct('<III')
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def normalize_medicine_name(name: str):
+    """
+    Normalize a medicine name for index lookups.
+
+    Case, punctuation and repeated whitespace are ignored, so
+    "Co-Amoxiclav" and "co amoxiclav" share a key.
+    """
+    return _SEPARATORS.sub(' ', name.casefold()).strip()
+
+
+def typo_budget(length: int):
+    """Number of typos tolerated in a query of the given length."""
+    if length <= 3:
+        return 0
+    if length <= 6:
+        return 1
+    return 2
+
+
+class _TrieNode:
+    __slots__ = ('children', 'record_id')
+
+    def __init__(self):
+        self.children = {}
+        self.record_id = None
+
+
+class MedicineIndex:
+    """
+    Read-only index over the medicine catalog.
+
+    Use ``MedicineIndex.from_catalog`` to index records in memory or
+    ``MedicineIndex.load`` to memory-map a file written by ``write_index``.
+    """
+
+    def __init__(self, keys, record_count, load_record, close=None):
+        """
+        Args:
+            keys: Mapping of normalized key to record id
+            record_count: Number of records in the catalog
+            load_record: Callable returning the record dict for a record id
+            close: Optional callable releasing the underlying storage
+        """
+        self._keys = keys
+        self._record_count = record_count
+        self._load_record = load_record
+        self._close = close
+        self._records = {}
+        self._trie = _TrieNode()
+        # Inserting keys in sorted order keeps every node's children sorted,
+        # so prefix walks return matches alphabetically without sorting
+        for key in sorted(keys):
+            node = self._trie
+            for char in key:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _TrieNode()
+                node = child
+            node.record_id = keys[key]
+
+    @classmethod
+    def from_catalog(cls, medicines):
+        """Index a list of catalog records in memory."""
+        return cls(_catalog_keys(medicines), len(medicines), medicines.__getitem__)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-map an index file written by ``write_index``.
+
+        Raises:
+            ValueError: If the file is not a medicine index of this format version
+        """
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, _, record_count, key_count, keys_at, key_blob_at, records_at = (
+                _HEADER.unpack_from(buffer, 0)
+            )
+            if magic != INDEX_MAGIC or version != INDEX_FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {INDEX_FORMAT_VERSION} medicine index")
+
+            keys = {}
+            for i in range(key_count):
+                key_offset, key_length, record_id = _KEY_ENTRY.unpack_from(buffer, keys_at + i * _KEY_ENTRY.size)
+                start = key_blob_at + key_offset
+                keys[buffer[start:start + key_length].decode('utf-8')] = record_id
+        except Exception:
+            buffer.close()
+            raise
+
+        offsets_at = _HEADER.size
+
+        def load_record(record_id):
+            position = offsets_at + record_id * _OFFSET.size
+            start, = _OFFSET.unpack_from(buffer, position)
+            end, = _OFFSET.unpack_from(buffer, position + _OFFSET.size)
+            return json.loads(buffer[records_at + start:records_at + end])
+
+        return cls(keys, record_count, load_record, close=buffer.close)
+
+    def __len__(self):
+        return self._record_count
+
+    def get(self, name: str):
+        """
+        Look up a medicine by name, brand name or generic.
+
+        Returns:
+            dict: Catalog record, or None if the medicine is unknown
+        """
+        record_id = self._keys.get(normalize_medicine_name(name))
+        if record_id is None:
+            return None
+        return self._record(record_id)
+
+    def search_prefix(self, prefix: str, limit: int = 10):
+        """
+        Find medicines with a name, brand name or generic starting with a prefix.
+
+        Args:
+            prefix: Text typed so far
+            limit: Maximum number of records to return
+
+        Returns:
+            list: (matched key, record) tuples in alphabetical key order,
+                at most one per record
+        """
+        node = self._trie
+        prefix = normalize_medicine_name(prefix)
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        matches = []
+        seen = set()
+        stack = [(prefix, node)]
+        while stack and len(matches) < limit:
+            key, node = stack.pop()
+            if node.record_id is not None and node.record_id not in seen:
+                seen.add(node.record_id)
+                matches.append((key, self._record(node.record_id)))
+            # Push in reverse so the smallest child is visited first
+            for char, child in reversed(node.children.items()):
+                stack.append((key + char, child))
+        return matches
+
+    def autocomplete(self, query: str, limit: int = 10, max_distance: int = None):
+        """
+        Suggest medicines for partially typed, possibly misspelled text.
+
+        Walks the trie computing Levenshtein distances between the query and
+        each key prefix, pruning branches that cannot come within
+        ``max_distance`` edits. A key matches when some prefix of it is close
+        enough to the query, so "amoxc" and "amoxicilin" both suggest Amoxicillin.
+
+        Args:
+            query: Text typed so far
+            limit: Maximum number of suggestions
+            max_distance: Allowed typos (default scales with query length)
+
+        Returns:
+            list: (matched key, record, distance) tuples, exact prefix
+                matches first, then by distance and key length
+        """
+        query = normalize_medicine_name(query)
+        if not query:
+            return []
+        if max_distance is None:
+            max_distance = typo_budget(len(query))
+
+        best = {}
+        stack = [(self._trie, '', list(range(len(query) + 1)), len(query))]
+        while stack:
+            node, key, row, distance = stack.pop()
+            distance = min(distance, row[-1])
+            closest = min(row)
+            if closest >= distance:
+                # Longer keys cannot bring the query any closer
+                if distance <= max_distance:
+                    self._collect(node, key, distance, best)
+                continue
+            if closest > max_distance:
+                continue
+            if node.record_id is not None and distance <= max_distance:
+                _add_match(best, node.record_id, key, distance)
+            for char, child in node.children.items():
+                next_row = [row[0] + 1]
+                for i, query_char in enumerate(query):
+                    next_row.append(min(
+                        next_row[i] + 1,
+                        row[i + 1] + 1,
+                        row[i] + (query_char != char),
+                    ))
+                stack.append((child, key + char, next_row, distance))
+
+        ranked = sorted(best.items(), key=lambda item: item[1])[:limit]
+        return [(key, self._record(record_id), distance) for record_id, (distance, _, key) in ranked]
+
+    def _collect(self, node, key, distance, best):
+        """Record every key under ``node`` as a match at ``distance``."""
+        stack = [(node, key)]
+        while stack:
+            node, key = stack.pop()
+            if node.record_id is not None:
+                _add_match(best, node.record_id, key, distance)
+            for char, child in node.children.items():
+                stack.append((child, key + char))
+
+    def keys(self):
+        """All normalized lookup keys."""
+        return self._keys.keys()
+
+    def close(self):
+        """Release the memory map, if any."""
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def _record(self, record_id):
+        record = self._records.get(record_id)
+        if record is None:
+            record = self._records[record_id] = self._load_record(record_id)
+        return record
+
+
+def matched_label(record, key):
+    """
+    Original spelling of the name, brand name or generic a key was built from.
+
+    Args:
+        record: Catalog record
+        key: Normalized key that matched
+    """
+    for label in [record['name'], *record.get('synonyms', []), *record.get('generics', [])]:
+        if normalize_medicine_name(label) == key:
+            return label
+    return key
+
+
+def _add_match(best, record_id, key, distance):
+    """Keep the best-ranked matching key per record."""
+    rank = (distance, len(key), key)
+    if record_id not in best or rank < best[record_id]:
+        best[record_id] = rank
+
+
+def _catalog_keys(medicines):
+    """
+    Map normalized lookup keys to record ids.
+
+    Names take precedence over brand names, and brand names over generics,
+    so "Amoxicillin" finds Amoxicillin rather than Co-Amoxiclav.
+    """
+    keys = {}
+    for record_id, record in enumerate(medicines):
+        keys.setdefault(normalize_medicine_name(record['name']), record_id)
+    for record_id, record in enumerate(medicines):
+        for synonym in record.get('synonyms', []):
+            keys.setdefault(normalize_medicine_name(synonym), record_id)
+    for record_id, record in enumerate(medicines):
+        if len(record.get('generics', [])) == 1:
+            keys.setdefault(normalize_medicine_name(record['generics'][0]), record_id)
+    return keys
+
+
+def load_catalog(path=None):
+    """
+    Read the medicine catalog JSON.
+
+    Returns:
+        list: Catalog records
+    """
+    with open(path or settings.MEDICINE_CATALOG_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)['medicines']
+
+
+def write_index(medicines, path):
+    """
+    Write catalog records to a memory-mappable index file.
+
+    Returns:
+        int: Size of the written file in bytes
+    """
+    keys = sorted(_catalog_keys(medicines).items(), key=lambda item: item[0].encode('utf-8'))
+
+    records = [json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8') for record in medicines]
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    key_blob = bytearray()
+    key_table = bytearray()
+    for key, record_id in keys:
+        encoded = key.encode('utf-8')
+        key_table += _KEY_ENTRY.pack(len(key_blob), len(encoded), record_id)
+        key_blob += encoded
+
+    keys_at = _HEADER.size + len(offsets) * _OFFSET.size
+    key_blob_at = keys_at + len(key_table)
+    records_at = key_blob_at + len(key_blob)
+    header = _HEADER.pack(
+        INDEX_MAGIC, INDEX_FORMAT_VERSION, 0, len(medicines), len(keys), keys_at, key_blob_at, records_at
+    )
+
+    # Write to a temporary file and rename, so a running process never maps a partial index
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(b''.join(_OFFSET.pack(offset) for offset in offsets))
+        f.write(key_table)
+        f.write(key_blob)
+        f.write(b''.join(records))
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def get_medicine_index():
+    """
+    Get the process-wide medicine index, loading it on first use.
+
+    The memory-mapped index file is used when it is at least as new as the
+    catalog; otherwise the catalog JSON is indexed in memory.
+
+    Returns:
+        MedicineIndex: The loaded index
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _load_medicine_index()
+    return _index
+
+
+def _load_medicine_index():
+    catalog_path = settings.MEDICINE_CATALOG_PATH
+    index_path = settings.MEDICINE_INDEX_PATH
+
+    try:
+        if os.path.getmtime(index_path) >= os.path.getmtime(catalog_path):
+            index = MedicineIndex.load(index_path)
+            logger.info(f"Loaded medicine index {index_path} ({len(index)} medicines)")
+            return index
+        logger.warning(f"Medicine index {index_path} is older than the catalog; run build_medicine_index")
+    except FileNotFoundError:
+        logger.info(f"No medicine index at {index_path}; indexing {catalog_path} in memory")
+    except ValueError as e:
+        logger.warning(f"Ignoring medicine index: {str(e)}")
+
+    return MedicineIndex.from_catalog(load_catalog(catalog_path))
+
+
+def reset_medicine_index():
+    """Drop the loaded index so the next lookup reloads it (after a rebuild)."""
+    global _index
+    with _index_lock:
+        # Not closed explicitly: other threads may still be reading from it,
+        # and the memory map is released once the last reference goes away
+        _index = None
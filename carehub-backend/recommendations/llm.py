@@ -0,0 +1,198 @@
+"""
+Shared GROQ LLM plumbing for the recommendations service.
+
+Holds a process-wide GROQ client whose HTTP connections are kept alive and
+pooled between requests, and the system prompt template, which is read and
+parsed once instead of on every uncached recommendation.
+
+Streaming responses use an AsyncGroq client, kept per event loop because
+async HTTP connections cannot be shared between loops.
+
+The SDK's own retries are disabled; the service retries within its deadline
+and trips the process-wide circuit breaker (see resilience.py).
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import weakref
+from pathlib import Path
+from django.conf import settings
+
+from .resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT_PATH = Path(__file__).parent / 'system_prompt.txt'
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_groq_client():
+    """
+    Get the shared GROQ client, creating it on first use.
+
+    Returns:
+        groq.Groq: Client backed by a keep-alive connection pool
+
+    Raises:
+        ImportError: If the groq library is not installed
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_groq_client()
+    return _client
+
+
+def _connection_limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=settings.GROQ_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GROQ_MAX_CONNECTIONS,
+        keepalive_expiry=settings.GROQ_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def _build_groq_client():
+    """Create a GROQ client with a pooled HTTP transport."""
+    from groq import Groq, DefaultHttpxClient
+
+    logger.info("Created pooled GROQ client")
+    return Groq(
+        api_key=settings.GROQ_API_KEY,
+        base_url=settings.GROQ_BASE_URL or None,
+        max_retries=0,
+        http_client=DefaultHttpxClient(limits=_connection_limits()),
+    )
+
+
+def get_async_groq_client():
+    """
+    Get the AsyncGroq client for the running event loop.
+
+    Returns:
+        groq.AsyncGroq: Client backed by a keep-alive connection pool
+
+    Raises:
+        ImportError: If the groq library is not installed
+        RuntimeError: If called outside a running event loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+        client = AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            base_url=settings.GROQ_BASE_URL or None,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=_connection_limits()),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def reset_groq_client():
+    """Close and drop the shared client (after settings change or fork)."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"Error closing GROQ client: {str(e)}")
+
+
+def get_llm_circuit_breaker():
+    """
+    Get the process-wide circuit breaker guarding GROQ calls.
+
+    Opens after GROQ_BREAKER_FAILURE_THRESHOLD consecutive failed calls and
+    allows a trial call after GROQ_BREAKER_RESET_SECONDS.
+    """
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    'groq',
+                    failure_threshold=settings.GROQ_BREAKER_FAILURE_THRESHOLD,
+                    reset_timeout=settings.GROQ_BREAKER_RESET_SECONDS,
+                )
+    return _breaker
+
+
+def reset_llm_circuit_breaker():
+    """Drop the circuit breaker so the next call starts closed (after settings change)."""
+    global _breaker
+    with _breaker_lock:
+        _breaker = None
+
+
+def is_transient_error(error):
+    """
+    Whether a failed GROQ call is worth retrying.
+
+    Connection errors and timeouts are, as are rate limiting (429) and
+    server errors (5xx). Other errors, such as bad requests or invalid
+    credentials, would fail again.
+    """
+    try:
+        import groq
+    except ImportError:
+        return False
+    if isinstance(error, groq.APIConnectionError):  # Includes APITimeoutError
+        return True
+    return isinstance(error, groq.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def _reset_after_fork():
+    # Pooled sockets must not be shared between a parent and forked children
+    # (e.g. Celery prefork workers); the child builds its own client.
+    global _client, _client_lock, _breaker_lock
+    _client = None
+    _client_lock = threading.Lock()
+    _async_clients.clear()
+    _breaker_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class PromptTemplate:
+    """
+    Prompt template with ``{name}`` placeholders, parsed once.
+
+    Only the given placeholder names are substituted, so literal braces in the
+    template (such as the JSON response example) need no escaping.
+    """
+
+    def __init__(self, text, placeholders):
+        pattern = re.compile(r'\{(' + '|'.join(map(re.escape, placeholders)) + r')\}')
+        # Split into alternating literal and placeholder-name segments
+        self._segments = pattern.split(text)
+        self.placeholders = tuple(placeholders)
+
+    def render(self, **values):
+        """Render the template; every placeholder must be provided."""
+        parts = list(self._segments)
+        parts[1::2] = [str(values[name]) for name in parts[1::2]]
+        return ''.join(parts)
+
+
+def _load_system_prompt():
+    with open(SYSTEM_PROMPT_PATH, 'r') as f:
+        return PromptTemplate(f.read(), ['medical_data', 'patient_info', 'medicine_name'])
+
+
+SYSTEM_PROMPT = _load_system_prompt()
@@ -0,0 +1,45 @@
+"""
+Management command to compile the medicine catalog into a memory-mapped index.
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recommendations.knowledge_base import MedicineIndex, load_catalog, write_index
+
+
+class Command(BaseCommand):
+    help = 'Build the binary medicine index loaded by the recommendations service'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--catalog',
+            default=settings.MEDICINE_CATALOG_PATH,
+            help='Catalog JSON to index (default: MEDICINE_CATALOG_PATH)',
+        )
+        parser.add_argument(
+            '--output',
+            default=settings.MEDICINE_INDEX_PATH,
+            help='Index file to write (default: MEDICINE_INDEX_PATH)',
+        )
+
+    def handle(self, *args, **options):
+        medicines = load_catalog(options['catalog'])
+        size = write_index(medicines, options['output'])
+
+        # Verify the written file loads and round-trips every record
+        start = time.perf_counter()
+        index = MedicineIndex.load(options['output'])
+        load_ms = (time.perf_counter() - start) * 1000
+        try:
+            for medicine in medicines:
+                if index.get(medicine['name']) != medicine:
+                    raise CommandError(f"Index lookup for {medicine['name']} does not match the catalog")
+            key_count = len(index.keys())
+        finally:
+            index.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Indexed {len(medicines)} medicines ({key_count} lookup keys, {size} bytes) "
+            f"into {options['output']}; loads in {load_ms:.2f}ms"
+        ))
+        self.stdout.write('Restart application and Celery workers to pick up the new index.')
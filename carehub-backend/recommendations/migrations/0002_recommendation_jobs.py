@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicinerecommendation',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='medicinerecommendation',
+            name='error_message',
+            field=models.TextField(blank=True, help_text='Failure reason for asynchronous jobs'),
+        ),
+        migrations.AddField(
+            model_name='medicinerecommendation',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='COMPLETED', max_length=10),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:16
+
+from collections import defaultdict
+from datetime import timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build the rollups from the recommendations completed so far."""
+    MedicineRecommendation = apps.get_model('recommendations', 'MedicineRecommendation')
+    RecommendationRollup = apps.get_model('recommendations', 'RecommendationRollup')
+    RecommendationUserRollup = apps.get_model('recommendations', 'RecommendationUserRollup')
+
+    medicine_counts = defaultdict(lambda: [0, 0, 0])
+    user_counts = defaultdict(int)
+    rows = (
+        MedicineRecommendation.objects.filter(status='COMPLETED')
+        .values_list('medicine_name', 'requested_by_id', 'created_at', 'response_time_ms')
+        .iterator(chunk_size=2000)
+    )
+    for medicine_name, user_id, created_at, response_time_ms in rows:
+        hour = created_at.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        for bucket in (('HOUR', hour), ('DAY', hour.replace(hour=0))):
+            counts = medicine_counts[bucket + (medicine_name,)]
+            counts[0] += 1
+            if response_time_ms is not None:
+                counts[1] += response_time_ms
+                counts[2] += 1
+            user_counts[bucket + (user_id,)] += 1
+
+    RecommendationRollup.objects.bulk_create(
+        [
+            RecommendationRollup(
+                granularity=granularity, bucket_start=bucket_start, medicine_name=medicine_name,
+                request_count=count, response_time_total_ms=total_ms, response_time_count=timed,
+            )
+            for (granularity, bucket_start, medicine_name), (count, total_ms, timed) in medicine_counts.items()
+        ],
+        batch_size=1000,
+    )
+    RecommendationUserRollup.objects.bulk_create(
+        [
+            RecommendationUserRollup(
+                granularity=granularity, bucket_start=bucket_start, user_id=user_id, request_count=count,
+            )
+            for (granularity, bucket_start, user_id), count in user_counts.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0002_recommendation_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('HOUR', 'Hour'), ('DAY', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('medicine_name', models.CharField(max_length=255)),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('response_time_total_ms', models.BigIntegerField(default=0)),
+                ('response_time_count', models.PositiveIntegerField(default=0, help_text='Requests with a recorded response time')),
+            ],
+            options={
+                'verbose_name': 'Recommendation Rollup',
+                'verbose_name_plural': 'Recommendation Rollups',
+                'db_table': 'recommendation_rollups',
+                'unique_together': {('granularity', 'bucket_start', 'medicine_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RecommendationUserRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('HOUR', 'Hour'), ('DAY', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendation_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Recommendation User Rollup',
+                'verbose_name_plural': 'Recommendation User Rollups',
+                'db_table': 'recommendation_user_rollups',
+                'unique_together': {('granularity', 'bucket_start', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
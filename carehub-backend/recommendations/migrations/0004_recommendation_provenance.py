@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0003_recommendation_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicinerecommendation',
+            name='model_name',
+            field=models.CharField(blank=True, help_text='LLM model that generated the response', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='medicinerecommendation',
+            name='source',
+            field=models.CharField(blank=True, choices=[('cache', 'Cache'), ('coalesced', 'Coalesced'), ('llm', 'LLM'), ('mock', 'Mock')], help_text='Where the response came from', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='recommendationrollup',
+            name='cache_hit_count',
+            field=models.PositiveIntegerField(default=0, help_text='Requests answered from the cache or a concurrent identical request'),
+        ),
+        migrations.AlterField(
+            model_name='medicinerecommendation',
+            name='response_time_ms',
+            field=models.IntegerField(blank=True, help_text='Response time in milliseconds', null=True),
+        ),
+    ]
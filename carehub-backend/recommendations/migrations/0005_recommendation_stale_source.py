@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0004_recommendation_provenance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='medicinerecommendation',
+            name='source',
+            field=models.CharField(blank=True, choices=[('cache', 'Cache'), ('coalesced', 'Coalesced'), ('stale', 'Stale'), ('llm', 'LLM'), ('mock', 'Mock')], help_text='Where the response came from', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='recommendationrollup',
+            name='cache_hit_count',
+            field=models.PositiveIntegerField(default=0, help_text='Requests answered from the cache (fresh or stale) or a concurrent identical request'),
+        ),
+    ]
@@ -8,8 +8,26 @@ from accounts.models import User
 class MedicineRecommendation(models.Model):
     """
     Store medicine recommendation requests and responses for caching.
+    
+    Asynchronous requests create the row as PENDING and a Celery task fills
+    in the response, so the row doubles as the job record.
     """
     
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    SOURCE_CHOICES = [
+        ('cache', 'Cache'),
+        ('coalesced', 'Coalesced'),
+        ('stale', 'Stale'),
+        ('llm', 'LLM'),
+        ('mock', 'Mock'),
+    ]
+    
     requested_by = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -28,9 +46,21 @@ class MedicineRecommendation(models.Model):
     warnings = models.JSONField(default=list, help_text='List of warnings and contraindications')
     suggestion = models.TextField(blank=True, help_text='General suggestion')
     
+    # Job state
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='COMPLETED')
+    error_message = models.TextField(blank=True, help_text='Failure reason for asynchronous jobs')
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
-    response_time_ms = models.IntegerField(null=True, blank=True, help_text='LLM response time in milliseconds')
+    response_time_ms = models.IntegerField(null=True, blank=True, help_text='Response time in milliseconds')
+    source = models.CharField(
+        max_length=10,
+        choices=SOURCE_CHOICES,
+        blank=True,
+        help_text='Where the response came from'
+    )
+    model_name = models.CharField(max_length=100, blank=True, help_text='LLM model that generated the response')
     
     class Meta:
         db_table = 'medicine_recommendations'
@@ -44,3 +74,64 @@ class MedicineRecommendation(models.Model):
     
     def __str__(self):
         return f"Recommendation for {self.medicine_name} by {self.requested_by.username}"
+
+
+class RecommendationRollup(models.Model):
+    """
+    Completed recommendations per medicine per hour and per day (UTC).
+    
+    Maintained incrementally as recommendations complete, so statistics
+    read a few aggregate rows instead of scanning every recommendation.
+    """
+    
+    GRANULARITY_CHOICES = [
+        ('HOUR', 'Hour'),
+        ('DAY', 'Day'),
+    ]
+    
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    medicine_name = models.CharField(max_length=255)
+    
+    request_count = models.PositiveIntegerField(default=0)
+    response_time_total_ms = models.BigIntegerField(default=0)
+    response_time_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Requests with a recorded response time'
+    )
+    cache_hit_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Requests answered from the cache (fresh or stale) or a concurrent identical request'
+    )
+    
+    class Meta:
+        db_table = 'recommendation_rollups'
+        verbose_name = 'Recommendation Rollup'
+        verbose_name_plural = 'Recommendation Rollups'
+        unique_together = [['granularity', 'bucket_start', 'medicine_name']]
+    
+    def __str__(self):
+        return f"{self.medicine_name} {self.granularity.lower()} of {self.bucket_start}: {self.request_count}"
+
+
+class RecommendationUserRollup(models.Model):
+    """Completed recommendations per user per hour and per day (UTC), for unique user counts."""
+    
+    granularity = models.CharField(max_length=4, choices=RecommendationRollup.GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendation_rollups'
+    )
+    
+    request_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'recommendation_user_rollups'
+        verbose_name = 'Recommendation User Rollup'
+        verbose_name_plural = 'Recommendation User Rollups'
+        unique_together = [['granularity', 'bucket_start', 'user']]
+    
+    def __str__(self):
+        return f"{self.user.username} {self.granularity.lower()} of {self.bucket_start}: {self.request_count}"
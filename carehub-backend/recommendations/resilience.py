@@ -0,0 +1,187 @@
+"""
+Failure handling for calls to the GROQ LLM.
+
+A slow or failing upstream must not hold request workers. Calls get a total
+deadline shared by all attempts, transient errors are retried a bounded
+number of times with full-jitter exponential backoff, and a circuit breaker
+stops calling the upstream after repeated failures so requests fail fast to
+a fallback until a trial call succeeds again.
+
+Breaker state is kept per process; each web and Celery worker process
+opens and closes its own breaker.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    CLOSED: calls go through; ``failure_threshold`` consecutive failures
+    open the breaker. OPEN: calls are rejected until ``reset_timeout``
+    seconds have passed. HALF_OPEN: a single trial call is let through;
+    success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    def __init__(self, name, failure_threshold, reset_timeout, clock=time.monotonic):
+        """
+        Args:
+            name: Name used in logs and metrics
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds to stay open before allowing a trial call
+            clock: Monotonic time source (replaceable in tests)
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._opened_at_wall = None
+        self._trial_in_flight = False
+        self._counts = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self):
+        """
+        Check whether a call may go to the upstream now.
+
+        Every allowed call must be followed by record_success,
+        record_failure or release.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = True
+                logger.info(f"Circuit breaker {self.name} half-open, sending a trial call")
+                return True
+            self._counts['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._counts['successes'] += 1
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit breaker {self.name} closed")
+                self._state = self.CLOSED
+                self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._counts['failures'] += 1
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._counts['opened'] += 1
+                    logger.warning(
+                        f"Circuit breaker {self.name} opened after "
+                        f"{self._consecutive_failures} consecutive failures"
+                    )
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._opened_at_wall = datetime.now(timezone.utc)
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give up an allowed call without an outcome (e.g. the caller was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self):
+        """
+        Current state and counters, for health checks and metrics.
+
+        Returns:
+            dict: state, consecutive_failures, failure_threshold,
+                reset_timeout_seconds, opened_at, retry_in_seconds and the
+                successes/failures/rejected/opened totals
+        """
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+            return {
+                'name': self.name,
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout_seconds': self.reset_timeout,
+                'opened_at': self._opened_at_wall.isoformat() if self._opened_at_wall else None,
+                'retry_in_seconds': retry_in,
+                **self._counts,
+            }
+
+    def _current_state(self):
+        # OPEN becomes HALF_OPEN lazily, once the reset timeout has passed
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_retries(func, deadline, max_retries, base_delay, max_delay, is_retryable, sleep=time.sleep):
+    """
+    Call ``func(timeout)`` until it succeeds, retrying transient errors.
+
+    Args:
+        func: Callable taking the seconds left before the deadline
+        deadline: time.monotonic() value after which no attempt is started
+        max_retries: Retries after the first attempt
+        base_delay: Backoff base delay in seconds
+        max_delay: Backoff delay cap in seconds
+        is_retryable: Callable telling whether an exception is transient
+        sleep: Sleep function (replaceable in tests)
+
+    Returns:
+        The return value of ``func``
+
+    Raises:
+        TimeoutError: If the deadline passed before an attempt could start
+        Exception: The last error, if it is not retryable or retries ran out
+    """
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Deadline exceeded before the call could be made")
+        try:
+            return func(remaining)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if time.monotonic() + delay >= deadline:
+                raise
+            logger.warning(f"Retrying after transient error ({str(e)}) in {delay:.2f}s")
+            sleep(delay)
+            attempt += 1
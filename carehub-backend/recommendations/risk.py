@@ -0,0 +1,162 @@
+"""
+Clinical risk signatures for approximate recommendation cache matching.
+
+Exact patient information rarely repeats (ages, weights and medication
+lists all vary), so exact cache keys seldom hit. A risk signature keeps only
+what changes the clinical advice for a medicine: age band, pregnancy and
+breastfeeding, renal and hepatic impairment, and the drug classes the
+patient is allergic to. Patients with the same signature can share a
+cached recommendation; warnings that depend on the exact patient (specific
+allergies, interactions with current medications) are recomputed locally.
+"""
+from .knowledge_base import get_medicine_index, normalize_medicine_name
+
+# Part of every signature, so signatures are recognized (risk_signature is
+# idempotent) and cache keys change when the signature definition does
+RISK_SIGNATURE_VERSION = 1
+
+# (upper age bound, exclusive; band), matching catalog contraindications
+# such as "Children under 2" and "Children under 12"
+AGE_BANDS = [
+    (2, 'infant'),
+    (12, 'child'),
+    (18, 'adolescent'),
+    (65, 'adult'),
+]
+OLDEST_AGE_BAND = 'older_adult'
+
+PREGNANCY_TERMS = ('pregnan',)
+BREASTFEEDING_TERMS = ('breastfeed', 'breast feed', 'lactat')
+RENAL_TERMS = ('renal', 'kidney', 'ckd', 'dialysis', 'nephr', 'egfr')
+HEPATIC_TERMS = ('hepat', 'liver', 'cirrhosis')
+
+# Allergy class -> terms found in allergy names or catalog drug classes
+ALLERGY_CLASSES = {
+    'penicillins': ('penicillin',),
+    'cephalosporins': ('cephalosporin',),
+    'sulfonamides': ('sulfonamide', 'sulfa', 'sulpha'),
+    'nsaids': ('nsaid', 'aspirin'),
+    'macrolides': ('macrolide',),
+    'fluoroquinolones': ('fluoroquinolone', 'quinolone'),
+    'tetracyclines': ('tetracycline',),
+    'opioids': ('opioid',),
+    'sulfonylureas': ('sulfonylurea',),
+}
+
+
+def age_band(age):
+    """Age band for an age in years, or None if unknown."""
+    if not isinstance(age, (int, float)) or isinstance(age, bool):
+        return None
+    for upper, band in AGE_BANDS:
+        if age < upper:
+            return band
+    return OLDEST_AGE_BAND
+
+
+def _mentions(conditions, terms):
+    return any(term in condition for condition in conditions for term in terms)
+
+
+def _classes_in(text):
+    return {name for name, terms in ALLERGY_CLASSES.items() if any(term in text for term in terms)}
+
+
+def allergy_classes(allergy: str):
+    """
+    Drug classes an allergy covers.
+
+    The allergy is matched against class names ("penicillin", "sulfa
+    drugs") and, if it names a catalog medicine or generic, that
+    medicine's drug class ("amoxicillin" and "Augmentin" are penicillins).
+    """
+    classes = _classes_in(allergy.casefold())
+    medicine = get_medicine_index().get(allergy)
+    if medicine is not None:
+        classes |= _classes_in(medicine['drug_class'].casefold())
+    return classes
+
+
+def medicine_classes(medicine: dict):
+    """Allergy classes a catalog medicine belongs to."""
+    return _classes_in(medicine['drug_class'].casefold())
+
+
+def _text_list(values):
+    return [value.casefold() for value in values or [] if isinstance(value, str)]
+
+
+def risk_signature(patient_info: dict):
+    """
+    Reduce patient information to a clinical risk signature.
+
+    Args:
+        patient_info: Patient information as accepted by the recommendation API
+
+    Returns:
+        dict: risk_signature (version), age_band, pregnant, breastfeeding,
+            renal_impairment, hepatic_impairment and allergy_classes
+            (sorted). Equal signatures can share a cached recommendation;
+            a signature is returned unchanged.
+
+    Example:
+        >>> risk_signature({'age': 70, 'allergies': ['Amoxicillin'], 'comorbidities': ['CKD stage 3']})
+        {'risk_signature': 1, 'age_band': 'older_adult', 'pregnant': False,
+         'breastfeeding': False, 'renal_impairment': True,
+         'hepatic_impairment': False, 'allergy_classes': ['penicillins']}
+    """
+    patient_info = patient_info or {}
+    if patient_info.get('risk_signature') == RISK_SIGNATURE_VERSION:
+        return patient_info
+    conditions = _text_list(patient_info.get('comorbidities'))
+    classes = set()
+    for allergy in patient_info.get('allergies') or []:
+        if isinstance(allergy, str):
+            classes |= allergy_classes(allergy)
+
+    return {
+        'risk_signature': RISK_SIGNATURE_VERSION,
+        'age_band': age_band(patient_info.get('age')),
+        'pregnant': _mentions(conditions, PREGNANCY_TERMS),
+        'breastfeeding': _mentions(conditions, BREASTFEEDING_TERMS),
+        'renal_impairment': _mentions(conditions, RENAL_TERMS),
+        'hepatic_impairment': _mentions(conditions, HEPATIC_TERMS),
+        'allergy_classes': sorted(classes),
+    }
+
+
+def allergy_warnings(medicine_name: str, allergies):
+    """
+    Warnings for patient allergies that apply to a medicine.
+
+    An allergy applies if it names the medicine or one of its generics, or
+    covers a drug class the medicine belongs to.
+
+    Returns:
+        list: Recommendation warning dicts (condition, message, severity)
+    """
+    medicine = get_medicine_index().get(medicine_name)
+    if medicine is None:
+        names = {normalize_medicine_name(medicine_name)}
+        classes = set()
+    else:
+        names = {normalize_medicine_name(name) for name in [medicine['name'], *medicine['generics']]}
+        classes = medicine_classes(medicine)
+
+    warnings = []
+    for allergy in allergies or []:
+        if not isinstance(allergy, str) or not allergy.strip():
+            continue
+        if normalize_medicine_name(allergy) in names:
+            reason = f"{medicine_name} is or contains {allergy}"
+        else:
+            shared = sorted(allergy_classes(allergy) & classes)
+            if not shared:
+                continue
+            reason = f"{medicine_name} belongs to the same drug class ({', '.join(shared)})"
+        warnings.append({
+            "condition": f"Allergy to {allergy}",
+            "message": f"Patient is allergic to {allergy}: {reason}.",
+            "severity": "HIGH"
+        })
+    return warnings
@@ -1,7 +1,11 @@
 """
 Serializers for recommendations app.
 """
+from datetime import datetime, time, timezone as dt_timezone
 from rest_framework import serializers
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from .models import MedicineRecommendation
 
 
@@ -55,6 +59,42 @@ class MedicineRecommendationRequestSerializer(serializers.Serializer):
         return value
 
 
+class BatchRecommendationRequestSerializer(serializers.Serializer):
+    """Serializer for batch recommendation request."""
+    
+    prescription_id = serializers.IntegerField(required=False)
+    medicines = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False
+    )
+    patient_info = serializers.JSONField(required=False, default=dict)
+    
+    validate_patient_info = MedicineRecommendationRequestSerializer.validate_patient_info
+    
+    def validate_medicines(self, value):
+        """Validate medicine names are not empty."""
+        names = [name.strip() for name in value]
+        if not all(names):
+            raise serializers.ValidationError("Medicine names cannot be empty.")
+        return names
+    
+    def validate(self, attrs):
+        """Require exactly one of prescription_id or medicines."""
+        if ('prescription_id' in attrs) == ('medicines' in attrs):
+            raise serializers.ValidationError("Provide either prescription_id or medicines.")
+        
+        medicines = attrs.get('medicines')
+        if medicines is not None:
+            if not medicines:
+                raise serializers.ValidationError({"medicines": "Provide at least one medicine."})
+            if len(medicines) > settings.RECOMMENDATION_BATCH_MAX_SIZE:
+                raise serializers.ValidationError({
+                    "medicines": f"At most {settings.RECOMMENDATION_BATCH_MAX_SIZE} medicines per batch."
+                })
+        
+        return attrs
+
+
 class MedicineRecommendationSerializer(serializers.ModelSerializer):
     """Serializer for MedicineRecommendation model."""
     
@@ -65,7 +105,7 @@ class MedicineRecommendationSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'requested_by', 'requested_by_username', 'medicine_name',
             'patient_info', 'alternatives', 'warnings', 'suggestion',
-            'created_at', 'response_time_ms'
+            'status', 'created_at', 'response_time_ms', 'source', 'model_name'
         ]
         read_only_fields = fields
 
@@ -80,18 +120,161 @@ class MedicineRecommendationResponseSerializer(serializers.Serializer):
     suggestion = serializers.CharField()
     response_time_ms = serializers.IntegerField()
     cached = serializers.BooleanField(default=False)
+    source = serializers.ChoiceField(choices=MedicineRecommendation.SOURCE_CHOICES)
+    model = serializers.CharField(allow_null=True)
     note = serializers.CharField(required=False)
 
 
+class BatchRecommendationItemSerializer(MedicineRecommendationResponseSerializer):
+    """Serializer for one medicine in a batch recommendation response."""
+    
+    id = serializers.IntegerField(required=False)
+    alternatives = serializers.ListField(child=serializers.DictField(), required=False)
+    warnings = serializers.ListField(child=serializers.DictField(), required=False)
+    suggestion = serializers.CharField(required=False)
+    response_time_ms = serializers.IntegerField(required=False)
+    source = serializers.ChoiceField(choices=MedicineRecommendation.SOURCE_CHOICES, required=False)
+    model = serializers.CharField(allow_null=True, required=False)
+    error = serializers.CharField(required=False)
+
+
+class BatchRecommendationResponseSerializer(serializers.Serializer):
+    """Response serializer for batch recommendations."""
+    prescription_id = serializers.IntegerField(allow_null=True)
+    total = serializers.IntegerField()
+    cached_count = serializers.IntegerField()
+    results = BatchRecommendationItemSerializer(many=True)
+
+
+class RecommendationJobCreatedSerializer(serializers.Serializer):
+    """Response serializer for a queued recommendation job."""
+    id = serializers.IntegerField()
+    status = serializers.CharField()
+    status_url = serializers.URLField()
+
+
+class RecommendationJobSerializer(serializers.ModelSerializer):
+    """Serializer for asynchronous recommendation job status."""
+    
+    result = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = MedicineRecommendation
+        fields = [
+            'id', 'medicine_name', 'status', 'error_message', 'result',
+            'created_at', 'completed_at'
+        ]
+        read_only_fields = fields
+    
+    def get_result(self, obj):
+        """Recommendation payload, available once the job has completed."""
+        if obj.status != 'COMPLETED':
+            return None
+        return {
+            'alternatives': obj.alternatives,
+            'warnings': obj.warnings,
+            'suggestion': obj.suggestion,
+            'response_time_ms': obj.response_time_ms,
+            'source': obj.source,
+            'model': obj.model_name or None,
+        }
+
+
+class ClearCacheRequestSerializer(serializers.Serializer):
+    """Request serializer for cache clearing."""
+    medicine_name = serializers.CharField(
+        max_length=255, required=False, allow_blank=True,
+        help_text='Only clear recommendations for this medicine'
+    )
+
+
 class ClearCacheResponseSerializer(serializers.Serializer):
     """Response serializer for cache clearing."""
     message = serializers.CharField()
 
 
+class CircuitBreakerStateSerializer(serializers.Serializer):
+    """Circuit breaker state and counters for this worker process."""
+    name = serializers.CharField()
+    state = serializers.ChoiceField(choices=['CLOSED', 'OPEN', 'HALF_OPEN'])
+    consecutive_failures = serializers.IntegerField()
+    failure_threshold = serializers.IntegerField()
+    reset_timeout_seconds = serializers.FloatField()
+    opened_at = serializers.DateTimeField(allow_null=True)
+    retry_in_seconds = serializers.FloatField(allow_null=True)
+    successes = serializers.IntegerField()
+    failures = serializers.IntegerField()
+    rejected = serializers.IntegerField()
+    opened = serializers.IntegerField()
+
+
+class RecommendationHealthSerializer(serializers.Serializer):
+    """Response serializer for recommendation service health."""
+    llm_configured = serializers.BooleanField()
+    model = serializers.CharField()
+    timeout_seconds = serializers.FloatField()
+    max_retries = serializers.IntegerField()
+    circuit_breaker = CircuitBreakerStateSerializer()
+
+
+class RecommendationStatsQuerySerializer(serializers.Serializer):
+    """Query parameters for recommendation statistics."""
+    
+    start = serializers.CharField(required=False, help_text='ISO date or datetime (inclusive, UTC if no offset)')
+    end = serializers.CharField(required=False, help_text='ISO date or datetime (exclusive, UTC if no offset)')
+    
+    def _parse(self, value):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            if date is None:
+                raise serializers.ValidationError("Enter an ISO 8601 date or datetime.")
+            parsed = datetime.combine(date, time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+    
+    def validate_start(self, value):
+        return self._parse(value)
+    
+    def validate_end(self, value):
+        return self._parse(value)
+    
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError({"end": "End must be after start."})
+        return attrs
+
+
 class RecommendationStatsSerializer(serializers.Serializer):
     """Response serializer for recommendation statistics."""
+    start = serializers.DateTimeField(allow_null=True)
+    end = serializers.DateTimeField(allow_null=True)
     total_recommendations = serializers.IntegerField()
     unique_medicines = serializers.IntegerField()
     unique_users = serializers.IntegerField()
     avg_response_time_ms = serializers.FloatField()
+    cache_hit_rate = serializers.FloatField(allow_null=True)
     top_medicines = serializers.ListField(child=serializers.DictField())
+
+
+class MedicineAutocompleteQuerySerializer(serializers.Serializer):
+    """Query parameters for medicine name autocomplete."""
+    
+    q = serializers.CharField(max_length=100, trim_whitespace=True)
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=25)
+
+
+class MedicineSuggestionSerializer(serializers.Serializer):
+    """A medicine suggested for partially typed text."""
+    name = serializers.CharField(help_text='Catalog name to submit as medicine_name')
+    matched = serializers.CharField(help_text='Name, brand name or generic that matched the query')
+    generics = serializers.ListField(child=serializers.CharField())
+    drug_class = serializers.CharField()
+    typos = serializers.IntegerField(help_text='Edits between the query and the matched text')
+
+
+class MedicineAutocompleteResponseSerializer(serializers.Serializer):
+    """Response serializer for medicine name autocomplete."""
+    query = serializers.CharField()
+    results = MedicineSuggestionSerializer(many=True)
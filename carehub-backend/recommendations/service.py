@@ -1,69 +1,229 @@
 """
 Service module for medicine recommendations using GROQ.
 """
+import hashlib
 import json
 import logging
 import time
-from pathlib import Path
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from django.conf import settings
 from django.core.cache import cache
 
+from .coalescing import single_flight
+from .interactions import check_interactions, medication_names
+from .knowledge_base import get_medicine_index
+from .llm import (
+    SYSTEM_PROMPT,
+    get_groq_client,
+    get_async_groq_client,
+    get_llm_circuit_breaker,
+    is_transient_error,
+)
+from .resilience import CircuitOpenError, call_with_retries
+from .risk import allergy_warnings, risk_signature
+from .streaming import StreamingRecommendationParser
+
 logger = logging.getLogger(__name__)
 
 
-def query_medical_data_groq(query):
+SOURCE_CACHE = 'cache'
+SOURCE_COALESCED = 'coalesced'
+SOURCE_LLM = 'llm'
+SOURCE_MOCK = 'mock'
+SOURCE_STALE = 'stale'
+
+
+@dataclass(frozen=True)
+class RecommendationResult:
+    """
+    A recommendation together with where it came from.
+    
+    Attributes:
+        data: Structured recommendation (alternatives, warnings, suggestion)
+        source: SOURCE_CACHE, SOURCE_COALESCED (shared with a concurrent
+            identical request), SOURCE_STALE (an expired answer served while
+            the LLM is unavailable), SOURCE_LLM or SOURCE_MOCK
+        latency_ms: Time taken to answer this call, in milliseconds
+        model: LLM model that generated the recommendation (None for mocks)
+    """
+    data: dict
+    source: str
+    latency_ms: int
+    model: str = None
+    
+    @property
+    def cached(self):
+        """Whether the recommendation was generated for an earlier request."""
+        return self.source in (SOURCE_CACHE, SOURCE_COALESCED, SOURCE_STALE)
+
+
+def _elapsed_ms(start_time: float):
+    return int((time.time() - start_time) * 1000)
+
+
+def canonical_medicine_name(medicine_name: str):
+    """Case- and whitespace-insensitive form of a medicine name."""
+    return ' '.join(medicine_name.split()).lower()
+
+
+CACHE_NAMESPACE = 'med_rec'
+GLOBAL_VERSION_KEY = f"{CACHE_NAMESPACE}:version"
+
+
+def _medicine_version_key(name_digest: str):
+    return f"{CACHE_NAMESPACE}:version:{name_digest}"
+
+
+def _new_version():
+    # Time-based, so a version key that was evicted never restarts at a
+    # value whose entries may still be cached
+    return int(time.time() * 1000)
+
+
+def _request_digests(medicine_name: str, patient_info: dict):
+    canonical_info = {
+        key: sorted(value, key=str) if isinstance(value, list) else value
+        for key, value in (patient_info or {}).items()
+    }
+    name_digest = hashlib.sha256(
+        canonical_medicine_name(medicine_name).encode('utf-8')
+    ).hexdigest()[:16]
+    info_digest = hashlib.sha256(
+        json.dumps(canonical_info, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+    return name_digest, info_digest
+
+
+def _resolve_versions(version_keys: list, versions: dict):
+    """Fill in versions missing from a get_many result, initializing them."""
+    for key in version_keys:
+        if key not in versions:
+            version = _new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)  # Initialized concurrently
+            versions[key] = version
+    return versions
+
+
+def _stale_key(cache_key: str):
+    return f"{cache_key}:stale"
+
+
+def _format_cache_key(name_digest: str, info_digest: str, versions: dict):
+    return (
+        f"{CACHE_NAMESPACE}:v{versions[GLOBAL_VERSION_KEY]}:{name_digest}"
+        f":v{versions[_medicine_version_key(name_digest)]}:{info_digest}"
+    )
+
+
+def build_cache_keys(medicine_names: list, patient_info: dict = None):
+    """
+    Build the canonical cache keys for several medicines at once.
+    
+    Keys embed the global and per-medicine cache versions, read in a single
+    cache round trip; invalidation bumps a version so old entries are
+    simply never read again and expire on their own.
+    
+    Returns:
+        dict: Cache key for each medicine name
+    """
+    digests = {name: _request_digests(name, patient_info) for name in medicine_names}
+    version_keys = [GLOBAL_VERSION_KEY] + list({
+        _medicine_version_key(name_digest) for name_digest, _ in digests.values()
+    })
+    versions = _resolve_versions(version_keys, cache.get_many(version_keys))
+    return {
+        name: _format_cache_key(name_digest, info_digest, versions)
+        for name, (name_digest, info_digest) in digests.items()
+    }
+
+
+def build_cache_key(medicine_name: str, patient_info: dict = None):
+    """
+    Build the canonical cache key for a recommendation request.
+    
+    Equivalent requests share a key: medicine names are compared via
+    canonical_medicine_name and list fields in patient_info are
+    order-insensitive. Both parts are hashed so keys stay short and safe
+    for any cache backend, and the key carries the current cache versions
+    (see build_cache_keys).
     """
-    Query medical database/dataset using GROQ.
+    return build_cache_keys([medicine_name], patient_info)[medicine_name]
+
+
+async def abuild_cache_key(medicine_name: str, patient_info: dict = None):
+    """Async version of build_cache_key."""
+    name_digest, info_digest = _request_digests(medicine_name, patient_info)
+    version_keys = [GLOBAL_VERSION_KEY, _medicine_version_key(name_digest)]
+    versions = await cache.aget_many(version_keys)
+    if len(versions) < len(version_keys):
+        versions = await sync_to_async(_resolve_versions)(version_keys, versions)
+    return _format_cache_key(name_digest, info_digest, versions)
+
+
+def cache_profile(patient_info: dict):
+    """
+    Patient information that cached recommendations are keyed and generated on.
     
-    This is a placeholder function that should be implemented with actual
-    GROQ query logic against a medical database.
+    With RECOMMENDATION_CACHE_MATCHING = 'risk' this is the patient's
+    clinical risk signature (see risk.py), so patients with the same
+    signature share cached recommendations and the LLM only sees the
+    signature. Otherwise ('exact') it is the full patient information.
+    """
+    if settings.RECOMMENDATION_CACHE_MATCHING == 'risk':
+        return risk_signature(patient_info)
+    return patient_info
+
+
+def query_medical_data(medicine_name: str):
+    """
+    Look up facts about a medicine in the local medicine catalog.
+    
+    Only the requested medicine's own entry and its listed alternatives are
+    returned, so the LLM prompt carries just the relevant facts.
     
     Args:
-        query: GROQ query string
+        medicine_name: Medicine name, brand name or generic
     
     Returns:
-        dict: Query results from medical database
-    
-    Example implementation:
-        from groq import Client
-        client = Client(api_key=settings.GROQ_API_KEY)
-        # Execute GROQ query against medical dataset
-        results = client.query(query)
-        return results
+        dict: medicine_info, alternatives and contraindications; medicine_info
+            has found=False if the medicine is not in the catalog
     """
-    # Placeholder implementation
-    # In production, this would query an actual medical database using GROQ
-    logger.info(f"GROQ Query: {query}")
+    index = get_medicine_index()
+    medicine = index.get(medicine_name)
+    if medicine is None:
+        logger.info(f"Medicine not in catalog: {medicine_name}")
+        return {
+            "medicine_info": {"name": medicine_name, "found": False},
+            "alternatives": [],
+            "contraindications": []
+        }
+    
+    alternatives = []
+    for alternative_name in medicine['alternatives']:
+        alternative = index.get(alternative_name)
+        alternatives.append({
+            "name": alternative_name,
+            "active_ingredient": " + ".join(alternative['generics']) if alternative else None,
+            "drug_class": alternative['drug_class'] if alternative else None
+        })
     
-    # Mock response for development
     return {
         "medicine_info": {
-            "name": query,
-            "category": "Analgesic",
-            "active_ingredient": "Paracetamol",
-            "common_uses": ["Pain relief", "Fever reduction"]
+            "name": medicine['name'],
+            "found": True,
+            "drug_class": medicine['drug_class'],
+            "active_ingredient": " + ".join(medicine['generics']),
+            "common_uses": medicine['common_uses']
         },
-        "alternatives": [
-            {
-                "name": "Ibuprofen",
-                "active_ingredient": "Ibuprofen",
-                "similarity_score": 0.85
-            },
-            {
-                "name": "Aspirin",
-                "active_ingredient": "Acetylsalicylic acid",
-                "similarity_score": 0.75
-            }
-        ],
-        "contraindications": [
-            "Liver disease",
-            "Alcohol consumption",
-            "Pregnancy (third trimester)"
-        ]
+        "alternatives": alternatives,
+        "contraindications": medicine['contraindications']
     }
 
 
-def get_medicine_recommendations(medicine_name: str, patient_info: dict = None):
+def get_medicine_recommendations(medicine_name: str, patient_info: dict = None, refresh: bool = False):
     """
     Get medicine recommendations using GROQ LLM.
     
@@ -74,12 +234,12 @@ def get_medicine_recommendations(medicine_name: str, patient_info: dict = None):
             - allergies: List of known allergies
             - comorbidities: List of existing conditions
             - current_medications: List of current medications
+        refresh: Regenerate and re-cache even if a cached response exists
     
     Returns:
-        dict: Structured recommendation response
-            - alternatives: List of alternative medicines
-            - warnings: List of warnings and contraindications
-            - suggestion: General recommendation
+        RecommendationResult: Structured recommendation response in ``data``
+            (alternatives, warnings, suggestion), with its source, latency
+            and model
     
     Raises:
         Exception: If GROQ API call fails
@@ -89,96 +249,501 @@ def get_medicine_recommendations(medicine_name: str, patient_info: dict = None):
     # Normalize inputs
     medicine_name = medicine_name.strip()
     patient_info = patient_info or {}
+    profile = cache_profile(patient_info)
     
+    result = _get_shared_recommendation(medicine_name, profile, start_time, refresh)
+    if profile is not patient_info:
+        result = _personalize(result, medicine_name, patient_info, start_time)
+    return result
+
+
+def _get_shared_recommendation(medicine_name: str, profile: dict, start_time: float, refresh: bool):
+    """Get the cached or coalesced recommendation for a cache profile, generating it on a miss."""
     # Check cache first
-    cache_key = f"med_rec_{medicine_name}_{json.dumps(patient_info, sort_keys=True)}"
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        logger.info(f"Returning cached recommendation for {medicine_name}")
-        return cached_result
+    cache_key = build_cache_key(medicine_name, profile)
+    if not refresh:
+        cached_result = cache.get(cache_key)
+        if cached_result:
+            logger.info(f"Returning cached recommendation for {medicine_name}")
+            return _cached_result(cached_result, start_time)
     
+    # Only one concurrent request per key calls the LLM; the rest wait for it
+    computed = []
+    
+    def compute():
+        computed.append(True)
+        return _generate_recommendation(medicine_name, profile, cache_key, start_time, refresh)
+    
+    result = single_flight(cache_key, compute)
+    if not computed:
+        result = replace(result, source=SOURCE_COALESCED, latency_ms=_elapsed_ms(start_time))
+    return result
+
+
+def _patient_warnings(medicine_name: str, patient_info: dict):
+    """Warnings that depend on the exact patient rather than their risk signature."""
+    interactions = check_interactions(
+        [medicine_name], medication_names(patient_info.get('current_medications'))
+    )
+    return (
+        allergy_warnings(medicine_name, patient_info.get('allergies'))
+        + _interaction_warnings({'interactions': interactions})
+    )
+
+
+def _personalize(result: RecommendationResult, medicine_name: str, patient_info: dict, start_time: float):
+    """Merge the patient's own warnings into a recommendation shared by their risk signature."""
+    data = {
+        **result.data,
+        'warnings': _merge_warnings(result.data.get('warnings', []), _patient_warnings(medicine_name, patient_info))
+    }
+    return replace(result, data=data, latency_ms=_elapsed_ms(start_time))
+
+
+def _cached_result(recommendation: dict, start_time: float):
+    return RecommendationResult(
+        data=recommendation,
+        source=SOURCE_CACHE,
+        latency_ms=_elapsed_ms(start_time),
+        model=recommendation.get('model')
+    )
+
+
+def _mock_result(medicine_name: str, patient_info: dict, medical_data: dict, start_time: float):
+    return RecommendationResult(
+        data=_get_mock_recommendation(medicine_name, patient_info, medical_data),
+        source=SOURCE_MOCK,
+        latency_ms=_elapsed_ms(start_time)
+    )
+
+
+def _fallback_result(medicine_name: str, patient_info: dict, medical_data: dict, cache_key: str,
+                     start_time: float):
+    """
+    Answer without the LLM: the last generated recommendation if one is
+    still kept (stale-while-revalidate), else a mock recommendation.
+    """
+    stale = cache.get(_stale_key(cache_key))
+    if stale:
+        logger.warning(f"Serving stale recommendation for {medicine_name}")
+        _schedule_revalidation(medicine_name, patient_info, cache_key)
+        return RecommendationResult(
+            data=stale,
+            source=SOURCE_STALE,
+            latency_ms=_elapsed_ms(start_time),
+            model=stale.get('model')
+        )
+    return _mock_result(medicine_name, patient_info, medical_data, start_time)
+
+
+def _revalidation_key(cache_key: str):
+    return f"{cache_key}:revalidate"
+
+
+def _schedule_revalidation(medicine_name: str, patient_info: dict, cache_key: str):
+    """Queue a background refresh of a stale recommendation, at most once per breaker reset period."""
+    delay = settings.GROQ_BREAKER_RESET_SECONDS
+    if not cache.add(_revalidation_key(cache_key), True, max(1, int(delay))):
+        return
+    
+    from .tasks import revalidate_recommendation  # tasks imports this module
     try:
-        # Step 1: Query medical data using GROQ
-        groq_query = f"medicine.name == '{medicine_name}' || medicine.active_ingredient match '{medicine_name}'"
-        medical_data = query_medical_data_groq(groq_query)
-        
-        # Step 2: Load system prompt template
-        prompt_path = Path(__file__).parent / 'system_prompt.txt'
-        with open(prompt_path, 'r') as f:
-            system_prompt_template = f.read()
-        
-        # Step 3: Format system prompt with data
-        system_prompt = system_prompt_template.format(
-            medical_data=json.dumps(medical_data, indent=2),
-            patient_info=json.dumps(patient_info, indent=2),
-            medicine_name=medicine_name
+        revalidate_recommendation.apply_async((medicine_name, patient_info), countdown=delay)
+    except Exception as e:
+        logger.error(f"Failed to queue revalidation for {medicine_name}: {str(e)}")
+
+
+def hold_revalidation(medicine_name: str, patient_info: dict = None):
+    """
+    Keep a failed revalidation from queueing another one.
+    
+    Marks the recommendation as revalidating for one breaker reset period,
+    so a revalidation task that falls back to the stale answer again does
+    not reschedule itself; the next request after that period does.
+    """
+    profile = cache_profile(patient_info or {})
+    cache_key = build_cache_key(medicine_name.strip(), profile)
+    cache.set(_revalidation_key(cache_key), True, max(1, int(settings.GROQ_BREAKER_RESET_SECONDS)))
+
+
+def _store(cache_key: str, recommendation: dict):
+    """Cache a generated recommendation, keeping a stale copy for fallbacks."""
+    cache.set(cache_key, recommendation, settings.RECOMMENDATION_CACHE_TTL)
+    cache.set(
+        _stale_key(cache_key), recommendation,
+        settings.RECOMMENDATION_CACHE_TTL + settings.RECOMMENDATION_STALE_TTL
+    )
+
+
+async def _astore(cache_key: str, recommendation: dict):
+    """Async version of _store."""
+    await cache.aset(cache_key, recommendation, settings.RECOMMENDATION_CACHE_TTL)
+    await cache.aset(
+        _stale_key(cache_key), recommendation,
+        settings.RECOMMENDATION_CACHE_TTL + settings.RECOMMENDATION_STALE_TTL
+    )
+
+
+def _call_llm(medicine_name: str, patient_info: dict, medical_data: dict):
+    """
+    Ask GROQ for a recommendation within the latency budget.
+    
+    Transient errors are retried with jittered backoff until
+    GROQ_TIMEOUT_SECONDS have passed, and outcomes feed the circuit breaker.
+    
+    Returns:
+        dict: Parsed LLM recommendation
+    
+    Raises:
+        CircuitOpenError: If the circuit breaker is open (no call was made)
+        ImportError: If the groq library is not installed
+        Exception: If the call failed or the deadline passed
+    """
+    client = get_groq_client()
+    request = _build_llm_request(medicine_name, patient_info, medical_data)
+    
+    breaker = get_llm_circuit_breaker()
+    if not breaker.allow_request():
+        raise CircuitOpenError("GROQ circuit breaker is open")
+    
+    try:
+        chat_completion = call_with_retries(
+            lambda timeout: client.chat.completions.create(**request, timeout=timeout),
+            deadline=time.monotonic() + settings.GROQ_TIMEOUT_SECONDS,
+            max_retries=settings.GROQ_MAX_RETRIES,
+            base_delay=settings.GROQ_RETRY_BASE_DELAY_SECONDS,
+            max_delay=settings.GROQ_RETRY_MAX_DELAY_SECONDS,
+            is_retryable=is_transient_error
         )
+        recommendation = json.loads(chat_completion.choices[0].message.content)
+    except Exception:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    
+    breaker.record_success()
+    return recommendation
+
+
+def _generate_recommendation(medicine_name: str, patient_info: dict, cache_key: str, start_time: float,
+                             refresh: bool = False):
+    """
+    Generate a recommendation on a cache miss and cache it.
+    
+    Args:
+        medicine_name: Normalized medicine name
+        patient_info: Patient information
+        cache_key: Canonical cache key for this request
+        start_time: Request start time, used for response_time_ms
+        refresh: Regenerate even if the cache was filled meanwhile
+    
+    Returns:
+        RecommendationResult: Structured recommendation response
+    """
+    # Another worker may have filled the cache while we waited for the lock
+    if not refresh:
+        cached_result = cache.get(cache_key)
+        if cached_result:
+            return _cached_result(cached_result, start_time)
+    
+    try:
+        # Step 1: Look up catalog facts and interactions
+        medical_data = _gather_medical_data(medicine_name, patient_info)
         
-        # Step 4: Call GROQ LLM
+        # Step 2: Call GROQ LLM
         groq_api_key = settings.GROQ_API_KEY
         
         if not groq_api_key:
             logger.warning("GROQ_API_KEY not configured, returning mock response")
-            return _get_mock_recommendation(medicine_name, patient_info, medical_data)
+            return _mock_result(medicine_name, patient_info, medical_data, start_time)
         
-        # Import GROQ client
         try:
-            from groq import Groq
-            
-            client = Groq(api_key=groq_api_key)
-            
-            # Make LLM request
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Provide medicine recommendations for {medicine_name}"
-                    }
-                ],
-                model="mixtral-8x7b-32768",  # or another GROQ model
-                temperature=0.3,
-                max_tokens=2000,
-                response_format={"type": "json_object"}
-            )
-            
-            # Parse response
-            response_content = chat_completion.choices[0].message.content
-            recommendation = json.loads(response_content)
-            
+            recommendation = _call_llm(medicine_name, patient_info, medical_data)
         except ImportError:
             logger.error("GROQ library not installed. Install with: pip install groq")
-            return _get_mock_recommendation(medicine_name, patient_info, medical_data)
+            return _mock_result(medicine_name, patient_info, medical_data, start_time)
+        except CircuitOpenError:
+            logger.warning(f"GROQ circuit breaker open, not calling the LLM for {medicine_name}")
+            return _fallback_result(medicine_name, patient_info, medical_data, cache_key, start_time)
         except Exception as e:
             logger.error(f"GROQ LLM call failed: {str(e)}")
-            return _get_mock_recommendation(medicine_name, patient_info, medical_data)
+            return _fallback_result(medicine_name, patient_info, medical_data, cache_key, start_time)
         
-        # Step 5: Validate and normalize response
-        normalized_response = {
-            "alternatives": recommendation.get("alternatives", []),
-            "warnings": recommendation.get("warnings", []),
-            "suggestion": recommendation.get("suggestion", "Please consult a healthcare professional.")
-        }
+        # Step 3: Validate and normalize response
+        normalized_response = _normalize_response(recommendation, medical_data)
         
         # Calculate response time
-        response_time_ms = int((time.time() - start_time) * 1000)
+        response_time_ms = _elapsed_ms(start_time)
         normalized_response['response_time_ms'] = response_time_ms
+        normalized_response['model'] = settings.GROQ_MODEL
         
-        # Cache the result for 1 hour
-        cache.set(cache_key, normalized_response, 3600)
+        # Cache the result (RECOMMENDATION_CACHE_TTL, 1 hour by default)
+        _store(cache_key, normalized_response)
         
         logger.info(f"Generated recommendation for {medicine_name} in {response_time_ms}ms")
         
-        return normalized_response
+        return RecommendationResult(
+            data=normalized_response,
+            source=SOURCE_LLM,
+            latency_ms=response_time_ms,
+            model=settings.GROQ_MODEL
+        )
         
     except Exception as e:
         logger.error(f"Error generating medicine recommendation: {str(e)}")
         raise
 
 
+def get_batch_recommendations(medicine_names: list, patient_info: dict = None):
+    """
+    Get recommendations for several medicines at once.
+    
+    Cached medicines are read with a single cache round trip. Misses are
+    generated concurrently, at most RECOMMENDATION_BATCH_CONCURRENCY at a
+    time, each going through get_medicine_recommendations (and so through
+    coalescing and caching).
+    
+    Args:
+        medicine_names: Medicine names; duplicates are looked up once
+        patient_info: Patient information shared by all medicines
+    
+    Returns:
+        list: One dict per distinct medicine, in request order, with
+            - medicine_name: Medicine name as requested
+            - result: RecommendationResult (None on error)
+            - error: Error message if generation failed
+    """
+    start_time = time.time()
+    patient_info = patient_info or {}
+    profile = cache_profile(patient_info)
+    
+    names = {}
+    for name in medicine_names:
+        name = name.strip()
+        names.setdefault(canonical_medicine_name(name), name)
+    names = list(names.values())
+    
+    keys = build_cache_keys(names, profile)
+    cached = cache.get_many(list(keys.values()))
+    
+    results = {}
+    for name in names:
+        if keys[name] in cached:
+            result = _cached_result(cached[keys[name]], start_time)
+            if profile is not patient_info:
+                result = _personalize(result, name, patient_info, start_time)
+            results[name] = {'medicine_name': name, 'result': result, 'error': None}
+    misses = [name for name in names if name not in results]
+    
+    if misses:
+        workers = min(settings.RECOMMENDATION_BATCH_CONCURRENCY, len(misses))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(get_medicine_recommendations, name, patient_info): name
+                for name in misses
+            }
+            for future, name in futures.items():
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    logger.error(f"Batch recommendation for {name} failed: {str(e)}")
+                    result, error = None, str(e)
+                results[name] = {'medicine_name': name, 'result': result, 'error': error}
+    
+    logger.info(f"Batch recommendation: {len(names) - len(misses)} cached, {len(misses)} generated")
+    
+    return [results[name] for name in names]
+
+
+async def stream_medicine_recommendations(medicine_name: str, patient_info: dict = None):
+    """
+    Stream medicine recommendations from the GROQ LLM as they are generated.
+    
+    Cache hits, stale and mock responses are replayed as complete items.
+    Streamed requests are not coalesced, since each client consumes its own
+    token stream, nor retried once tokens may have been sent.
+    
+    Args:
+        medicine_name: Name of the medicine to get alternatives for
+        patient_info: Dictionary containing patient information
+    
+    Yields:
+        tuple: (event, data) pairs, in order:
+            - ('token', {'delta': str}) for each LLM token chunk
+            - ('alternative', dict) / ('warning', dict) as each item completes
+            - ('result', RecommendationResult) once, with the full
+              normalized response
+    
+    Raises:
+        Exception: If the LLM stream fails after output has been sent
+    """
+    start_time = time.time()
+    medicine_name = medicine_name.strip()
+    patient_info = patient_info or {}
+    
+    profile = cache_profile(patient_info)
+    
+    def personalize(result):
+        if profile is patient_info:
+            return result
+        return _personalize(result, medicine_name, patient_info, start_time)
+    
+    cache_key = await abuild_cache_key(medicine_name, profile)
+    cached_result = await cache.aget(cache_key)
+    if cached_result:
+        result = personalize(_cached_result(cached_result, start_time))
+        for event, item in _iter_items(result.data):
+            yield event, item
+        yield 'result', result
+        return
+    
+    medical_data = _gather_medical_data(medicine_name, profile)
+    
+    if not settings.GROQ_API_KEY:
+        logger.warning("GROQ_API_KEY not configured, returning mock response")
+        mock = _get_mock_recommendation(medicine_name, profile, medical_data)
+        result = personalize(RecommendationResult(mock, SOURCE_MOCK, _elapsed_ms(start_time)))
+        for event, item in _iter_items(result.data):
+            yield event, item
+        yield 'result', result
+        return
+    
+    parser = StreamingRecommendationParser()
+    try:
+        client = get_async_groq_client()
+        breaker = get_llm_circuit_breaker()
+        if not breaker.allow_request():
+            raise CircuitOpenError("GROQ circuit breaker is open")
+        try:
+            stream = await client.chat.completions.create(
+                **_build_llm_request(medicine_name, profile, medical_data),
+                stream=True,
+                timeout=settings.GROQ_TIMEOUT_SECONDS
+            )
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                delta = chunk.choices[0].delta.content
+                yield 'token', {'delta': delta}
+                for event, item in parser.feed(delta):
+                    yield event, item
+            recommendation = json.loads(parser.text)
+        except Exception:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()  # Client went away; the call has no outcome
+            raise
+        breaker.record_success()
+    except Exception as e:
+        if parser.text:
+            logger.error(f"GROQ LLM stream failed mid-response: {str(e)}")
+            raise
+        logger.error(f"GROQ LLM stream failed: {str(e)}")
+        fallback = personalize(await sync_to_async(_fallback_result)(
+            medicine_name, profile, medical_data, cache_key, start_time
+        ))
+        for event, item in _iter_items(fallback.data):
+            yield event, item
+        yield 'result', fallback
+        return
+    
+    normalized_response = _normalize_response(recommendation, medical_data)
+    response_time_ms = _elapsed_ms(start_time)
+    normalized_response['response_time_ms'] = response_time_ms
+    normalized_response['model'] = settings.GROQ_MODEL
+    await _astore(cache_key, normalized_response)
+    result = personalize(
+        RecommendationResult(normalized_response, SOURCE_LLM, response_time_ms, settings.GROQ_MODEL)
+    )
+    # Interaction and allergy warnings the LLM did not repeat are sent after its own
+    streamed_warnings = len(recommendation.get('warnings', []))
+    for item in result.data['warnings'][streamed_warnings:]:
+        yield 'warning', item
+    
+    logger.info(f"Streamed recommendation for {medicine_name} in {result.latency_ms}ms")
+    
+    yield 'result', result
+
+
+def _build_llm_request(medicine_name: str, patient_info: dict, medical_data: dict):
+    """Build chat completion arguments from the preloaded system prompt."""
+    system_prompt = SYSTEM_PROMPT.render(
+        medical_data=json.dumps(medical_data, indent=2),
+        patient_info=json.dumps(patient_info, indent=2),
+        medicine_name=medicine_name
+    )
+    return {
+        "messages": [
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": f"Provide medicine recommendations for {medicine_name}"
+            }
+        ],
+        "model": settings.GROQ_MODEL,
+        "temperature": 0.3,
+        "max_tokens": 2000,
+        "response_format": {"type": "json_object"}
+    }
+
+
+def _gather_medical_data(medicine_name: str, patient_info: dict):
+    """Catalog facts for the medicine plus its interactions with current medications."""
+    medical_data = query_medical_data(medicine_name)
+    medical_data['interactions'] = check_interactions(
+        [medicine_name], medication_names(patient_info.get('current_medications'))
+    )
+    return medical_data
+
+
+def _interaction_warnings(medical_data: dict):
+    """Recommendation warnings for interactions found in the medical data."""
+    return [
+        {
+            "condition": f"Taking {interaction['interacts_with']}",
+            "message": f"Interaction with {interaction['interacts_with']}: {interaction['effect']}",
+            "severity": interaction['severity']
+        }
+        for interaction in medical_data.get('interactions', [])
+    ]
+
+
+def _normalize_response(recommendation: dict, medical_data: dict):
+    """
+    Keep only the expected fields of an LLM recommendation.
+    
+    Locally detected interactions are appended to the warnings unless the
+    LLM already reported a warning for the same condition.
+    """
+    return {
+        "alternatives": recommendation.get("alternatives", []),
+        "warnings": _merge_warnings(recommendation.get("warnings", []), _interaction_warnings(medical_data)),
+        "suggestion": recommendation.get("suggestion", "Please consult a healthcare professional.")
+    }
+
+
+def _merge_warnings(warnings: list, extra: list):
+    """Append extra warnings unless a warning for the same condition is already present."""
+    warnings = list(warnings)
+    reported = {str(warning.get("condition", "")).lower() for warning in warnings if isinstance(warning, dict)}
+    warnings.extend(warning for warning in extra if warning["condition"].lower() not in reported)
+    return warnings
+
+
+def _iter_items(recommendation: dict):
+    """Yield (event, item) pairs for a complete recommendation, alternatives first."""
+    for item in recommendation.get('alternatives', []):
+        yield 'alternative', item
+    for item in recommendation.get('warnings', []):
+        yield 'warning', item
+
+
 def _get_mock_recommendation(medicine_name: str, patient_info: dict, medical_data: dict):
     """
     Generate a mock recommendation for development/testing.
@@ -186,7 +751,7 @@ def _get_mock_recommendation(medicine_name: str, patient_info: dict, medical_dat
     Args:
         medicine_name: Medicine name
         patient_info: Patient information
-        medical_data: Medical data from GROQ query
+        medical_data: Catalog data from query_medical_data
     
     Returns:
         dict: Mock recommendation response
@@ -199,7 +764,7 @@ def _get_mock_recommendation(medicine_name: str, patient_info: dict, medical_dat
             alternatives.append({
                 "name": alt.get('name', 'Unknown'),
                 "reason": f"Similar therapeutic effect to {medicine_name}",
-                "notes": f"Active ingredient: {alt.get('active_ingredient', 'N/A')}"
+                "notes": f"Active ingredient: {alt.get('active_ingredient') or 'N/A'}"
             })
     
     # Generate warnings based on patient info and contraindications
@@ -213,16 +778,23 @@ def _get_mock_recommendation(medicine_name: str, patient_info: dict, medical_dat
                 "severity": "MODERATE"
             })
     
-    # Check patient allergies
-    if patient_info.get('allergies'):
+    # Interactions with current medications
+    warnings.extend(_interaction_warnings(medical_data))
+    
+    # Check patient allergies (a risk signature only has the allergy classes)
+    allergies = patient_info.get('allergies') or patient_info.get('allergy_classes')
+    if allergies:
         warnings.append({
             "condition": "Known allergies",
-            "message": f"Patient has allergies to: {', '.join(patient_info['allergies'])}. Verify no cross-reactivity.",
+            "message": f"Patient has allergies to: {', '.join(allergies)}. Verify no cross-reactivity.",
             "severity": "HIGH"
         })
     
-    # Check patient age
+    # Check patient age (or age band of a risk signature)
     age = patient_info.get('age')
+    band = patient_info.get('age_band')
+    if band:
+        age = {'infant': 1, 'child': 11, 'older_adult': 66}.get(band)
     if age:
         if age < 12:
             warnings.append({
@@ -250,8 +822,31 @@ def _get_mock_recommendation(medicine_name: str, patient_info: dict, medical_dat
     }
 
 
-def clear_recommendation_cache():
-    """Clear all cached medicine recommendations."""
-    # This is a simplified version. In production, you'd want to track cache keys
-    logger.info("Clearing medicine recommendation cache")
-    cache.clear()
+def clear_recommendation_cache(medicine_name: str = None):
+    """
+    Invalidate cached medicine recommendations.
+    
+    Bumps the global recommendation cache version, or only the given
+    medicine's version. Nothing else in the shared cache (sessions, rate
+    limit counters) is touched, and stale entries expire on their own.
+    
+    Args:
+        medicine_name: Only invalidate recommendations for this medicine
+    
+    Returns:
+        int: The new cache version
+    """
+    if medicine_name:
+        version_key = _medicine_version_key(_request_digests(medicine_name, None)[0])
+        logger.info(f"Invalidating recommendation cache for {medicine_name}")
+    else:
+        version_key = GLOBAL_VERSION_KEY
+        logger.info("Invalidating medicine recommendation cache")
+    
+    try:
+        return cache.incr(version_key)
+    except ValueError:
+        # Version not initialized yet (or evicted); any fresh version invalidates
+        version = _new_version()
+        cache.set(version_key, version, None)
+        return version
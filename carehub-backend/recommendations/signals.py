@@ -0,0 +1,23 @@
+"""
+Signal handlers for recommendations app.
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import MedicineRecommendation
+from .stats import record_completed_recommendation
+
+
+@receiver(post_save, sender=MedicineRecommendation)
+def update_recommendation_rollups(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Count a recommendation in the statistics rollups when it completes.
+    
+    Synchronous requests are created COMPLETED; asynchronous jobs complete
+    with a save(update_fields=[..., 'status', ...]) from the Celery task.
+    Other saves are ignored so nothing is counted twice.
+    """
+    if kwargs.get('raw') or instance.status != 'COMPLETED':
+        return
+    if created or (update_fields is not None and 'status' in update_fields):
+        record_completed_recommendation(instance)
@@ -0,0 +1,191 @@
+"""
+Aggregates over recommendation history.
+
+Counts come from the hourly and daily rollup tables, which are updated as
+each recommendation completes (see signals.py). A date range is answered
+with daily rows for the whole days it covers and hourly rows for the
+partial days at either end. Shared by the statistics endpoint and the cache
+warm-up task.
+"""
+from datetime import timedelta, timezone as dt_timezone
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import MedicineRecommendation, RecommendationRollup, RecommendationUserRollup
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def _floor_hour(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(value):
+    return _floor_hour(value).replace(hour=0)
+
+
+def _ceil(value, floor, step):
+    floored = floor(value)
+    return floored if floored == value else floored + step
+
+
+def _increment(model, lookup, **increments):
+    """Atomically add to counters on the row matching lookup, creating it if needed."""
+    updates = {field: F(field) + amount for field, amount in increments.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **increments)
+    except IntegrityError:
+        # Created concurrently; add to that row instead
+        model.objects.filter(**lookup).update(**updates)
+
+
+def record_completed_recommendation(recommendation):
+    """
+    Add a completed recommendation to the hourly and daily rollups.
+    
+    Args:
+        recommendation: MedicineRecommendation that just completed
+    """
+    response_time_ms = recommendation.response_time_ms
+    buckets = [
+        ('HOUR', _floor_hour(recommendation.created_at)),
+        ('DAY', _floor_day(recommendation.created_at)),
+    ]
+    for granularity, bucket_start in buckets:
+        _increment(
+            RecommendationRollup,
+            {'granularity': granularity, 'bucket_start': bucket_start,
+             'medicine_name': recommendation.medicine_name},
+            request_count=1,
+            response_time_total_ms=response_time_ms or 0,
+            response_time_count=1 if response_time_ms is not None else 0,
+            cache_hit_count=1 if recommendation.source in ('cache', 'coalesced', 'stale') else 0,
+        )
+        _increment(
+            RecommendationUserRollup,
+            {'granularity': granularity, 'bucket_start': bucket_start,
+             'user_id': recommendation.requested_by_id},
+            request_count=1,
+        )
+
+
+def bucket_filter(start=None, end=None):
+    """
+    Select the rollup rows covering [start, end).
+    
+    Bounds are widened to whole hours. Without bounds, all daily rows are
+    selected.
+    
+    Returns:
+        Q: Filter for either rollup model
+    """
+    if start is None and end is None:
+        return Q(granularity='DAY')
+    
+    start = _floor_hour(start) if start is not None else None
+    end = _ceil(end, _floor_hour, HOUR) if end is not None else None
+    
+    # Whole days strictly inside the range come from daily rows
+    first_day = _ceil(start, _floor_day, DAY) if start is not None else None
+    last_day = _floor_day(end) if end is not None else None
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        # No whole day in range: hourly rows only
+        return Q(granularity='HOUR', bucket_start__gte=start, bucket_start__lt=end)
+    
+    daily = Q(granularity='DAY')
+    if first_day is not None:
+        daily &= Q(bucket_start__gte=first_day)
+    if last_day is not None:
+        daily &= Q(bucket_start__lt=last_day)
+    
+    hourly = Q(pk__in=[])
+    if start is not None:
+        hourly |= Q(granularity='HOUR', bucket_start__gte=start, bucket_start__lt=first_day)
+    if end is not None:
+        hourly |= Q(granularity='HOUR', bucket_start__gte=last_day, bucket_start__lt=end)
+    return daily | hourly
+
+
+def get_recommendation_stats(start=None, end=None, top_limit=10):
+    """
+    Recommendation statistics for a date range.
+    
+    Args:
+        start: Include recommendations requested at or after this datetime
+        end: Include recommendations requested before this datetime
+        top_limit: Number of top medicines to include
+    
+    Returns:
+        dict: total_recommendations, unique_medicines, unique_users,
+            avg_response_time_ms, cache_hit_rate and top_medicines
+    """
+    buckets = bucket_filter(start, end)
+    medicine_rows = RecommendationRollup.objects.filter(buckets)
+    totals = medicine_rows.aggregate(
+        total=Sum('request_count'),
+        response_time_total=Sum('response_time_total_ms'),
+        response_time_count=Sum('response_time_count'),
+        cache_hits=Sum('cache_hit_count'),
+        unique_medicines=Count('medicine_name', distinct=True),
+    )
+    
+    return {
+        'total_recommendations': totals['total'] or 0,
+        'unique_medicines': totals['unique_medicines'],
+        'unique_users': RecommendationUserRollup.objects.filter(buckets).aggregate(
+            unique_users=Count('user', distinct=True)
+        )['unique_users'],
+        'avg_response_time_ms': (
+            totals['response_time_total'] / totals['response_time_count']
+            if totals['response_time_count'] else None
+        ),
+        'cache_hit_rate': (
+            totals['cache_hits'] / totals['total'] if totals['total'] else None
+        ),
+        'top_medicines': get_top_medicines(limit=top_limit, start=start, end=end),
+    }
+
+
+def get_top_medicines(limit=10, start=None, end=None):
+    """
+    Most requested medicines.
+    
+    Args:
+        limit: Maximum number of medicines
+        start: Only count requests made at or after this datetime
+        end: Only count requests made before this datetime
+    
+    Returns:
+        list: Dicts with medicine_name and count, most requested first
+    """
+    return list(
+        RecommendationRollup.objects.filter(bucket_filter(start, end))
+        .values('medicine_name')
+        .annotate(count=Sum('request_count'))
+        .order_by('-count', 'medicine_name')[:limit]
+    )
+
+
+def get_common_patient_profiles(medicine_name, limit=3, since=None):
+    """
+    Patient info most often sent with requests for a medicine.
+    
+    Args:
+        medicine_name: Medicine name as stored on recommendations
+        limit: Maximum number of profiles
+        since: Only count requests made at or after this datetime
+    
+    Returns:
+        list: patient_info dicts, most common first
+    """
+    queryset = MedicineRecommendation.objects.filter(medicine_name=medicine_name)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    return [
+        row['patient_info'] or {}
+        for row in queryset.values('patient_info').annotate(count=Count('id')).order_by('-count')[:limit]
+    ]
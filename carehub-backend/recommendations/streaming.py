@@ -0,0 +1,91 @@
+"""
+Incremental parsing of streamed LLM recommendation JSON.
+"""
+import json
+
+
+class StreamingRecommendationParser:
+    """
+    Extract complete alternatives and warnings from a JSON document as it streams.
+
+    The LLM emits the recommendation JSON token by token. Each time an object
+    inside the top-level ``alternatives`` or ``warnings`` array is complete,
+    ``feed`` returns it so it can be shown before the rest has arrived.
+
+    Example:
+        parser = StreamingRecommendationParser()
+        for token in tokens:
+            for event, item in parser.feed(token):
+                ...  # event is 'alternative' or 'warning'
+    """
+
+    ARRAY_EVENTS = {'alternatives': 'alternative', 'warnings': 'warning'}
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_key = None
+        self._array = None
+        self._item_start = None
+
+    def feed(self, text):
+        """
+        Consume the next chunk of streamed text.
+
+        Args:
+            text: Next chunk of the JSON document
+
+        Returns:
+            list: (event, item) tuples for items completed by this chunk
+        """
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        # Strings directly in the top-level object are keys or values;
+                        # only keys are followed by an array we care about.
+                        self._last_key = buffer[self._string_start + 1:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in '{[':
+                if self._depth == 1 and char == '[':
+                    self._array = self.ARRAY_EVENTS.get(self._last_key)
+                elif self._depth == 2 and char == '{' and self._array:
+                    self._item_start = i
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 2 and char == '}' and self._item_start is not None:
+                    try:
+                        completed.append((self._array, json.loads(buffer[self._item_start:i + 1])))
+                    except ValueError:
+                        pass  # Malformed item; the final parse reports the error
+                    self._item_start = None
+                elif self._depth == 1 and char == ']':
+                    self._array = None
+
+        self._pos = len(buffer)
+        return completed
+
+    @property
+    def text(self):
+        """Full text received so far."""
+        return self._buffer
@@ -0,0 +1,149 @@
+"""
+Celery tasks for recommendations app.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import MedicineRecommendation
+from .service import build_cache_key, cache_profile, get_medicine_recommendations, hold_revalidation
+from .stats import get_common_patient_profiles, get_top_medicines
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def generate_recommendation(recommendation_id):
+    """
+    Generate the response for an asynchronous recommendation job.
+    
+    Args:
+        recommendation_id: ID of a PENDING MedicineRecommendation
+    """
+    try:
+        recommendation = MedicineRecommendation.objects.get(id=recommendation_id)
+    except MedicineRecommendation.DoesNotExist:
+        logger.warning(f"Recommendation job {recommendation_id} no longer exists")
+        return
+    
+    if recommendation.status not in ('PENDING', 'RUNNING'):
+        logger.info(f"Recommendation job {recommendation_id} already {recommendation.status}")
+        return
+    
+    recommendation.status = 'RUNNING'
+    recommendation.save(update_fields=['status'])
+    
+    try:
+        result = get_medicine_recommendations(
+            recommendation.medicine_name,
+            recommendation.patient_info
+        )
+    except Exception as e:
+        logger.error(f"Recommendation job {recommendation_id} failed: {str(e)}")
+        recommendation.status = 'FAILED'
+        recommendation.error_message = str(e)
+        recommendation.completed_at = timezone.now()
+        recommendation.save(update_fields=['status', 'error_message', 'completed_at'])
+        return
+    
+    recommendation.alternatives = result.data.get('alternatives', [])
+    recommendation.warnings = result.data.get('warnings', [])
+    recommendation.suggestion = result.data.get('suggestion', '')
+    recommendation.response_time_ms = result.latency_ms
+    recommendation.source = result.source
+    recommendation.model_name = result.model or ''
+    recommendation.status = 'COMPLETED'
+    recommendation.completed_at = timezone.now()
+    recommendation.save(update_fields=[
+        'alternatives', 'warnings', 'suggestion', 'response_time_ms',
+        'source', 'model_name', 'status', 'completed_at'
+    ])
+    
+    logger.info(f"Completed recommendation job {recommendation_id}")
+
+
+@shared_task(ignore_result=True)
+def revalidate_recommendation(medicine_name, patient_info):
+    """
+    Regenerate a recommendation that was served stale while GROQ was failing.
+    
+    Queued by the service when it falls back to a stale answer. If GROQ is
+    still unavailable the stale answer stays and the task does not requeue
+    itself; a request after the next breaker reset period queues another
+    attempt.
+    """
+    hold_revalidation(medicine_name, patient_info)
+    result = get_medicine_recommendations(medicine_name, patient_info, refresh=True)
+    logger.info(f"Revalidated recommendation for {medicine_name}: {result.source}")
+
+
+WARM_LOCK_KEY = 'med_rec:warm:lock'
+
+
+def get_warm_targets():
+    """
+    Requests worth keeping in the cache.
+    
+    The most requested medicines over RECOMMENDATION_WARM_LOOKBACK_DAYS, each
+    with no patient info and with its most common patient profiles.
+    
+    Returns:
+        list: (medicine_name, patient_info) pairs, one per cache key
+    """
+    since = timezone.now() - timedelta(days=settings.RECOMMENDATION_WARM_LOOKBACK_DAYS)
+    targets = {}
+    for row in get_top_medicines(limit=settings.RECOMMENDATION_WARM_TOP_MEDICINES, start=since):
+        medicine_name = row['medicine_name']
+        profiles = [{}] + get_common_patient_profiles(
+            medicine_name, limit=settings.RECOMMENDATION_WARM_PROFILES, since=since
+        )
+        for patient_info in profiles:
+            # Equivalent profiles (e.g. lists in another order, or the same
+            # risk signature) share a cache key
+            cache_key = build_cache_key(medicine_name, cache_profile(patient_info))
+            targets.setdefault(cache_key, (medicine_name, patient_info))
+    return list(targets.values())
+
+
+@shared_task(ignore_result=True)
+def warm_recommendation_cache():
+    """
+    Refresh cached recommendations for the most requested medicines.
+    
+    Scheduled by Celery beat more often than RECOMMENDATION_CACHE_TTL, so
+    popular recommendations are regenerated before they expire and are
+    repopulated soon after a deploy or cache invalidation. At most
+    RECOMMENDATION_WARM_CONCURRENCY recommendations are generated at once.
+    """
+    if not settings.GROQ_API_KEY:
+        logger.info("GROQ_API_KEY not configured, skipping recommendation cache warm-up")
+        return
+    
+    # Skip if the previous run is still going
+    if not cache.add(WARM_LOCK_KEY, timezone.now().isoformat(), settings.RECOMMENDATION_CACHE_TTL):
+        logger.info("Recommendation cache warm-up already running")
+        return
+    
+    try:
+        targets = get_warm_targets()
+        failed = 0
+        workers = max(1, min(settings.RECOMMENDATION_WARM_CONCURRENCY, len(targets)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(get_medicine_recommendations, medicine_name, patient_info, refresh=True)
+                for medicine_name, patient_info in targets
+            ]
+            for future, (medicine_name, _) in zip(futures, targets):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Cache warm-up for {medicine_name} failed: {str(e)}")
+    finally:
+        cache.delete(WARM_LOCK_KEY)
+    
+    logger.info(f"Warmed {len(targets) - failed} of {len(targets)} recommendations")
@@ -6,8 +6,13 @@ from .views import (
     MedicineRecommendationView,
     MedicineRecommendationHistoryView,
     MedicineRecommendationDetailView,
+    RecommendationJobView,
+    BatchRecommendationView,
+    stream_recommendation,
+    medicine_autocomplete,
     clear_cache,
     recommendation_stats,
+    recommendation_health,
 )
 
 app_name = 'recommendations'
@@ -16,6 +21,11 @@ urlpatterns = [
     path('', MedicineRecommendationView.as_view(), name='get-recommendation'),
     path('history/', MedicineRecommendationHistoryView.as_view(), name='recommendation-history'),
     path('<int:pk>/', MedicineRecommendationDetailView.as_view(), name='recommendation-detail'),
+    path('batch/', BatchRecommendationView.as_view(), name='batch-recommendation'),
+    path('stream/', stream_recommendation, name='recommendation-stream'),
+    path('jobs/<int:pk>/', RecommendationJobView.as_view(), name='recommendation-job'),
+    path('medicines/autocomplete/', medicine_autocomplete, name='medicine-autocomplete'),
     path('clear-cache/', clear_cache, name='clear-cache'),
     path('stats/', recommendation_stats, name='recommendation-stats'),
+    path('health/', recommendation_health, name='recommendation-health'),
 ]
@@ -7,19 +7,48 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
-from django.core.cache import cache
-from drf_spectacular.utils import extend_schema
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django_ratelimit.core import is_ratelimited
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from asgiref.sync import sync_to_async
+import json
 import logging
 
 from .models import MedicineRecommendation
+from records.models import Prescription
 from .serializers import (
     MedicineRecommendationRequestSerializer,
     MedicineRecommendationSerializer,
     MedicineRecommendationResponseSerializer,
+    ClearCacheRequestSerializer,
     ClearCacheResponseSerializer,
-    RecommendationStatsSerializer
+    RecommendationStatsSerializer,
+    RecommendationStatsQuerySerializer,
+    RecommendationJobSerializer,
+    RecommendationJobCreatedSerializer,
+    BatchRecommendationRequestSerializer,
+    BatchRecommendationResponseSerializer,
+    MedicineAutocompleteQuerySerializer,
+    MedicineAutocompleteResponseSerializer,
+    RecommendationHealthSerializer
 )
-from .service import get_medicine_recommendations
+from .service import (
+    get_medicine_recommendations,
+    get_batch_recommendations,
+    stream_medicine_recommendations,
+)
+from .knowledge_base import get_medicine_index, matched_label
+from .llm import get_llm_circuit_breaker
+from .tasks import generate_recommendation
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +58,11 @@ class MedicineRecommendationView(APIView):
     """
     Get medicine recommendations using GROQ LLM.
     POST /api/recommendations/
+    POST /api/recommendations/?async=true
+    
+    With async=true the request returns a job ID immediately and the
+    recommendation is generated by a Celery task; poll the job endpoint
+    for the result.
     
     Rate limited: 10 requests per hour per user
     """
@@ -36,7 +70,13 @@ class MedicineRecommendationView(APIView):
     
     @extend_schema(
         request=MedicineRecommendationRequestSerializer,
-        responses={200: MedicineRecommendationResponseSerializer}
+        parameters=[
+            OpenApiParameter('async', OpenApiTypes.BOOL, description='Queue the request and return a job ID')
+        ],
+        responses={
+            200: MedicineRecommendationResponseSerializer,
+            202: RecommendationJobCreatedSerializer
+        }
     )
     def post(self, request):
         serializer = MedicineRecommendationRequestSerializer(data=request.data)
@@ -45,14 +85,13 @@ class MedicineRecommendationView(APIView):
         medicine_name = serializer.validated_data['medicine_name']
         patient_info = serializer.validated_data.get('patient_info', {})
         
+        if request.query_params.get('async') == 'true':
+            return self._queue_job(request, medicine_name, patient_info)
+        
         try:
             # Get recommendations from service
-            recommendation_data = get_medicine_recommendations(medicine_name, patient_info)
-            
-            # Check if response was cached
-            import json
-            cache_key = f"med_rec_{medicine_name}_{json.dumps(patient_info, sort_keys=True)}"
-            was_cached = cache.get(cache_key) is not None
+            result = get_medicine_recommendations(medicine_name, patient_info)
+            recommendation_data = result.data
             
             # Save to database for history
             recommendation = MedicineRecommendation.objects.create(
@@ -62,7 +101,9 @@ class MedicineRecommendationView(APIView):
                 alternatives=recommendation_data.get('alternatives', []),
                 warnings=recommendation_data.get('warnings', []),
                 suggestion=recommendation_data.get('suggestion', ''),
-                response_time_ms=recommendation_data.get('response_time_ms')
+                response_time_ms=result.latency_ms,
+                source=result.source,
+                model_name=result.model or ''
             )
             
             # Prepare response
@@ -72,8 +113,10 @@ class MedicineRecommendationView(APIView):
                 'alternatives': recommendation_data.get('alternatives', []),
                 'warnings': recommendation_data.get('warnings', []),
                 'suggestion': recommendation_data.get('suggestion', ''),
-                'response_time_ms': recommendation_data.get('response_time_ms'),
-                'cached': was_cached,
+                'response_time_ms': result.latency_ms,
+                'cached': result.cached,
+                'source': result.source,
+                'model': result.model,
                 'note': recommendation_data.get('note', '')
             }
             
@@ -88,6 +131,256 @@ class MedicineRecommendationView(APIView):
                 },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    
+    def _queue_job(self, request, medicine_name, patient_info):
+        """Create a PENDING recommendation and hand it to a Celery worker."""
+        recommendation = MedicineRecommendation.objects.create(
+            requested_by=request.user,
+            medicine_name=medicine_name,
+            patient_info=patient_info,
+            status='PENDING'
+        )
+        
+        def enqueue():
+            try:
+                generate_recommendation.delay(recommendation.id)
+            except Exception as e:
+                logger.error(f"Failed to queue recommendation job {recommendation.id}: {str(e)}")
+                MedicineRecommendation.objects.filter(id=recommendation.id).update(
+                    status='FAILED',
+                    error_message='Could not queue recommendation job',
+                    completed_at=timezone.now()
+                )
+        
+        transaction.on_commit(enqueue)
+        
+        return Response(
+            {
+                'id': recommendation.id,
+                'status': recommendation.status,
+                'status_url': request.build_absolute_uri(
+                    reverse('recommendations:recommendation-job', kwargs={'pk': recommendation.id})
+                )
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+@method_decorator(ratelimit(key='user', rate='10/h', method='POST'), name='dispatch')
+class BatchRecommendationView(APIView):
+    """
+    Get medicine recommendations for a whole prescription or medicine list.
+    POST /api/recommendations/batch/
+    
+    Cached medicines are served immediately and the rest are generated
+    concurrently, so a prescription costs one request instead of one per
+    medicine.
+    
+    Rate limited: 10 requests per hour per user (a batch counts once)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @extend_schema(
+        request=BatchRecommendationRequestSerializer,
+        responses={200: BatchRecommendationResponseSerializer}
+    )
+    def post(self, request):
+        serializer = BatchRecommendationRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        patient_info = serializer.validated_data.get('patient_info', {})
+        prescription_id = serializer.validated_data.get('prescription_id')
+        
+        if prescription_id is not None:
+            prescription = self._get_prescription(request.user, prescription_id)
+            if prescription is None:
+                return Response(
+                    {'error': 'Prescription not found or you do not have permission'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            medicine_names = [
+                medicine['name'] for medicine in prescription.medicines
+                if isinstance(medicine, dict) and str(medicine.get('name', '')).strip()
+            ]
+            if not medicine_names:
+                return Response(
+                    {'error': 'Prescription has no medicines'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            medicine_names = serializer.validated_data['medicines']
+        
+        results = []
+        for item in get_batch_recommendations(medicine_names, patient_info):
+            result = item['result']
+            if result is None:
+                results.append({
+                    'medicine_name': item['medicine_name'],
+                    'cached': False,
+                    'error': (
+                        item['error'] if request.user.user_type == 'ADMIN'
+                        else 'Failed to generate medicine recommendation'
+                    )
+                })
+                continue
+            
+            # Save to database for history
+            recommendation_data = result.data
+            recommendation = MedicineRecommendation.objects.create(
+                requested_by=request.user,
+                medicine_name=item['medicine_name'],
+                patient_info=patient_info,
+                alternatives=recommendation_data.get('alternatives', []),
+                warnings=recommendation_data.get('warnings', []),
+                suggestion=recommendation_data.get('suggestion', ''),
+                response_time_ms=result.latency_ms,
+                source=result.source,
+                model_name=result.model or ''
+            )
+            results.append({
+                'id': recommendation.id,
+                'medicine_name': item['medicine_name'],
+                'alternatives': recommendation_data.get('alternatives', []),
+                'warnings': recommendation_data.get('warnings', []),
+                'suggestion': recommendation_data.get('suggestion', ''),
+                'response_time_ms': result.latency_ms,
+                'cached': result.cached,
+                'source': result.source,
+                'model': result.model,
+                'note': recommendation_data.get('note', '')
+            })
+        
+        return Response({
+            'prescription_id': prescription_id,
+            'total': len(results),
+            'cached_count': sum(1 for result in results if result['cached']),
+            'results': results
+        })
+    
+    def _get_prescription(self, user, prescription_id):
+        """Get a prescription the user is allowed to see."""
+        prescriptions = Prescription.objects.filter(id=prescription_id)
+        
+        if user.user_type == 'PATIENT':
+            prescriptions = prescriptions.filter(patient=user)
+        elif user.user_type == 'DOCTOR':
+            prescriptions = prescriptions.filter(doctor__user=user)
+        elif user.user_type != 'ADMIN':
+            return None
+        
+        return prescriptions.first()
+
+
+class RecommendationJobView(generics.RetrieveAPIView):
+    """
+    Get status and result of an asynchronous recommendation job.
+    GET /api/recommendations/jobs/{id}/
+    """
+    serializer_class = RecommendationJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        user = self.request.user
+        
+        if user.user_type == 'ADMIN':
+            return MedicineRecommendation.objects.all()
+        
+        return MedicineRecommendation.objects.filter(requested_by=user)
+
+
+def _sse_event(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@csrf_exempt
+@require_POST
+async def stream_recommendation(request):
+    """
+    Stream medicine recommendations as Server-Sent Events.
+    POST /api/recommendations/stream/
+    
+    Takes the same body as POST /api/recommendations/ and emits `token`
+    events with raw LLM output, then `alternative` and `warning` events as
+    each item completes, and finally a `done` event with the saved
+    recommendation. Serve through ASGI (carehub/asgi.py) so the worker is
+    not held while waiting on the LLM.
+    
+    Rate limited: 10 requests per hour per user
+    """
+    try:
+        auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    if auth is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    request.user = auth[0]
+    
+    limited = await sync_to_async(is_ratelimited)(
+        request, group='recommendations.stream', key='user', rate='10/h', increment=True
+    )
+    if limited:
+        return JsonResponse({'detail': 'Rate limit exceeded.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'Invalid JSON body.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = MedicineRecommendationRequestSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    medicine_name = serializer.validated_data['medicine_name']
+    patient_info = serializer.validated_data.get('patient_info', {})
+    user = request.user
+    
+    async def event_stream():
+        try:
+            async for event, data in stream_medicine_recommendations(medicine_name, patient_info):
+                if event != 'result':
+                    yield _sse_event(event, data)
+                    continue
+                
+                # Save to database for history, as the synchronous view does
+                result, data = data, data.data
+                recommendation = await MedicineRecommendation.objects.acreate(
+                    requested_by=user,
+                    medicine_name=medicine_name,
+                    patient_info=patient_info,
+                    alternatives=data.get('alternatives', []),
+                    warnings=data.get('warnings', []),
+                    suggestion=data.get('suggestion', ''),
+                    response_time_ms=result.latency_ms,
+                    source=result.source,
+                    model_name=result.model or ''
+                )
+                yield _sse_event('done', {
+                    'id': recommendation.id,
+                    'medicine_name': medicine_name,
+                    'alternatives': data.get('alternatives', []),
+                    'warnings': data.get('warnings', []),
+                    'suggestion': data.get('suggestion', ''),
+                    'response_time_ms': result.latency_ms,
+                    'cached': result.cached,
+                    'source': result.source,
+                    'model': result.model,
+                    'note': data.get('note', '')
+                })
+        except Exception as e:
+            logger.error(f"Error streaming medicine recommendation: {str(e)}")
+            yield _sse_event('error', {
+                'error': 'Failed to generate medicine recommendation',
+                'detail': str(e) if user.user_type == 'ADMIN' else 'Internal server error'
+            })
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
 
 
 class MedicineRecommendationHistoryView(generics.ListAPIView):
@@ -122,7 +415,7 @@ class MedicineRecommendationDetailView(generics.RetrieveAPIView):
 
 
 @extend_schema(
-    request=None,
+    request=ClearCacheRequestSerializer,
     responses={200: ClearCacheResponseSerializer}
 )
 @api_view(['POST'])
@@ -131,6 +424,9 @@ def clear_cache(request):
     """
     Clear medicine recommendation cache (Admin only).
     POST /api/recommendations/clear-cache/
+    
+    Clears every cached recommendation, or only those for medicine_name
+    if given. Other cached data is not affected.
     """
     if request.user.user_type != 'ADMIN':
         return Response(
@@ -138,13 +434,59 @@ def clear_cache(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
+    serializer = ClearCacheRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    medicine_name = serializer.validated_data.get('medicine_name', '').strip()
+    
     from .service import clear_recommendation_cache
-    clear_recommendation_cache()
+    clear_recommendation_cache(medicine_name or None)
     
+    if medicine_name:
+        return Response({'message': f'Cache cleared for {medicine_name}'})
     return Response({'message': 'Cache cleared successfully'})
 
 
 @extend_schema(
+    parameters=[
+        OpenApiParameter('q', OpenApiTypes.STR, description='Partially typed medicine name', required=True),
+        OpenApiParameter('limit', OpenApiTypes.INT, description='Maximum suggestions (default 10, max 25)'),
+    ],
+    responses={200: MedicineAutocompleteResponseSerializer}
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def medicine_autocomplete(request):
+    """
+    Suggest catalog medicines for partially typed, possibly misspelled text.
+    GET /api/recommendations/medicines/autocomplete/?q=amoxi
+    
+    Matches names, brand names and generics by prefix, tolerating typos, so
+    prescriptions and recommendation requests use canonical medicine names.
+    """
+    query_serializer = MedicineAutocompleteQuerySerializer(data=request.query_params)
+    query_serializer.is_valid(raise_exception=True)
+    query = query_serializer.validated_data['q']
+    
+    matches = get_medicine_index().autocomplete(query, limit=query_serializer.validated_data['limit'])
+    results = [
+        {
+            'name': medicine['name'],
+            'matched': matched_label(medicine, key),
+            'generics': medicine['generics'],
+            'drug_class': medicine['drug_class'],
+            'typos': distance,
+        }
+        for key, medicine, distance in matches
+    ]
+    
+    return Response({'query': query, 'results': results})
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter('start', OpenApiTypes.STR, description='Start of range, ISO date or datetime (inclusive)'),
+        OpenApiParameter('end', OpenApiTypes.STR, description='End of range, ISO date or datetime (exclusive)'),
+    ],
     responses={200: RecommendationStatsSerializer}
 )
 @api_view(['GET'])
@@ -152,7 +494,9 @@ def clear_cache(request):
 def recommendation_stats(request):
     """
     Get recommendation statistics (Admin only).
-    GET /api/recommendations/stats/
+    GET /api/recommendations/stats/?start=2025-01-01&end=2025-02-01
+    
+    Read from the hourly and daily rollups; ranges are widened to whole hours.
     """
     if request.user.user_type != 'ADMIN':
         return Response(
@@ -160,20 +504,40 @@ def recommendation_stats(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    from django.db.models import Count, Avg
-    
-    stats = {
-        'total_recommendations': MedicineRecommendation.objects.count(),
-        'unique_medicines': MedicineRecommendation.objects.values('medicine_name').distinct().count(),
-        'unique_users': MedicineRecommendation.objects.values('requested_by').distinct().count(),
-        'avg_response_time_ms': MedicineRecommendation.objects.aggregate(
-            Avg('response_time_ms')
-        )['response_time_ms__avg'],
-        'top_medicines': list(
-            MedicineRecommendation.objects.values('medicine_name')
-            .annotate(count=Count('id'))
-            .order_by('-count')[:10]
+    query_serializer = RecommendationStatsQuerySerializer(data=request.query_params)
+    query_serializer.is_valid(raise_exception=True)
+    start = query_serializer.validated_data.get('start')
+    end = query_serializer.validated_data.get('end')
+    
+    from .stats import get_recommendation_stats
+    
+    stats = get_recommendation_stats(start=start, end=end, top_limit=10)
+    stats.update(start=start, end=end)
+    
+    return Response(RecommendationStatsSerializer(stats).data)
+
+
+@extend_schema(responses={200: RecommendationHealthSerializer})
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def recommendation_health(request):
+    """
+    Get LLM call settings and circuit breaker state (Admin only).
+    GET /api/recommendations/health/
+    
+    The circuit breaker is kept per worker process, so the state is that of
+    the process serving this request.
+    """
+    if request.user.user_type != 'ADMIN':
+        return Response(
+            {'error': 'Only admins can view service health'},
+            status=status.HTTP_403_FORBIDDEN
         )
-    }
     
-    return Response(stats)
+    return Response(RecommendationHealthSerializer({
+        'llm_configured': bool(settings.GROQ_API_KEY),
+        'model': settings.GROQ_MODEL,
+        'timeout_seconds': settings.GROQ_TIMEOUT_SECONDS,
+        'max_retries': settings.GROQ_MAX_RETRIES,
+        'circuit_breaker': get_llm_circuit_breaker().snapshot(),
+    }).data)
@@ -2,7 +2,10 @@
 Admin configuration for records app.
 """
 from django.contrib import admin
-from .models import Prescription, PatientReport, PrescriptionAttachment
+from .models import (
+    Prescription, PatientReport, PrescriptionAttachment, PrescriptionRevision, RecordExport, StoredBlob,
+    UploadSession
+)
 
 
 @admin.register(Prescription)
@@ -11,11 +14,12 @@ class PrescriptionAdmin(admin.ModelAdmin):
     
     list_display = ['id', 'patient', 'doctor', 'diagnosis_short', 'version', 'created_at']
     list_filter = ['created_at', 'doctor__hospital', 'doctor__specialization']
+    # Not content fields: superseded versions keep them in revisions (see records/revisions.py)
     search_fields = [
         'patient__username', 'patient__first_name', 'patient__last_name',
-        'doctor__user__username', 'diagnosis', 'treatment_plan'
+        'doctor__user__username'
     ]
-    readonly_fields = ['created_at', 'updated_at', 'version', 'previous_version']
+    readonly_fields = ['created_at', 'updated_at', 'version', 'previous_version', 'root', 'is_compacted']
     ordering = ['-created_at']
     
     fieldsets = (
@@ -29,7 +33,7 @@ class PrescriptionAdmin(admin.ModelAdmin):
             'fields': ('follow_up_date', 'referral_notes', 'doctor_notes')
         }),
         ('Versioning', {
-            'fields': ('version', 'previous_version')
+            'fields': ('version', 'previous_version', 'root', 'is_compacted')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
@@ -52,7 +56,7 @@ class PatientReportAdmin(admin.ModelAdmin):
         'title', 'description', 'patient__username',
         'patient__first_name', 'patient__last_name'
     ]
-    readonly_fields = ['file_size', 'uploaded_at', 'updated_at']
+    readonly_fields = ['file_size', 'blob', 'original_blob', 'uploaded_at', 'updated_at']
     ordering = ['-uploaded_at']
     
     fieldsets = (
@@ -63,7 +67,7 @@ class PatientReportAdmin(admin.ModelAdmin):
             'fields': ('title', 'description', 'file_type', 'report_date')
         }),
         ('File Information', {
-            'fields': ('file', 'file_size')
+            'fields': ('file', 'file_size', 'blob', 'original_blob')
         }),
         ('Timestamps', {
             'fields': ('uploaded_at', 'updated_at')
@@ -78,5 +82,47 @@ class PrescriptionAttachmentAdmin(admin.ModelAdmin):
     list_display = ['id', 'prescription', 'file_name', 'file_size', 'uploaded_at']
     list_filter = ['uploaded_at']
     search_fields = ['file_name', 'description', 'prescription__patient__username']
-    readonly_fields = ['file_name', 'file_size', 'uploaded_at']
+    readonly_fields = ['file_name', 'file_size', 'blob', 'uploaded_at']
     ordering = ['-uploaded_at']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    """Admin for UploadSession model."""
+    
+    list_display = ['id', 'file_name', 'patient', 'uploaded_by', 'total_size', 'status', 'created_at', 'expires_at']
+    list_filter = ['status', 'file_type', 'created_at']
+    search_fields = ['file_name', 'title', 'patient__username', 'uploaded_by__username']
+    readonly_fields = ['received_offsets', 'report', 'created_at', 'updated_at']
+    ordering = ['-created_at']
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    """Admin for StoredBlob model."""
+    
+    list_display = ['digest', 'size', 'ref_count', 'created_at']
+    search_fields = ['digest']
+    readonly_fields = ['digest', 'file', 'size', 'ref_count', 'referenced_at', 'created_at']
+    ordering = ['-created_at']
+
+
+@admin.register(RecordExport)
+class RecordExportAdmin(admin.ModelAdmin):
+    """Admin for RecordExport model."""
+    
+    list_display = ['id', 'patient', 'requested_by', 'status', 'size', 'created_at', 'expires_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['patient__username', 'requested_by__username']
+    readonly_fields = ['file', 'size', 'error_message', 'created_at', 'completed_at']
+    ordering = ['-created_at']
+
+
+@admin.register(PrescriptionRevision)
+class PrescriptionRevisionAdmin(admin.ModelAdmin):
+    """Admin for PrescriptionRevision model."""
+    
+    list_display = ['id', 'root', 'version', 'created_at']
+    search_fields = ['root__id']
+    readonly_fields = ['root', 'version', 'snapshot', 'delta', 'created_at']
+    ordering = ['root', 'version']
@@ -0,0 +1,176 @@
+"""
+Content-addressed storage for report and attachment files.
+
+Uploaded content is stored once under its SHA-256 digest, at
+``blobs/<d0d1>/<d2d3>/<digest><ext>`` (sharded so no directory grows too
+large), and shared by every PatientReport and PrescriptionAttachment with the
+same bytes. Multipart uploads are hashed by ValidatingUploadHandler while they
+stream in and chunked uploads by their checksum verification, so storing a
+duplicate costs no extra read and no write.
+
+References are counted on StoredBlob.ref_count: store_blob adds one,
+release_blob (on report or attachment deletion) removes one, and
+collect_unreferenced_blobs deletes blobs nobody references any more.
+Deletion is deferred to that task so a blob being reused by a concurrent
+upload is never removed under it.
+
+ref_count is only trusted for UNREFERENCED_GRACE after a reference was
+taken. The reference is taken before the report or attachment row exists,
+so it leaks if that row is never committed (e.g. the request's transaction
+rolls back); after the grace period the collector recounts the rows
+actually pointing at a blob instead. Files written for a blob row that was
+itself rolled back are removed by collect_orphaned_blob_files.
+"""
+import hashlib
+import logging
+import posixpath
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .models import PatientReport, PrescriptionAttachment, StoredBlob
+from .upload_handlers import file_extension
+
+logger = logging.getLogger(__name__)
+
+BLOB_ROOT = 'blobs'
+
+# Longest time between store_blob and the commit of the row referencing it
+UNREFERENCED_GRACE = timedelta(hours=1)
+
+
+def blob_name(digest: str, file_name: str):
+    """Sharded storage path for content with a digest (keeps the extension for serving)."""
+    extension = file_extension(file_name)
+    suffix = f'.{extension}' if extension else ''
+    return f'{BLOB_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}{suffix}'
+
+
+def content_digest(content):
+    """SHA-256 hex digest of a Django File, read in chunks."""
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def store_blob(content, digest=None):
+    """
+    Store content once and take a reference to it.
+
+    Args:
+        content: Django File (e.g. an UploadedFile) with a name
+        digest: SHA-256 of the content if already known (computed otherwise)
+
+    Returns:
+        StoredBlob: The blob, with ref_count including the new reference
+    """
+    digest = digest or content_digest(content)
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                blob = StoredBlob.objects.select_for_update().filter(digest=digest).first()
+                if blob is None:
+                    blob = StoredBlob.objects.create(
+                        digest=digest,
+                        file=blob_name(digest, content.name),
+                        size=content.size
+                    )
+                # Checked under the row lock, so a blob being collected is written again
+                if not default_storage.exists(blob.file.name):
+                    saved = default_storage.save(blob.file.name, content)
+                    if saved != blob.file.name:
+                        # Another process wrote the same content first
+                        default_storage.delete(saved)
+                else:
+                    logger.info(f"Reusing stored blob {digest[:12]} for {content.name}")
+                blob.ref_count = F('ref_count') + 1
+                blob.referenced_at = timezone.now()
+                blob.save(update_fields=['ref_count', 'referenced_at'])
+                blob.refresh_from_db(fields=['ref_count'])
+                return blob
+        except IntegrityError:
+            # A concurrent upload created the row; lock and reuse it
+            if attempt:
+                raise
+
+
+def release_blob(blob_id):
+    """Drop a reference to a blob; it is deleted later if it was the last one."""
+    StoredBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+def _unreferenced(queryset):
+    """Blobs of a queryset that no report or attachment points at."""
+    return queryset.filter(
+        ~Exists(PatientReport.objects.filter(blob=OuterRef('pk'))),
+        ~Exists(PatientReport.objects.filter(original_blob=OuterRef('pk'))),
+        ~Exists(PrescriptionAttachment.objects.filter(blob=OuterRef('pk'))),
+    )
+
+
+def collect_unreferenced_blobs():
+    """
+    Delete blobs with no references, and their files.
+
+    A blob is collected when no row references it and either its ref_count
+    is zero or its last reference is older than UNREFERENCED_GRACE (a
+    reference whose row was never committed).
+
+    Returns:
+        int: Number of blobs deleted
+    """
+    deleted = 0
+    collectable = Q(ref_count=0) | Q(referenced_at__lt=timezone.now() - UNREFERENCED_GRACE)
+    for blob_id in _unreferenced(StoredBlob.objects.filter(collectable)).values_list('id', flat=True):
+        with transaction.atomic():
+            # Rechecked under the row lock: store_blob may be reusing it
+            blob = _unreferenced(
+                StoredBlob.objects.select_for_update().filter(collectable, pk=blob_id)
+            ).first()
+            if blob is None:
+                continue
+            if blob.ref_count:
+                logger.warning(
+                    f"Blob {blob.digest[:12]} has ref_count {blob.ref_count} but no references, collecting it"
+                )
+            default_storage.delete(blob.file.name)
+            blob.delete()
+            deleted += 1
+    return deleted
+
+
+def collect_orphaned_blob_files():
+    """
+    Delete files under the blob root that no StoredBlob row names.
+
+    These are left by store_blob calls whose transaction rolled back after
+    the file was written. Files younger than UNREFERENCED_GRACE are kept, as
+    their row may not be committed yet.
+
+    Returns:
+        int: Number of files deleted
+    """
+    cutoff = timezone.now() - UNREFERENCED_GRACE
+    deleted = 0
+
+    def walk(directory):
+        nonlocal deleted
+        try:
+            directories, files = default_storage.listdir(directory)
+        except FileNotFoundError:
+            return
+        names = [posixpath.join(directory, name) for name in files]
+        known = set(StoredBlob.objects.filter(file__in=names).values_list('file', flat=True))
+        for name in names:
+            if name not in known and default_storage.get_modified_time(name) < cutoff:
+                default_storage.delete(name)
+                deleted += 1
+        for subdirectory in directories:
+            walk(posixpath.join(directory, subdirectory))
+
+    walk(BLOB_ROOT)
+    return deleted
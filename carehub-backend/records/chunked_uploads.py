@@ -0,0 +1,197 @@
+"""
+Chunk storage and assembly for resumable report uploads.
+
+Each UploadSession gets a directory under CHUNKED_UPLOAD_DIR holding one
+file per received chunk, named by its byte offset. Chunks are written to a
+temporary file unique to the request and renamed into place, so an
+interrupted PUT never leaves a partial chunk that looks complete and a
+retried PUT of the same chunk cannot disturb one still in flight. On completion the chunks are concatenated
+in the kernel (copy_file_range) rather than through Python buffers, the
+result is checked against the session's size and SHA-256, and the file is
+handed to the blob store with a temporary_file_path so FileSystemStorage
+moves it into MEDIA_ROOT instead of copying it again (or drops it, if the
+same content is already stored).
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from rest_framework import serializers
+
+from .blobs import store_blob
+from .models import PatientReport
+from .upload_handlers import SIGNATURE_LENGTH, check_file_signature, file_extension
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class ChunkError(Exception):
+    """Raised when a chunk or the assembled file is not what the session expects."""
+
+
+class CorruptUploadError(ChunkError):
+    """Raised when the assembled file does not match the upload's size, checksum or type."""
+
+
+class AssembledFile(File):
+    """
+    An assembled upload on local disk, moved rather than copied by FileSystemStorage.
+    
+    ``name`` is the uploaded file name; the data is read from the open file.
+    """
+    
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def session_dir(session):
+    """Directory holding a session's chunks."""
+    return Path(settings.CHUNKED_UPLOAD_DIR) / str(session.id)
+
+
+def chunk_path(session, offset):
+    """File holding the chunk at a byte offset."""
+    return session_dir(session) / f'{offset:015d}.part'
+
+
+def write_chunk(session, offset, stream):
+    """
+    Store the chunk at ``offset`` from a request body stream.
+    
+    Args:
+        session: The UploadSession
+        offset: Byte offset of the chunk; must start a chunk of the session
+        stream: File-like object with the chunk's bytes
+    
+    Raises:
+        ChunkError: If the session is not active, the offset does not start a
+            chunk or the body has the wrong length
+    """
+    if session.status != 'ACTIVE':
+        raise ChunkError("Upload session no longer accepts chunks")
+    if offset % session.chunk_size or not 0 <= offset < session.total_size:
+        raise ChunkError(f"Offset {offset} does not start a chunk of {session.chunk_size} bytes")
+    expected = session.chunk_length(offset)
+    
+    path = chunk_path(session, offset)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    received = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                data = stream.read(min(COPY_BUFFER_SIZE, expected + 1 - received))
+                if not data:
+                    break
+                received += len(data)
+                if received > expected:
+                    break
+                f.write(data)
+        if received != expected:
+            raise ChunkError(f"Chunk at offset {offset} must be {expected} bytes, got {received}")
+        os.replace(partial, path)
+    except BaseException:
+        Path(partial).unlink(missing_ok=True)
+        raise
+
+
+def concatenate(paths, destination):
+    """
+    Concatenate files into ``destination``, copying in the kernel where possible.
+    
+    Uses os.copy_file_range (Linux), which avoids moving the data through
+    user space and can share extents on filesystems that support reflinks;
+    falls back to a buffered copy where it is unavailable.
+    """
+    with open(destination, 'wb') as out:
+        for path in paths:
+            with open(path, 'rb') as part:
+                remaining = os.fstat(part.fileno()).st_size
+                copy_file_range = getattr(os, 'copy_file_range', None)
+                while remaining and copy_file_range is not None:
+                    try:
+                        copied = copy_file_range(part.fileno(), out.fileno(), remaining)
+                    except OSError:
+                        copy_file_range = None  # e.g. unsupported by the filesystem
+                        break
+                    if not copied:
+                        break
+                    remaining -= copied
+                if remaining:
+                    shutil.copyfileobj(part, out, COPY_BUFFER_SIZE)
+
+
+def file_sha256(path):
+    """SHA-256 hex digest of a file."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def complete_upload(session):
+    """
+    Assemble a session's chunks, verify them and create the PatientReport.
+    
+    Args:
+        session: An ACTIVE UploadSession with every chunk received
+    
+    The chunks are deleted once the caller's transaction commits.
+    
+    Returns:
+        PatientReport: The new report
+    
+    Raises:
+        ChunkError: If chunks are missing
+        CorruptUploadError: If the file does not match the session's size,
+            checksum or extension
+    """
+    missing = session.missing_offsets()
+    if missing:
+        raise ChunkError(f"{len(missing)} chunk(s) not received, first missing offset {missing[0]}")
+    
+    assembled = session_dir(session) / 'assembled'
+    try:
+        concatenate([chunk_path(session, offset) for offset in session.chunk_offsets()], assembled)
+        size = assembled.stat().st_size
+        if size != session.total_size:
+            raise CorruptUploadError(f"Assembled file is {size} bytes, expected {session.total_size}")
+        if file_sha256(assembled) != session.checksum:
+            raise CorruptUploadError("Checksum mismatch: the assembled file does not match the upload's SHA-256")
+        with open(assembled, 'rb') as f:
+            header = f.read(SIGNATURE_LENGTH)
+        try:
+            check_file_signature(file_extension(session.file_name), header)
+        except serializers.ValidationError as e:
+            raise CorruptUploadError(str(e.detail[0])) from e
+        
+        with open(assembled, 'rb') as f:
+            blob = store_blob(AssembledFile(f, name=session.file_name), digest=session.checksum)
+        report = PatientReport.objects.create(
+            patient=session.patient,
+            hospital=session.hospital,
+            uploaded_by=session.uploaded_by,
+            blob=blob,
+            file=blob.file.name,
+            file_type=session.file_type,
+            title=session.title,
+            description=session.description,
+            report_date=session.report_date,
+        )
+    finally:
+        assembled.unlink(missing_ok=True)
+    
+    # Kept until the session is marked complete, so a failed commit can be retried
+    transaction.on_commit(lambda: discard_chunks(session))
+    logger.info(f"Completed upload {session.id}: report {report.id}, {session.total_size} bytes")
+    return report
+
+
+def discard_chunks(session):
+    """Delete a session's chunk directory."""
+    shutil.rmtree(session_dir(session), ignore_errors=True)
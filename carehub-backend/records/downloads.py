@@ -0,0 +1,126 @@
+"""
+Serving report and attachment files after an access check.
+
+Views check permissions and then hand the transfer to the front proxy, so
+no application worker is held while the bytes are sent:
+
+- ``nginx``: an ``X-Accel-Redirect`` to FILE_DOWNLOAD_ACCEL_PREFIX plus the
+  file's storage name, served by an ``internal`` nginx location aliased to
+  MEDIA_ROOT.
+- ``sendfile``: an ``X-Sendfile`` header with the file's absolute path
+  (Apache mod_xsendfile, lighttpd).
+- ``django`` (default, for local use): the file is streamed by Django, with
+  single-range HTTP Range requests answered as 206 Partial Content so
+  viewers can seek in large scans.
+
+The backend is chosen with FILE_DOWNLOAD_BACKEND.
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised for a Range header that selects no bytes of the file."""
+
+
+def parse_byte_range(header, size):
+    """
+    Parse a single-range ``Range`` header.
+
+    Args:
+        header: The Range header value, or None
+        size: File size in bytes
+
+    Returns:
+        tuple: (first, last) byte positions, inclusive, or None to send the
+            whole file (no header, or a form that is not supported, such as
+            several ranges)
+
+    Raises:
+        RangeNotSatisfiable: If the range starts beyond the end of the file
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or last < first:
+        raise RangeNotSatisfiable()
+    return first, last
+
+
+def _read_range(file, first, last):
+    try:
+        file.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            data = file.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def serve_file(request, field_file, download_name):
+    """
+    Respond with a stored file after its access check has passed.
+
+    Args:
+        request: The request (for the Range header)
+        field_file: FieldFile of the report or attachment
+        download_name: File name offered to the client
+
+    Returns:
+        HttpResponse: Proxy hand-off or file response
+    """
+    content_type = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    backend = settings.FILE_DOWNLOAD_BACKEND
+
+    if backend in ('nginx', 'sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            response['X-Accel-Redirect'] = settings.FILE_DOWNLOAD_ACCEL_PREFIX + quote(field_file.name)
+        else:
+            response['X-Sendfile'] = field_file.path
+    else:
+        size = field_file.size
+        try:
+            byte_range = parse_byte_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        file = field_file.storage.open(field_file.name, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(_read_range(file, first, last), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {first}-{last}/{size}'
+            response['Content-Length'] = str(last - first + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = content_disposition_header(
+        request.GET.get('download') == '1', download_name
+    )
+    # Medical records must not be kept by shared caches
+    response['Cache-Control'] = 'private, no-cache'
+    return response
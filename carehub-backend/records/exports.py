@@ -0,0 +1,184 @@
+"""
+ZIP export of a patient's whole record.
+
+The archive holds a ``manifest.json`` (patient, prescriptions with their
+attachments, reports) followed by every file:
+
+    manifest.json
+    reports/<id>-<title><ext>
+    prescriptions/<id>/<attachment id>-<file name>
+
+It is written as a stream: ZipFile writes into an unseekable buffer that is
+drained after every chunk of every file, so memory use does not grow with
+the size of the record and the first bytes go out before the last file has
+been read. Files with the same stored content (see records/blobs.py) are
+included once and referenced from every manifest entry using them.
+"""
+import json
+import logging
+import os
+import zipfile
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import PatientReport, Prescription, PrescriptionAttachment
+from .serializers import PrescriptionSerializer
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+MANIFEST_VERSION = 1
+
+
+class _ZipStream:
+    """Write-only, unseekable file that keeps what ZipFile writes until drained."""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _archive_path(prefix, name, extension=''):
+    """
+    Archive path ``<prefix>-<name><extension>``, or ``<prefix><extension>``
+    when nothing of the name survives sanitizing (e.g. a title of symbols).
+    """
+    try:
+        return f'{prefix}-{get_valid_filename(name)}{extension}'
+    except SuspiciousFileOperation:
+        return f'{prefix}{extension}'
+
+
+def export_size(patient):
+    """Total size in bytes of the files in a patient's record."""
+    reports = PatientReport.objects.filter(patient=patient).aggregate(total=Sum('file_size'))['total']
+    attachments = PrescriptionAttachment.objects.filter(
+        prescription__patient=patient
+    ).aggregate(total=Sum('file_size'))['total']
+    return (reports or 0) + (attachments or 0)
+
+
+def collect_export(patient):
+    """
+    Gather a patient's record for export.
+    
+    Args:
+        patient: The patient User
+    
+    Returns:
+        tuple: (manifest dict, list of (archive path, FieldFile) to include)
+    """
+    files = []
+    paths = {}
+    
+    def include(field_file, path):
+        # Shared content is archived once
+        if field_file.name not in paths:
+            if not field_file.storage.exists(field_file.name):
+                logger.warning(f"Export for patient {patient.id}: {field_file.name} is missing from storage")
+                return None
+            paths[field_file.name] = path
+            files.append((path, field_file))
+        return paths[field_file.name]
+    
+    prescriptions = []
+    queryset = (
+        Prescription.objects.filter(patient=patient)
+        .select_related('doctor__hospital', 'doctor__user', 'patient', 'appointment')
+        .prefetch_related('attachments')
+        .order_by('created_at')
+    )
+    for prescription in queryset:
+        entry = dict(PrescriptionSerializer(prescription).data)
+        entry['attachments'] = [
+            {
+                'id': attachment.id,
+                'file_name': attachment.file_name,
+                'file_size': attachment.file_size,
+                'description': attachment.description,
+                'uploaded_at': attachment.uploaded_at,
+                'path': include(
+                    attachment.file,
+                    _archive_path(f'prescriptions/{prescription.id}/{attachment.id}', attachment.file_name)
+                ),
+            }
+            for attachment in prescription.attachments.order_by('uploaded_at')
+        ]
+        prescriptions.append(entry)
+    
+    reports = []
+    for report in PatientReport.objects.filter(patient=patient).select_related('hospital').order_by('uploaded_at'):
+        extension = os.path.splitext(report.file.name)[1].lower()
+        reports.append({
+            'id': report.id,
+            'title': report.title,
+            'description': report.description,
+            'file_type': report.file_type,
+            'report_date': report.report_date,
+            'hospital_name': report.hospital.name if report.hospital else None,
+            'file_size': report.file_size,
+            'uploaded_at': report.uploaded_at,
+            'path': include(report.file, _archive_path(f'reports/{report.id}', report.title, extension)),
+        })
+    
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'exported_at': timezone.now(),
+        'patient': {
+            'id': patient.id,
+            'name': patient.get_full_name(),
+            'email': patient.email,
+        },
+        'prescriptions': prescriptions,
+        'reports': reports,
+    }
+    return manifest, files
+
+
+def stream_export(manifest, files):
+    """
+    Generate the export ZIP in pieces.
+    
+    Args:
+        manifest: Manifest dict from collect_export
+        files: (archive path, FieldFile) pairs from collect_export
+    
+    Yields:
+        bytes: Consecutive parts of the archive
+    """
+    stream = _ZipStream()
+    date_time = timezone.localtime().timetuple()[:6]
+    with zipfile.ZipFile(stream, 'w', allowZip64=True) as archive:
+        archive.writestr(
+            zipfile.ZipInfo('manifest.json', date_time),
+            json.dumps(manifest, cls=DjangoJSONEncoder, indent=2),
+            compress_type=zipfile.ZIP_DEFLATED
+        )
+        yield stream.drain()
+        
+        for path, field_file in files:
+            info = zipfile.ZipInfo(path, date_time)
+            # Stored: reports are PDFs and images, which do not compress further
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = field_file.size
+            with field_file.storage.open(field_file.name, 'rb') as source, archive.open(info, 'w') as target:
+                while chunk := source.read(EXPORT_CHUNK_SIZE):
+                    target.write(chunk)
+                    yield stream.drain()
+    
+    # Central directory
+    yield stream.drain()
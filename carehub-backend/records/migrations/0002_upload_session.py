@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:39
+
+import django.db.models.deletion
+import records.models
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0002_hospitaldoctorprofile_department_and_more'),
+        ('records', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_type', models.CharField(choices=[('LAB', 'Lab Report'), ('PRESCRIPTION', 'Prescription'), ('XRAY', 'X-Ray'), ('MRI', 'MRI Scan'), ('CT', 'CT Scan'), ('ULTRASOUND', 'Ultrasound'), ('OTHER', 'Other')], max_length=20)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('report_date', models.DateField(blank=True, null=True)),
+                ('total_size', models.BigIntegerField(help_text='Size of the complete file in bytes')),
+                ('chunk_size', models.IntegerField(help_text='Size of every chunk but the last, in bytes')),
+                ('checksum', models.CharField(help_text='SHA-256 of the complete file (hex)', max_length=64)),
+                ('received_offsets', models.JSONField(default=list, help_text='Offsets of the chunks received so far')),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETE', 'Complete')], default='ACTIVE', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(default=records.models.upload_session_expiry)),
+                ('hospital', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='hospitals.hospital')),
+                ('patient', models.ForeignKey(limit_choices_to={'user_type': 'PATIENT'}, on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+                ('report', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='records.patientreport')),
+                ('uploaded_by', models.ForeignKey(help_text='User who started the upload', on_delete=django.db.models.deletion.CASCADE, related_name='report_upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload Session',
+                'verbose_name_plural': 'Upload Sessions',
+                'db_table': 'upload_sessions',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='upload_sess_status_bb43bc_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0002_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='SHA-256 of the content (hex)', max_length=64, unique=True)),
+                ('file', models.FileField(help_text='Sharded path of the content in storage', max_length=255, upload_to='')),
+                ('size', models.BigIntegerField(help_text='Size in bytes')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Reports and attachments using this blob')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Stored Blob',
+                'verbose_name_plural': 'Stored Blobs',
+                'db_table': 'stored_blobs',
+                'indexes': [models.Index(fields=['ref_count'], name='stored_blob_ref_cou_87f4ba_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='patientreport',
+            name='blob',
+            field=models.ForeignKey(blank=True, help_text='Deduplicated content (file points at it); empty for files stored before deduplication', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reports', to='records.storedblob'),
+        ),
+        migrations.AddField(
+            model_name='prescriptionattachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, help_text='Deduplicated content (file points at it); empty for files stored before deduplication', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='records.storedblob'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:48
+
+import records.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0003_stored_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientreport',
+            name='thumbnail',
+            field=models.ImageField(blank=True, help_text='Preview image, generated in the background after upload', upload_to=records.models.report_thumbnail_upload_path),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0004_report_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientreport',
+            name='original_blob',
+            field=models.ForeignKey(blank=True, help_text='Image as uploaded, before recompression (kept if REPORT_KEEP_ORIGINAL_IMAGES is set)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='original_reports', to='records.storedblob'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:52
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+# Keeps patient_reports.search_vector in step with the searchable columns on
+# every insert and update, whichever code path writes them
+CREATE_TRIGGER = """
+CREATE FUNCTION patient_reports_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.extracted_text, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER patient_reports_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, extracted_text ON patient_reports
+    FOR EACH ROW EXECUTE FUNCTION patient_reports_search_vector_update();
+
+UPDATE patient_reports SET title = title;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS patient_reports_search_vector_update ON patient_reports;
+DROP FUNCTION IF EXISTS patient_reports_search_vector_update();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospitals', '0002_hospitaldoctorprofile_department_and_more'),
+        ('records', '0005_report_original_blob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientreport',
+            name='extracted_text',
+            field=models.TextField(blank=True, editable=False, help_text='Text of PDF and DOCX reports, extracted in the background after upload'),
+        ),
+        migrations.AddField(
+            model_name='patientreport',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted title, description and extracted text; maintained by a database trigger', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='patientreport',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='patient_reports_search_idx'),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:56
+
+import django.db.models.deletion
+import records.models
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0006_report_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordExport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('file', models.FileField(blank=True, upload_to='record_exports/')),
+                ('size', models.BigIntegerField(blank=True, help_text='Archive size in bytes', null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(default=records.models.record_export_expiry)),
+                ('patient', models.ForeignKey(limit_choices_to={'user_type': 'PATIENT'}, on_delete=django.db.models.deletion.CASCADE, related_name='record_exports', to=settings.AUTH_USER_MODEL)),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='requested_record_exports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Record Export',
+                'verbose_name_plural': 'Record Exports',
+                'db_table': 'record_exports',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['expires_at'], name='record_expo_expires_92050c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Walk every previous_version chain once from its first version and give
+# each prescription the id of that first version
+POPULATE_ROOT = """
+WITH RECURSIVE chain (id, root_id) AS (
+    SELECT id, id FROM prescriptions WHERE previous_version_id IS NULL
+    UNION ALL
+    SELECT prescriptions.id, chain.root_id
+    FROM prescriptions JOIN chain ON prescriptions.previous_version_id = chain.id
+)
+UPDATE prescriptions SET root_id = chain.root_id
+FROM chain
+WHERE chain.id = prescriptions.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+        ('hospitals', '0002_hospitaldoctorprofile_department_and_more'),
+        ('records', '0007_record_export'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='root',
+            field=models.ForeignKey(blank=True, help_text='First version of this prescription (itself for originals); shared by the whole history', null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='versions', to='records.prescription'),
+        ),
+        migrations.RunSQL(POPULATE_ROOT, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['root', 'version'], name='prescriptio_root_id_2485e0_idx'),
+        ),
+    ]
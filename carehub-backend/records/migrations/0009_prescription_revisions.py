@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0008_prescription_root'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='prescription',
+            options={'base_manager_name': 'objects', 'ordering': ['-created_at'], 'verbose_name': 'Prescription', 'verbose_name_plural': 'Prescriptions'},
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='is_compacted',
+            field=models.BooleanField(default=False, editable=False, help_text='Superseded version whose content is kept in its PrescriptionRevision'),
+        ),
+        migrations.CreateModel(
+            name='PrescriptionRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField()),
+                ('snapshot', models.JSONField(blank=True, help_text='Full content of the version', null=True)),
+                ('delta', models.JSONField(blank=True, help_text='JSON Patch from the previous version', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('root', models.ForeignKey(help_text='First version of the prescription history', on_delete=django.db.models.deletion.CASCADE, related_name='stored_revisions', to='records.prescription')),
+            ],
+            options={
+                'verbose_name': 'Prescription Revision',
+                'verbose_name_plural': 'Prescription Revisions',
+                'db_table': 'prescription_revisions',
+                'ordering': ['root', 'version'],
+                'unique_together': {('root', 'version')},
+            },
+        ),
+    ]
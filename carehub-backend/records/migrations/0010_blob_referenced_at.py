@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0009_prescription_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='referenced_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the last reference was taken; references are recounted after a grace period'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0010_blob_referenced_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prescription',
+            name='root',
+            field=models.ForeignKey(blank=True, help_text='First version of this prescription, shared by the whole history; set on the first revision', null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='versions', to='records.prescription'),
+        ),
+    ]
@@ -1,11 +1,21 @@
 """
 Models for records app - prescriptions and patient reports.
 """
-from django.db import models
+import json
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models.query import ModelIterable
 from django.core.validators import FileExtensionValidator
+from django.utils import timezone
 from accounts.models import User
 from hospitals.models import Hospital, HospitalDoctorProfile
 from appointments.models import Appointment
+from .revisions import CONTENT_FIELDS, PatchError, make_patch, reconstruct
 import os
 
 
@@ -14,9 +24,78 @@ def patient_report_upload_path(instance, filename):
     return f'patient_reports/{instance.patient.id}/{filename}'
 
 
+def report_thumbnail_upload_path(instance, filename):
+    """Generate upload path for report thumbnails."""
+    return f'patient_reports/{instance.patient.id}/thumbnails/{filename}'
+
+
+class StoredBlob(models.Model):
+    """
+    File content stored once under its SHA-256 digest.
+    
+    Reports and attachments with identical content reference the same blob
+    (their ``file`` names point at it). ref_count counts those references;
+    unreferenced blobs are deleted by a periodic task (see records/blobs.py).
+    """
+    
+    digest = models.CharField(max_length=64, unique=True, help_text='SHA-256 of the content (hex)')
+    file = models.FileField(max_length=255, help_text='Sharded path of the content in storage')
+    size = models.BigIntegerField(help_text='Size in bytes')
+    ref_count = models.PositiveIntegerField(default=0, help_text='Reports and attachments using this blob')
+    referenced_at = models.DateTimeField(
+        default=timezone.now,
+        help_text='When the last reference was taken; references are recounted after a grace period'
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'stored_blobs'
+        verbose_name = 'Stored Blob'
+        verbose_name_plural = 'Stored Blobs'
+        indexes = [
+            models.Index(fields=['ref_count']),
+        ]
+    
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} bytes, {self.ref_count} references)"
+
+
+class PrescriptionIterable(ModelIterable):
+    """Yields prescriptions with the content of compacted versions rebuilt, in batches."""
+    
+    BATCH_SIZE = 100
+    
+    def __iter__(self):
+        batch = []
+        for prescription in super().__iter__():
+            batch.append(prescription)
+            if len(batch) >= self.BATCH_SIZE:
+                materialize_prescriptions(batch)
+                yield from batch
+                batch = []
+        materialize_prescriptions(batch)
+        yield from batch
+
+
+class PrescriptionQuerySet(models.QuerySet):
+    """Prescription queryset that rebuilds compacted (superseded) versions on fetch."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._iterable_class = PrescriptionIterable
+    
+    def latest_versions(self):
+        """Only the latest version of each prescription (versions no revision supersedes)."""
+        return self.filter(~models.Exists(Prescription.objects.filter(previous_version=models.OuterRef('pk'))))
+
+
 class Prescription(models.Model):
     """
     Prescription model created by doctors for patients.
+    
+    Superseded versions are stored compactly as revisions (see
+    records/revisions.py); querysets rebuild their content when fetched.
     """
     
     appointment = models.ForeignKey(
@@ -66,42 +145,198 @@ class Prescription(models.Model):
         blank=True,
         related_name='revisions'
     )
+    root = models.ForeignKey(
+        'self',
+        on_delete=models.RESTRICT,
+        null=True,
+        blank=True,
+        related_name='versions',
+        help_text='First version of this prescription, shared by the whole history; set on the first revision'
+    )
+    is_compacted = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text='Superseded version whose content is kept in its PrescriptionRevision'
+    )
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PrescriptionQuerySet.as_manager()
+    
     class Meta:
         db_table = 'prescriptions'
         verbose_name = 'Prescription'
         verbose_name_plural = 'Prescriptions'
         ordering = ['-created_at']
+        # Related lookups (previous_version, attachment.prescription) rebuild content too
+        base_manager_name = 'objects'
         indexes = [
             models.Index(fields=['patient', 'created_at']),
             models.Index(fields=['doctor', 'created_at']),
             models.Index(fields=['appointment']),
+            models.Index(fields=['root', 'version']),
         ]
     
     def __str__(self):
         return f"Prescription for {self.patient.get_full_name()} by Dr. {self.doctor.get_doctor_name()}"
     
-    def create_revision(self):
-        """Create a new version of this prescription."""
-        new_prescription = Prescription.objects.create(
-            appointment=self.appointment,
-            doctor=self.doctor,
-            patient=self.patient,
-            diagnosis=self.diagnosis,
-            investigations=self.investigations,
-            treatment_plan=self.treatment_plan,
-            medicines=self.medicines,
-            follow_up_date=self.follow_up_date,
-            referral_notes=self.referral_notes,
-            doctor_notes=self.doctor_notes,
-            version=self.version + 1,
-            previous_version=self
-        )
+    @property
+    def history_root_id(self):
+        """Id of the first version; an original that was never revised has no root set."""
+        return self.root_id or self.pk
+    
+    def history(self):
+        """Every version of this prescription, oldest first (one query on the root index)."""
+        if self.root_id is None:
+            return Prescription.objects.filter(pk=self.pk)
+        return Prescription.objects.filter(root_id=self.root_id).order_by('version')
+    
+    def get_content(self):
+        """Clinical content of this version as JSON-compatible data (CONTENT_FIELDS)."""
+        content = {field: getattr(self, field) for field in CONTENT_FIELDS}
+        return json.loads(json.dumps(content, cls=DjangoJSONEncoder))
+    
+    def set_content(self, content):
+        """Set the clinical content from get_content data."""
+        for field in CONTENT_FIELDS:
+            setattr(self, field, self._meta.get_field(field).to_python(content[field]))
+    
+    def create_revision(self, **changes):
+        """
+        Create a new version of this prescription.
+        
+        The new version is a full row. This version is compacted: its content
+        moves to a PrescriptionRevision, stored as a snapshot every
+        PRESCRIPTION_SNAPSHOT_INTERVAL versions and as a JSON Patch from the
+        previous version otherwise.
+        
+        Args:
+            **changes: Content fields (CONTENT_FIELDS) to change in the new version
+        
+        Returns:
+            Prescription: The new version
+        
+        Raises:
+            ValueError: If this version has already been revised or a change
+                is not a content field
+        """
+        unknown = set(changes) - set(CONTENT_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot change {', '.join(sorted(unknown))} in a revision")
+        
+        root_id = self.history_root_id
+        content = {field: getattr(self, field) for field in CONTENT_FIELDS}
+        content.update(changes)
+        
+        with transaction.atomic():
+            # Locked so concurrent revisions of this version are checked one at a time
+            locked = Prescription.objects.select_for_update().filter(pk=self.pk).values('is_compacted').first()
+            if (
+                locked is None or locked['is_compacted'] or self.is_compacted
+                or Prescription.objects.filter(previous_version=self).exists()
+            ):
+                raise ValueError("Only the latest version of a prescription can be revised")
+            new_prescription = Prescription.objects.create(
+                appointment=self.appointment,
+                doctor=self.doctor,
+                patient=self.patient,
+                version=self.version + 1,
+                previous_version=self,
+                root_id=root_id,
+                **content
+            )
+            PrescriptionRevision.objects.create(
+                root_id=root_id,
+                version=self.version,
+                **self._revision_data(root_id)
+            )
+            # Also makes an original the root of its history, in the same write
+            Prescription.objects.filter(pk=self.pk).update(
+                root=root_id,
+                is_compacted=True,
+                diagnosis='',
+                investigations='',
+                treatment_plan='',
+                medicines=[],
+                follow_up_date=None,
+                referral_notes='',
+                doctor_notes=''
+            )
+            self.root_id = root_id
+            self.is_compacted = True
         return new_prescription
+    
+    def _revision_data(self, root_id):
+        """Snapshot or delta storing this version's content."""
+        content = self.get_content()
+        interval = settings.PRESCRIPTION_SNAPSHOT_INTERVAL
+        previous = list(PrescriptionRevision.objects.filter(
+            root_id=root_id,
+            version__gte=self.version - interval,
+            version__lt=self.version
+        ))
+        snapshots = [revision.version for revision in previous if revision.snapshot is not None]
+        if snapshots and self.version - max(snapshots) < interval:
+            try:
+                return {'delta': make_patch(reconstruct(previous, self.version - 1), content)}
+            except PatchError:
+                pass  # Gap in the chain (e.g. versions from before compaction)
+        return {'snapshot': content}
+
+
+class PrescriptionRevision(models.Model):
+    """
+    Stored content of a superseded prescription version.
+    
+    Either a full snapshot or a JSON Patch from the previous version's
+    content (see records/revisions.py).
+    """
+    
+    root = models.ForeignKey(
+        Prescription,
+        on_delete=models.CASCADE,
+        related_name='stored_revisions',
+        help_text='First version of the prescription history'
+    )
+    version = models.IntegerField()
+    snapshot = models.JSONField(null=True, blank=True, help_text='Full content of the version')
+    delta = models.JSONField(null=True, blank=True, help_text='JSON Patch from the previous version')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'prescription_revisions'
+        verbose_name = 'Prescription Revision'
+        verbose_name_plural = 'Prescription Revisions'
+        ordering = ['root', 'version']
+        unique_together = [['root', 'version']]
+    
+    def __str__(self):
+        kind = 'snapshot' if self.snapshot is not None else f'delta of {len(self.delta or [])} operations'
+        return f"Prescription {self.root_id} v{self.version} ({kind})"
+
+
+def materialize_prescriptions(prescriptions):
+    """
+    Rebuild the content of compacted prescriptions from their revisions.
+    
+    Args:
+        prescriptions: Prescription instances; the compacted ones are updated
+            in place with one query for all of them
+    """
+    compacted = [
+        prescription for prescription in prescriptions
+        if prescription.__dict__.get('is_compacted')  # not when deferred
+    ]
+    if not compacted:
+        return
+    
+    revisions = {}
+    for revision in PrescriptionRevision.objects.filter(root_id__in={p.root_id for p in compacted}):
+        revisions.setdefault(revision.root_id, []).append(revision)
+    for prescription in compacted:
+        prescription.set_content(reconstruct(revisions.get(prescription.root_id, []), prescription.version))
 
 
 class PatientReport(models.Model):
@@ -152,6 +387,30 @@ class PatientReport(models.Model):
         ]
     )
     
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='reports',
+        help_text='Deduplicated content (file points at it); empty for files stored before deduplication'
+    )
+    
+    original_blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='original_reports',
+        help_text='Image as uploaded, before recompression (kept if REPORT_KEEP_ORIGINAL_IMAGES is set)'
+    )
+    
+    thumbnail = models.ImageField(
+        upload_to=report_thumbnail_upload_path,
+        blank=True,
+        help_text='Preview image, generated in the background after upload'
+    )
+    
     file_type = models.CharField(max_length=20, choices=FILE_TYPE_CHOICES)
     file_size = models.IntegerField(help_text='File size in bytes')
     
@@ -160,6 +419,18 @@ class PatientReport(models.Model):
     
     report_date = models.DateField(null=True, blank=True, help_text='Date of the medical report/test')
     
+    # Search
+    extracted_text = models.TextField(
+        blank=True,
+        editable=False,
+        help_text='Text of PDF and DOCX reports, extracted in the background after upload'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text='Weighted title, description and extracted text; maintained by a database trigger'
+    )
+    
     # Metadata
     uploaded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -173,6 +444,7 @@ class PatientReport(models.Model):
             models.Index(fields=['patient', 'uploaded_at']),
             models.Index(fields=['file_type']),
             models.Index(fields=['hospital']),
+            GinIndex(fields=['search_vector'], name='patient_reports_search_idx'),
         ]
     
     def __str__(self):
@@ -184,7 +456,9 @@ class PatientReport(models.Model):
     
     def save(self, *args, **kwargs):
         """Override save to set file_size."""
-        if self.file:
+        if self.blob:
+            self.file_size = self.blob.size
+        elif self.file:
             self.file_size = self.file.size
         super().save(*args, **kwargs)
 
@@ -209,6 +483,15 @@ class PrescriptionAttachment(models.Model):
         ]
     )
     
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='attachments',
+        help_text='Deduplicated content (file points at it); empty for files stored before deduplication'
+    )
+    
     file_name = models.CharField(max_length=255)
     file_size = models.IntegerField()
     description = models.TextField(blank=True)
@@ -227,7 +510,171 @@ class PrescriptionAttachment(models.Model):
     def save(self, *args, **kwargs):
         """Override save to set file_size and file_name."""
         if self.file:
-            self.file_size = self.file.size
+            self.file_size = self.blob.size if self.blob else self.file.size
             if not self.file_name:
                 self.file_name = os.path.basename(self.file.name)
         super().save(*args, **kwargs)
+
+
+def upload_session_expiry():
+    """Default expiry time for a new upload session."""
+    return timezone.now() + timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+
+
+class UploadSession(models.Model):
+    """
+    Resumable upload of a large patient report, received in fixed-size chunks.
+    
+    Chunks are stored on disk under CHUNKED_UPLOAD_DIR and tracked in
+    received_offsets; the PatientReport is only created when the upload is
+    completed and the assembled file matches its checksum.
+    """
+    
+    STATUS_CHOICES = [
+        ('ACTIVE', 'Active'),
+        ('COMPLETE', 'Complete'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    
+    patient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        limit_choices_to={'user_type': 'PATIENT'}
+    )
+    
+    uploaded_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='report_upload_sessions',
+        help_text='User who started the upload'
+    )
+    
+    hospital = models.ForeignKey(
+        Hospital,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_sessions'
+    )
+    
+    # Report details, applied to the PatientReport on completion
+    file_name = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=20, choices=PatientReport.FILE_TYPE_CHOICES)
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    report_date = models.DateField(null=True, blank=True)
+    
+    # Upload state
+    total_size = models.BigIntegerField(help_text='Size of the complete file in bytes')
+    chunk_size = models.IntegerField(help_text='Size of every chunk but the last, in bytes')
+    checksum = models.CharField(max_length=64, help_text='SHA-256 of the complete file (hex)')
+    received_offsets = models.JSONField(default=list, help_text='Offsets of the chunks received so far')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ACTIVE')
+    report = models.OneToOneField(
+        PatientReport,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_session'
+    )
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(default=upload_session_expiry)
+    
+    class Meta:
+        db_table = 'upload_sessions'
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Upload of {self.file_name} ({self.status})"
+    
+    @property
+    def total_chunks(self):
+        """Number of chunks the file is split into."""
+        return max(1, -(-self.total_size // self.chunk_size))
+    
+    def chunk_offsets(self):
+        """Offsets of every chunk of the file."""
+        return [index * self.chunk_size for index in range(self.total_chunks)]
+    
+    def chunk_length(self, offset):
+        """Expected length of the chunk at an offset."""
+        return min(self.chunk_size, self.total_size - offset)
+    
+    def missing_offsets(self):
+        """Offsets of the chunks not received yet."""
+        received = set(self.received_offsets)
+        return [offset for offset in self.chunk_offsets() if offset not in received]
+    
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
+def record_export_expiry():
+    """Default expiry time for a new record export."""
+    return timezone.now() + timedelta(hours=settings.RECORD_EXPORT_EXPIRY_HOURS)
+
+
+class RecordExport(models.Model):
+    """
+    ZIP export of a patient's whole record, built by a Celery worker.
+    
+    Used for records too large to stream in one request; the archive is
+    downloadable until expires_at and then deleted by a periodic task.
+    """
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    
+    patient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='record_exports',
+        limit_choices_to={'user_type': 'PATIENT'}
+    )
+    
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='requested_record_exports'
+    )
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    file = models.FileField(upload_to='record_exports/', blank=True)
+    size = models.BigIntegerField(null=True, blank=True, help_text='Archive size in bytes')
+    error_message = models.TextField(blank=True)
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(default=record_export_expiry)
+    
+    class Meta:
+        db_table = 'record_exports'
+        verbose_name = 'Record Export'
+        verbose_name_plural = 'Record Exports'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Record export for {self.patient.get_full_name()} ({self.status})"
+    
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
@@ -0,0 +1,287 @@
+"""
+Background processing of uploaded patient reports.
+
+New reports are handed to the ``process_report_upload`` Celery task once
+their upload transaction commits (see signals.py). The task runs each stage
+below in order; a failing stage is logged and does not stop the others, and
+the upload itself never waits for any of them.
+
+Stages:
+    normalize_image: Re-encodes photographed reports (phone-camera JPEGs
+        of many megabytes): applies and strips EXIF, limits the resolution
+        to REPORT_IMAGE_MAX_DIMENSION and recompresses, replacing the
+        report's blob. The upload is kept as original_blob only if
+        REPORT_KEEP_ORIGINAL_IMAGES is set. Diagnostic imaging (X-ray, MRI,
+        CT, ultrasound) and lossless PNGs are never recompressed.
+    generate_thumbnail: A small JPEG preview for list screens, from images
+        with Pillow and from the first page of PDFs with poppler's
+        ``pdftoppm`` (skipped if it is not installed).
+    extract_text: The text of PDFs (poppler's ``pdftotext``) and DOCX files
+        (read from the document XML), stored in extracted_text for the
+        report search index (see the report_search migration).
+"""
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .blobs import release_blob, store_blob
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+# Recompressed by normalize_image; PNGs are lossless sources and stay untouched
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg'}
+# Report types whose images are diagnostic and must keep their full quality
+DIAGNOSTIC_IMAGE_TYPES = {'XRAY', 'MRI', 'CT', 'ULTRASOUND'}
+PDF_EXTENSIONS = {'.pdf'}
+DOCX_EXTENSIONS = {'.docx'}
+PDF_RENDER_TIMEOUT_SECONDS = 30
+PDF_TEXT_TIMEOUT_SECONDS = 120
+
+# Indexed text per report; keeps to_tsvector well within its 1MB limit
+MAX_EXTRACTED_TEXT_LENGTH = 500_000
+# Largest DOCX document part read, uncompressed (guards against zip bombs)
+MAX_DOCX_XML_SIZE = 50 * 1024 * 1024
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def _local_path(report, workdir):
+    """Path of the report's file on local disk, for command-line tools."""
+    try:
+        return report.file.path
+    except NotImplementedError:
+        # Remote storage: work on a local copy
+        source = os.path.join(workdir, 'report' + report.get_file_extension().lower())
+        with report.file.open('rb') as f, open(source, 'wb') as out:
+            shutil.copyfileobj(f, out)
+        return source
+
+
+def _encode_image(image):
+    """Encode a normalized photo as a progressive JPEG."""
+    buffer = io.BytesIO()
+    icc_profile = image.info.get('icc_profile')
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(
+        buffer, 'JPEG',
+        quality=settings.REPORT_IMAGE_JPEG_QUALITY,
+        optimize=True,
+        progressive=True,
+        icc_profile=icc_profile
+    )
+    return buffer.getvalue()
+
+
+def normalize_image(report):
+    """
+    Strip metadata from a report image, downsample and recompress it.
+    
+    Args:
+        report: PatientReport with an uploaded file
+    
+    Returns:
+        bool: Whether the report's file was replaced (False for other file
+            types, PNGs, diagnostic imaging reports, and for photos already
+            smaller than their re-encoding and without EXIF)
+    """
+    if report.get_file_extension().lower() not in PHOTO_EXTENSIONS:
+        return False
+    if report.file_type in DIAGNOSTIC_IMAGE_TYPES:
+        return False
+    if report.blob_id is None:
+        # Stored before deduplication (e.g. through the admin): no blob to swap
+        return False
+    
+    max_dimension = settings.REPORT_IMAGE_MAX_DIMENSION
+    with report.file.open('rb') as f:
+        image = Image.open(f)
+        has_exif = bool(image.getexif())
+        image.draft('RGB', (max_dimension, max_dimension))  # JPEG: decode at reduced scale
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    data = _encode_image(image)
+    
+    original_size = report.blob.size
+    if len(data) >= original_size and not has_exif:
+        return False
+    
+    keep_original = settings.REPORT_KEEP_ORIGINAL_IMAGES
+    name = os.path.splitext(os.path.basename(report.file.name))[0] + '.jpg'
+    previous_blob_id = report.blob_id
+    with transaction.atomic():
+        blob = store_blob(ContentFile(data, name=name))
+        report.blob = blob
+        report.file = blob.file.name
+        if keep_original:
+            report.original_blob_id = previous_blob_id
+        report.save(update_fields=['blob', 'original_blob', 'file', 'file_size', 'updated_at'])
+        if not keep_original:
+            release_blob(previous_blob_id)
+    
+    logger.info(
+        f"Recompressed report {report.id}: {original_size} -> {len(data)} bytes, "
+        f"{image.width}x{image.height}"
+    )
+    return True
+
+
+def _open_image(report):
+    """Decode a report image, scaled down while decoding where the format allows it."""
+    size = settings.REPORT_THUMBNAIL_SIZE
+    with report.file.open('rb') as f:
+        image = Image.open(f)
+        image.draft('RGB', (size, size))  # JPEG: decode at 1/2, 1/4 or 1/8 scale
+        image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def _render_pdf_first_page(report):
+    """Render the first page of a PDF report with pdftoppm, or None if unavailable."""
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        logger.info(f"pdftoppm not installed, no preview for report {report.id}")
+        return None
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        source = _local_path(report, workdir)
+        output = os.path.join(workdir, 'preview')
+        subprocess.run(
+            [
+                pdftoppm, '-f', '1', '-l', '1', '-singlefile', '-png',
+                '-scale-to', str(settings.REPORT_THUMBNAIL_SIZE), source, output
+            ],
+            check=True,
+            capture_output=True,
+            timeout=PDF_RENDER_TIMEOUT_SECONDS
+        )
+        with Image.open(f'{output}.png') as image:
+            image.load()
+            return image
+
+
+def generate_thumbnail(report):
+    """
+    Create the report's thumbnail.
+    
+    Args:
+        report: PatientReport with an uploaded file
+    
+    Returns:
+        bool: Whether a thumbnail was created (False for file types without previews)
+    """
+    extension = report.get_file_extension().lower()
+    if extension in IMAGE_EXTENSIONS:
+        image = _open_image(report)
+    elif extension in PDF_EXTENSIONS:
+        image = _render_pdf_first_page(report)
+    else:
+        return False
+    if image is None:
+        return False
+    
+    size = settings.REPORT_THUMBNAIL_SIZE
+    image.thumbnail((size, size))
+    if image.mode != 'RGB':
+        # Flatten transparency onto white rather than black
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=80, optimize=True)
+    if report.thumbnail:
+        report.thumbnail.delete(save=False)
+    report.thumbnail.save(f'{report.id}.jpg', ContentFile(buffer.getvalue()), save=False)
+    report.save(update_fields=['thumbnail', 'updated_at'])
+    return True
+
+
+def _pdf_text(report):
+    """Text of a PDF report from pdftotext, or None if it is not installed."""
+    pdftotext = shutil.which('pdftotext')
+    if pdftotext is None:
+        logger.info(f"pdftotext not installed, no text extracted from report {report.id}")
+        return None
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [pdftotext, '-enc', 'UTF-8', _local_path(report, workdir), '-'],
+            check=True,
+            capture_output=True,
+            timeout=PDF_TEXT_TIMEOUT_SECONDS
+        )
+    return result.stdout.decode('utf-8', errors='replace')
+
+
+def _docx_text(report):
+    """Text of a DOCX report's main document, one line per paragraph."""
+    with report.file.open('rb') as f, zipfile.ZipFile(f) as docx:
+        if docx.getinfo('word/document.xml').file_size > MAX_DOCX_XML_SIZE:
+            raise ValueError("Document XML too large to index")
+        paragraphs, runs = [], []
+        with docx.open('word/document.xml') as document:
+            for _, element in ElementTree.iterparse(document):
+                if element.tag == f'{WORD_NAMESPACE}t':
+                    runs.append(element.text or '')
+                elif element.tag == f'{WORD_NAMESPACE}tab':
+                    runs.append('\t')
+                elif element.tag == f'{WORD_NAMESPACE}p':
+                    paragraphs.append(''.join(runs))
+                    runs = []
+                    element.clear()
+    return '\n'.join(paragraphs)
+
+
+def extract_text(report):
+    """
+    Store the text of a PDF or DOCX report for search.
+    
+    Args:
+        report: PatientReport with an uploaded file
+    
+    Returns:
+        bool: Whether text was extracted (False for other file types)
+    """
+    extension = report.get_file_extension().lower()
+    if extension in PDF_EXTENSIONS:
+        text = _pdf_text(report)
+    elif extension in DOCX_EXTENSIONS:
+        text = _docx_text(report)
+    else:
+        return False
+    if text is None:
+        return False
+    
+    # PostgreSQL text cannot hold NUL characters
+    report.extracted_text = text.replace('\x00', '')[:MAX_EXTRACTED_TEXT_LENGTH]
+    report.save(update_fields=['extracted_text', 'updated_at'])
+    logger.info(f"Extracted {len(report.extracted_text)} characters from report {report.id}")
+    return True
+
+
+STAGES = [
+    normalize_image,
+    generate_thumbnail,
+    extract_text,
+]
+
+
+def process_report(report):
+    """Run every processing stage for a report, logging failures."""
+    for stage in STAGES:
+        try:
+            stage(report)
+        except Exception as e:
+            logger.error(f"Report {report.id}: {stage.__name__} failed: {str(e)}")
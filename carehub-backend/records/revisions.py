@@ -0,0 +1,180 @@
+"""
+Compact storage of superseded prescription versions.
+
+The latest version of a prescription is a normal, fully materialized row.
+When Prescription.create_revision supersedes a version, its clinical content
+is written to a PrescriptionRevision and the row is compacted (its content
+columns cleared). Every PRESCRIPTION_SNAPSHOT_INTERVAL-th revision is a full
+snapshot; the ones in between hold an RFC 6902 JSON Patch from the previous
+version, which for a typical edit (one dosage changed) is a single
+``replace`` operation instead of a copy of every text field and the whole
+medicines list.
+
+Reading a compacted version replays at most SNAPSHOT_INTERVAL - 1 patches
+onto the nearest earlier snapshot. Prescription querysets do this
+transparently (see PrescriptionQuerySet), so views and serializers always
+see full prescriptions.
+
+Only model instances fetched through a Prescription queryset or the base
+manager are rebuilt. These see the cleared columns (empty text, no
+medicines) of compacted versions instead:
+
+- ``.values()`` and ``.values_list()``;
+- prescriptions joined in with ``select_related('prescription')`` from
+  another model (e.g. PrescriptionAttachment), which Django builds without
+  the queryset's iterable;
+- database-side filters, ordering and aggregates on content fields
+  (``diagnosis__icontains``, search vectors, admin search).
+
+Read content from Prescription instances, and filter on content fields
+only over ``latest_versions()``, which are never compacted.
+"""
+import copy
+
+# Prescription fields stored in revisions; everything else (doctor, patient,
+# version links, timestamps) stays on the row
+CONTENT_FIELDS = [
+    'diagnosis', 'investigations', 'treatment_plan', 'medicines',
+    'follow_up_date', 'referral_notes', 'doctor_notes',
+]
+
+
+class PatchError(ValueError):
+    """Raised when a patch does not apply to a document or a history cannot be rebuilt."""
+
+
+def _escape(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def make_patch(old, new, path=''):
+    """
+    JSON Patch (add, remove and replace operations) turning ``old`` into ``new``.
+
+    Objects are compared key by key and lists element by element, so a
+    change deep inside the medicines list produces one small operation.
+
+    Args:
+        old: JSON-compatible document
+        new: JSON-compatible document
+        path: JSON Pointer of the documents (used when recursing)
+
+    Returns:
+        list: Patch operations, empty if the documents are equal
+    """
+    if old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{'op': 'remove', 'path': f'{path}/{_escape(key)}'} for key in old if key not in new]
+        for key, value in new.items():
+            child = f'{path}/{_escape(key)}'
+            if key in old:
+                ops.extend(make_patch(old[key], value, child))
+            else:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        ops = []
+        for index in range(common):
+            ops.extend(make_patch(old[index], new[index], f'{path}/{index}'))
+        for index in range(common, len(new)):
+            ops.append({'op': 'add', 'path': f'{path}/{index}', 'value': new[index]})
+        # Remove from the end so earlier indexes stay valid
+        for index in range(len(old) - 1, common - 1, -1):
+            ops.append({'op': 'remove', 'path': f'{path}/{index}'})
+        return ops
+
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def apply_patch(document, patch):
+    """
+    Apply JSON Patch add, remove and replace operations.
+
+    Args:
+        document: JSON-compatible document (not modified)
+        patch: List of operations, e.g. from make_patch
+
+    Returns:
+        The patched copy of the document
+
+    Raises:
+        PatchError: If an operation is unsupported or its path does not exist
+    """
+    document = copy.deepcopy(document)
+    for operation in patch:
+        op, path = operation.get('op'), operation.get('path', '')
+        if op not in ('add', 'remove', 'replace'):
+            raise PatchError(f"Unsupported patch operation: {op}")
+        if path == '':
+            if op == 'remove':
+                raise PatchError("Cannot remove the whole document")
+            document = copy.deepcopy(operation['value'])
+            continue
+
+        tokens = [_unescape(token) for token in path.split('/')[1:]]
+        parent = document
+        try:
+            for token in tokens[:-1]:
+                parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+            key = tokens[-1]
+            if isinstance(parent, list):
+                index = len(parent) if key == '-' else int(key)
+                if op == 'add':
+                    if index > len(parent):
+                        raise IndexError(index)
+                    parent.insert(index, copy.deepcopy(operation['value']))
+                elif op == 'remove':
+                    del parent[index]
+                else:
+                    parent[index] = copy.deepcopy(operation['value'])
+            else:
+                if op != 'add' and key not in parent:
+                    raise KeyError(key)
+                if op == 'remove':
+                    del parent[key]
+                else:
+                    parent[key] = copy.deepcopy(operation['value'])
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            raise PatchError(f"Cannot apply {op} at {path}: {e!r}") from e
+    return document
+
+
+def reconstruct(revisions, version):
+    """
+    Rebuild the content of one version from its revisions.
+
+    Args:
+        revisions: PrescriptionRevisions of one prescription history, in any
+            order, including the nearest snapshot at or before ``version``
+        version: Version number to rebuild
+
+    Returns:
+        dict: Content of the version (CONTENT_FIELDS, JSON-compatible)
+
+    Raises:
+        PatchError: If the snapshot or a delta in between is missing
+    """
+    chain = []
+    by_version = {revision.version: revision for revision in revisions}
+    current = version
+    while True:
+        revision = by_version.get(current)
+        if revision is None:
+            raise PatchError(f"Revision {current} needed to rebuild version {version} is missing")
+        chain.append(revision)
+        if revision.snapshot is not None:
+            break
+        current -= 1
+
+    content = copy.deepcopy(chain.pop().snapshot)
+    for revision in reversed(chain):
+        content = apply_patch(content, revision.delta)
+    return content
@@ -1,9 +1,38 @@
 """
 Serializers for records app.
 """
+import re
 from rest_framework import serializers
 from django.conf import settings
-from .models import Prescription, PatientReport, PrescriptionAttachment
+from django.urls import reverse
+from .models import Prescription, PatientReport, PrescriptionAttachment, RecordExport, UploadSession
+from .blobs import release_blob, store_blob
+from .upload_handlers import check_file_extension, check_file_size, upload_digest
+
+
+def _absolute_url(request, path):
+    """Absolute URL for a path when the request is known."""
+    return request.build_absolute_uri(path) if request else path
+
+
+class BlobFileMixin:
+    """
+    Store the uploaded ``file`` in the content-addressed blob store on create.
+    
+    Identical content uploaded before is not written again; the new row
+    points at the existing blob.
+    """
+    
+    def create(self, validated_data):
+        uploaded = validated_data.pop('file')
+        blob = store_blob(uploaded, upload_digest(self.context.get('request'), 'file'))
+        validated_data['blob'] = blob
+        validated_data['file'] = blob.file.name
+        try:
+            return super().create(validated_data)
+        except Exception:
+            release_blob(blob.id)
+            raise
 
 
 class PrescriptionSerializer(serializers.ModelSerializer):
@@ -14,6 +43,8 @@ class PrescriptionSerializer(serializers.ModelSerializer):
     hospital_name = serializers.CharField(source='doctor.hospital.name', read_only=True)
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
     appointment_id = serializers.IntegerField(source='appointment.id', read_only=True)
+    # Unset on originals until they are revised; the API always gives the first version's id
+    root = serializers.IntegerField(source='history_root_id', read_only=True)
     
     class Meta:
         model = Prescription
@@ -22,9 +53,9 @@ class PrescriptionSerializer(serializers.ModelSerializer):
             'doctor_specialization', 'hospital_name', 'patient', 'patient_name',
             'diagnosis', 'investigations', 'treatment_plan', 'medicines',
             'follow_up_date', 'referral_notes', 'doctor_notes', 'version',
-            'previous_version', 'created_at', 'updated_at'
+            'previous_version', 'root', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'version', 'previous_version', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'version', 'previous_version', 'root', 'created_at', 'updated_at']
 
 
 class CreatePrescriptionSerializer(serializers.ModelSerializer):
@@ -81,33 +112,53 @@ class PatientReportSerializer(serializers.ModelSerializer):
     hospital_name = serializers.CharField(source='hospital.name', read_only=True)
     uploaded_by_name = serializers.CharField(source='uploaded_by.get_full_name', read_only=True)
     file_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
     file_extension = serializers.SerializerMethodField()
     
     class Meta:
         model = PatientReport
         fields = [
             'id', 'patient', 'patient_name', 'hospital', 'hospital_name',
-            'uploaded_by', 'uploaded_by_name', 'file', 'file_url', 'file_type',
-            'file_size', 'file_extension', 'title', 'description', 'report_date',
+            'uploaded_by', 'uploaded_by_name', 'file', 'file_url', 'download_url', 'thumbnail_url',
+            'file_type', 'file_size', 'file_extension', 'title', 'description', 'report_date',
             'uploaded_at', 'updated_at'
         ]
         read_only_fields = ['id', 'file_size', 'uploaded_by', 'uploaded_at', 'updated_at']
     
     def get_file_url(self, obj):
-        """Get full URL for file."""
-        if obj.file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.file.url)
-            return obj.file.url
-        return None
+        """Deprecated alias of download_url; storage URLs are not served publicly."""
+        return self.get_download_url(obj)
+    
+    def get_download_url(self, obj):
+        """Get URL of the permission-checked download."""
+        return _absolute_url(self.context.get('request'), reverse('records:download-report', args=[obj.id]))
+    
+    def get_thumbnail_url(self, obj):
+        """Get URL of the preview image, None until it has been generated."""
+        if not obj.thumbnail:
+            return None
+        return _absolute_url(self.context.get('request'), reverse('records:report-thumbnail', args=[obj.id]))
     
     def get_file_extension(self, obj):
         """Get file extension."""
         return obj.get_file_extension()
 
 
-class UploadPatientReportSerializer(serializers.ModelSerializer):
+class PatientReportSearchResultSerializer(PatientReportSerializer):
+    """Report search hit with its rank and matching excerpts."""
+    
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(
+        read_only=True,
+        help_text='Excerpts of the extracted text with matches wrapped in <mark>'
+    )
+    
+    class Meta(PatientReportSerializer.Meta):
+        fields = PatientReportSerializer.Meta.fields + ['rank', 'headline']
+
+
+class UploadPatientReportSerializer(BlobFileMixin, serializers.ModelSerializer):
     """Serializer for uploading patient reports."""
     
     class Meta:
@@ -115,28 +166,14 @@ class UploadPatientReportSerializer(serializers.ModelSerializer):
         fields = ['file', 'file_type', 'title', 'description', 'report_date', 'hospital']
     
     def validate_file(self, value):
-        """Validate file size and extension."""
-        # Check file size
-        max_size = getattr(settings, 'MAX_UPLOAD_SIZE', 10 * 1024 * 1024)  # 10MB default
-        if value.size > max_size:
-            raise serializers.ValidationError(
-                f"File size exceeds maximum allowed size of {max_size / (1024 * 1024)}MB."
-            )
-        
-        # Check file extension
-        allowed_extensions = getattr(
-            settings,
-            'ALLOWED_UPLOAD_EXTENSIONS',
-            ['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx']
-        )
-        
-        file_extension = value.name.split('.')[-1].lower()
-        if file_extension not in allowed_extensions:
-            raise serializers.ValidationError(
-                f"File extension '{file_extension}' is not allowed. "
-                f"Allowed extensions: {', '.join(allowed_extensions)}"
-            )
+        """
+        Validate file size and extension.
         
+        Multipart uploads are already checked while streaming by
+        ValidatingUploadHandler; this covers files from other sources.
+        """
+        check_file_size(value.size)
+        check_file_extension(value.name)
         return value
     
     def create(self, validated_data):
@@ -150,24 +187,114 @@ class UploadPatientReportSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PrescriptionAttachmentSerializer(serializers.ModelSerializer):
+class CreateUploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for starting a resumable report upload."""
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'file_name', 'file_type', 'title', 'description', 'report_date',
+            'hospital', 'total_size', 'checksum'
+        ]
+    
+    def validate_file_name(self, value):
+        """Validate the file extension."""
+        check_file_extension(value)
+        return value
+    
+    def validate_total_size(self, value):
+        """Validate the file size against CHUNKED_UPLOAD_MAX_SIZE."""
+        max_size = settings.CHUNKED_UPLOAD_MAX_SIZE
+        if value <= 0:
+            raise serializers.ValidationError("File size must be positive.")
+        if value > max_size:
+            raise serializers.ValidationError(
+                f"File size exceeds maximum allowed size of {max_size / (1024 * 1024)}MB."
+            )
+        return value
+    
+    def validate_checksum(self, value):
+        """Validate the checksum is a SHA-256 hex digest."""
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError("Checksum must be a SHA-256 hex digest.")
+        return value
+    
+    def create(self, validated_data):
+        """Create session with patient, uploaded_by and chunk size from context."""
+        validated_data['patient'] = self.context['patient']
+        validated_data['uploaded_by'] = self.context['request'].user
+        validated_data['chunk_size'] = settings.CHUNKED_UPLOAD_CHUNK_SIZE
+        return super().create(validated_data)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for UploadSession progress."""
+    
+    total_chunks = serializers.IntegerField(read_only=True)
+    missing_offsets = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'patient', 'file_name', 'file_type', 'title', 'total_size',
+            'chunk_size', 'total_chunks', 'checksum', 'received_offsets',
+            'missing_offsets', 'status', 'report', 'created_at', 'expires_at'
+        ]
+        read_only_fields = fields
+
+
+class RecordExportSerializer(serializers.ModelSerializer):
+    """Serializer for background record export status."""
+    
+    status_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = RecordExport
+        fields = [
+            'id', 'patient', 'status', 'status_url', 'download_url', 'size',
+            'error_message', 'created_at', 'completed_at', 'expires_at'
+        ]
+        read_only_fields = fields
+    
+    def get_status_url(self, obj):
+        """Get URL to poll the export."""
+        return _absolute_url(self.context.get('request'), reverse('records:record-export', args=[obj.id]))
+    
+    def get_download_url(self, obj):
+        """Get URL of the archive, None until it is ready and after it expired."""
+        if obj.status != 'COMPLETED' or obj.is_expired():
+            return None
+        return _absolute_url(self.context.get('request'), reverse('records:download-record-export', args=[obj.id]))
+
+
+class PrescriptionAttachmentSerializer(BlobFileMixin, serializers.ModelSerializer):
     """Serializer for PrescriptionAttachment model."""
     
     file_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
     
     class Meta:
         model = PrescriptionAttachment
-        fields = ['id', 'prescription', 'file', 'file_url', 'file_name', 'file_size', 'description', 'uploaded_at']
+        fields = [
+            'id', 'prescription', 'file', 'file_url', 'download_url', 'file_name',
+            'file_size', 'description', 'uploaded_at'
+        ]
         read_only_fields = ['id', 'file_name', 'file_size', 'uploaded_at']
     
+    def create(self, validated_data):
+        """Create attachment named after the uploaded file."""
+        validated_data['file_name'] = validated_data['file'].name
+        return super().create(validated_data)
+    
     def get_file_url(self, obj):
-        """Get full URL for file."""
-        if obj.file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.file.url)
-            return obj.file.url
-        return None
+        """Deprecated alias of download_url; storage URLs are not served publicly."""
+        return self.get_download_url(obj)
+    
+    def get_download_url(self, obj):
+        """Get URL of the permission-checked download."""
+        return _absolute_url(self.context.get('request'), reverse('records:download-attachment', args=[obj.id]))
 
 
 class PrescriptionWithAttachmentsSerializer(PrescriptionSerializer):
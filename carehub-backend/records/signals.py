@@ -0,0 +1,54 @@
+"""
+Signal handlers for records app.
+"""
+import logging
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .blobs import release_blob
+from .models import PatientReport, PrescriptionAttachment
+from .tasks import process_report_upload
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_delete, sender=PatientReport)
+@receiver(post_delete, sender=PrescriptionAttachment)
+def release_file_blob(sender, instance, **kwargs):
+    """
+    Drop the deleted report's or attachment's reference to its stored blob.
+    
+    Runs for cascading deletes too (e.g. of a patient or prescription).
+    """
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+    if getattr(instance, 'original_blob_id', None):
+        release_blob(instance.original_blob_id)
+
+
+@receiver(post_delete, sender=PatientReport)
+def delete_report_thumbnail(sender, instance, **kwargs):
+    """Delete the thumbnail of a deleted report; it is not shared."""
+    if instance.thumbnail:
+        instance.thumbnail.delete(save=False)
+
+
+@receiver(post_save, sender=PatientReport)
+def queue_report_processing(sender, instance, created, **kwargs):
+    """
+    Queue background processing (thumbnails) of a new report.
+    
+    Queued on commit so the worker sees the report, whichever way it was
+    uploaded.
+    """
+    if kwargs.get('raw') or not created:
+        return
+    
+    def enqueue():
+        try:
+            process_report_upload.delay(instance.id)
+        except Exception as e:
+            logger.error(f"Failed to queue processing of report {instance.id}: {str(e)}")
+    
+    transaction.on_commit(enqueue)
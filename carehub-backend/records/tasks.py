@@ -0,0 +1,128 @@
+"""
+Celery tasks for records app.
+"""
+import logging
+import tempfile
+from celery import shared_task
+from django.core.files import File
+from django.utils import timezone
+
+from .blobs import collect_orphaned_blob_files, collect_unreferenced_blobs
+from .chunked_uploads import discard_chunks
+from .exports import collect_export, stream_export
+from .models import PatientReport, RecordExport, UploadSession
+from .processing import process_report
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def process_report_upload(report_id):
+    """
+    Run the post-upload processing stages for a report.
+    
+    Args:
+        report_id: ID of a newly uploaded PatientReport
+    """
+    try:
+        report = PatientReport.objects.get(id=report_id)
+    except PatientReport.DoesNotExist:
+        logger.warning(f"Report {report_id} was deleted before processing")
+        return
+    process_report(report)
+
+
+@shared_task(ignore_result=True)
+def cleanup_upload_sessions():
+    """
+    Delete expired, unfinished upload sessions and their chunks.
+    
+    Scheduled hourly by Celery beat, so abandoned uploads do not keep
+    their chunks on disk.
+    """
+    expired = UploadSession.objects.filter(status='ACTIVE', expires_at__lte=timezone.now())
+    count = 0
+    for session in expired.iterator():
+        discard_chunks(session)
+        session.delete()
+        count += 1
+    if count:
+        logger.info(f"Deleted {count} expired upload sessions")
+
+
+@shared_task(ignore_result=True)
+def cleanup_unreferenced_blobs():
+    """
+    Delete stored blobs no report or attachment references any more.
+    
+    Scheduled hourly by Celery beat; deleting a report or attachment only
+    drops its reference. Also removes blob files left by rolled-back uploads.
+    """
+    count = collect_unreferenced_blobs()
+    if count:
+        logger.info(f"Deleted {count} unreferenced blobs")
+    orphans = collect_orphaned_blob_files()
+    if orphans:
+        logger.info(f"Deleted {orphans} orphaned blob files")
+
+
+@shared_task(ignore_result=True)
+def build_record_export(export_id):
+    """
+    Write the ZIP of a patient's record for a background export.
+    
+    The archive is streamed into a temporary file and then saved to storage,
+    so it is never held in memory.
+    
+    Args:
+        export_id: ID of a PENDING RecordExport
+    """
+    try:
+        export = RecordExport.objects.select_related('patient').get(id=export_id)
+    except RecordExport.DoesNotExist:
+        logger.warning(f"Record export {export_id} no longer exists")
+        return
+    
+    if export.status not in ('PENDING', 'RUNNING'):
+        logger.info(f"Record export {export_id} already {export.status}")
+        return
+    
+    export.status = 'RUNNING'
+    export.save(update_fields=['status'])
+    
+    try:
+        with tempfile.TemporaryFile() as archive:
+            for part in stream_export(*collect_export(export.patient)):
+                archive.write(part)
+            archive.seek(0)
+            export.file.save(f'{export.patient_id}-{export.id}.zip', File(archive), save=False)
+    except Exception as e:
+        logger.error(f"Record export {export_id} failed: {str(e)}")
+        export.status = 'FAILED'
+        export.error_message = str(e)
+        export.completed_at = timezone.now()
+        export.save(update_fields=['status', 'error_message', 'completed_at'])
+        return
+    
+    export.size = export.file.size
+    export.status = 'COMPLETED'
+    export.completed_at = timezone.now()
+    export.save(update_fields=['file', 'size', 'status', 'completed_at'])
+    logger.info(f"Record export {export_id} completed: {export.size} bytes")
+
+
+@shared_task(ignore_result=True)
+def cleanup_record_exports():
+    """
+    Delete expired record exports and their archives.
+    
+    Scheduled hourly by Celery beat.
+    """
+    count = 0
+    for export in RecordExport.objects.filter(expires_at__lte=timezone.now()).iterator():
+        if export.file:
+            export.file.delete(save=False)
+        export.delete()
+        count += 1
+    if count:
+        logger.info(f"Deleted {count} expired record exports")
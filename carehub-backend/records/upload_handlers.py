@@ -0,0 +1,144 @@
+"""
+Upload handler that validates and hashes report and attachment files while they stream in.
+
+Django's default handlers buffer the whole multipart body (in memory or a
+temporary file) before serializers see it, so an oversized or mislabelled
+file is only rejected after it has been received in full. The handler here
+runs first in the chain and checks each file as it arrives: the request's
+Content-Length and the extension before any data is read, the leading magic
+bytes on the first chunk, and the running size on every chunk, aborting the
+upload as soon as MAX_UPLOAD_SIZE is crossed. It also computes each file's
+SHA-256 on the way through, so the blob store (records/blobs.py) can
+deduplicate it without reading it again.
+"""
+import hashlib
+import logging
+import os
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of each allowed file type; extensions configured in
+# ALLOWED_UPLOAD_EXTENSIONS without an entry here are not sniffed
+FILE_SIGNATURES = {
+    'pdf': (b'%PDF-',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),  # OLE2 compound document
+    'docx': (b'PK\x03\x04',),  # Office Open XML (ZIP)
+}
+SIGNATURE_LENGTH = max(len(signature) for signatures in FILE_SIGNATURES.values() for signature in signatures)
+
+
+def file_extension(file_name: str):
+    """Lowercased extension of a file name, without the dot."""
+    return os.path.splitext(file_name or '')[1].lstrip('.').lower()
+
+
+def check_file_extension(file_name: str):
+    """
+    Reject file names whose extension is not in ALLOWED_UPLOAD_EXTENSIONS.
+    
+    Raises:
+        ValidationError: If the extension is not allowed
+    """
+    extension = file_extension(file_name)
+    allowed_extensions = settings.ALLOWED_UPLOAD_EXTENSIONS
+    if extension not in allowed_extensions:
+        raise serializers.ValidationError(
+            f"File extension '{extension}' is not allowed. "
+            f"Allowed extensions: {', '.join(allowed_extensions)}"
+        )
+    return extension
+
+
+def check_file_size(size: int):
+    """
+    Reject sizes above MAX_UPLOAD_SIZE.
+    
+    Raises:
+        ValidationError: If the size exceeds the limit
+    """
+    max_size = settings.MAX_UPLOAD_SIZE
+    if size > max_size:
+        raise serializers.ValidationError(
+            f"File size exceeds maximum allowed size of {max_size / (1024 * 1024)}MB."
+        )
+
+
+def check_file_signature(extension: str, header: bytes):
+    """
+    Reject files whose leading bytes do not match their extension.
+    
+    Raises:
+        ValidationError: If the content is not of the type the extension claims
+    """
+    signatures = FILE_SIGNATURES.get(extension)
+    if signatures and not any(header.startswith(signature) for signature in signatures):
+        raise serializers.ValidationError(f"File content does not match the '{extension}' extension.")
+
+
+class ValidatingUploadHandler(FileUploadHandler):
+    """
+    First handler in the chain: validates files and passes the data on unchanged.
+    
+    Errors are raised as serializer ValidationErrors keyed by the form field,
+    which stops parsing and gives the same 400 response the serializers give.
+    Digests of completed files are recorded per form field on the request
+    (see upload_digest).
+    """
+    
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Reject before reading anything if the body cannot fit a valid file
+        # plus the non-file form fields
+        if content_length > settings.MAX_UPLOAD_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            logger.warning(f"Rejected upload of {content_length} bytes from its Content-Length")
+            self._reject('file', check_file_size, content_length)
+    
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.extension = self._reject(field_name, check_file_extension, file_name)
+        if content_length:
+            self._reject(field_name, check_file_size, content_length)
+        self.received = 0
+        self.header = b''
+        self.sniffed = False
+        self.hasher = hashlib.sha256()
+    
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        self._reject(self.field_name, check_file_size, self.received)
+        if not self.sniffed:
+            self.header += raw_data[:SIGNATURE_LENGTH - len(self.header)]
+            if len(self.header) >= SIGNATURE_LENGTH:
+                self._sniff()
+        self.hasher.update(raw_data)
+        return raw_data
+    
+    def file_complete(self, file_size):
+        if not self.sniffed:
+            self._sniff()
+        if self.request is not None:
+            if not hasattr(self.request, 'upload_digests'):
+                self.request.upload_digests = {}
+            self.request.upload_digests[self.field_name] = self.hasher.hexdigest()
+        return None
+    
+    def _sniff(self):
+        self.sniffed = True
+        self._reject(self.field_name, check_file_signature, self.extension, self.header)
+    
+    def _reject(self, field_name, check, *args):
+        try:
+            return check(*args)
+        except serializers.ValidationError as e:
+            logger.warning(f"Rejected upload of {self.file_name or 'request'}: {e.detail[0]}")
+            raise serializers.ValidationError({field_name: e.detail})
+
+
+def upload_digest(request, field_name):
+    """SHA-256 computed while streaming the file uploaded in a form field, if any."""
+    return getattr(request, 'upload_digests', {}).get(field_name)
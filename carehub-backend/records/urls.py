@@ -6,13 +6,25 @@ from .views import (
     CreatePrescriptionView,
     PrescriptionListView,
     PrescriptionDetailView,
+    PrescriptionHistoryView,
     PatientPrescriptionHistoryView,
     UploadPatientReportView,
     PatientReportListView,
+    PatientReportSearchView,
     PatientReportDetailView,
     MyReportsView,
     AddPrescriptionAttachmentView,
+    CreateUploadSessionView,
+    UploadSessionDetailView,
+    UploadChunkView,
+    complete_upload_session,
+    download_report,
+    report_thumbnail,
+    download_attachment,
     patient_medical_summary,
+    export_patient_record,
+    RecordExportView,
+    download_record_export,
 )
 
 app_name = 'records'
@@ -22,15 +34,31 @@ urlpatterns = [
     path('prescriptions/', PrescriptionListView.as_view(), name='prescription-list'),
     path('prescriptions/create/', CreatePrescriptionView.as_view(), name='create-prescription'),
     path('prescriptions/<int:pk>/', PrescriptionDetailView.as_view(), name='prescription-detail'),
+    path('prescriptions/<int:pk>/history/', PrescriptionHistoryView.as_view(), name='prescription-history'),
     path('prescriptions/<int:prescription_id>/attachments/', AddPrescriptionAttachmentView.as_view(), name='add-attachment'),
     
     # Patient reports
     path('my-reports/', MyReportsView.as_view(), name='my-reports'),
     path('reports/<int:pk>/', PatientReportDetailView.as_view(), name='report-detail'),
+    path('reports/<int:pk>/download/', download_report, name='download-report'),
+    path('reports/<int:pk>/thumbnail/', report_thumbnail, name='report-thumbnail'),
+    path('attachments/<int:pk>/download/', download_attachment, name='download-attachment'),
+    
+    # Resumable report uploads
+    path('uploads/<uuid:pk>/', UploadSessionDetailView.as_view(), name='upload-session-detail'),
+    path('uploads/<uuid:pk>/chunks/<int:offset>/', UploadChunkView.as_view(), name='upload-chunk'),
+    path('uploads/<uuid:pk>/complete/', complete_upload_session, name='complete-upload'),
     
     # Patient-specific records
     path('patients/<int:patient_id>/prescriptions/', PatientPrescriptionHistoryView.as_view(), name='patient-prescriptions'),
     path('patients/<int:patient_id>/reports/', PatientReportListView.as_view(), name='patient-reports'),
+    path('patients/<int:patient_id>/reports/search/', PatientReportSearchView.as_view(), name='search-reports'),
     path('patients/<int:patient_id>/reports/upload/', UploadPatientReportView.as_view(), name='upload-report'),
+    path('patients/<int:patient_id>/reports/uploads/', CreateUploadSessionView.as_view(), name='create-upload-session'),
     path('patients/<int:patient_id>/summary/', patient_medical_summary, name='patient-summary'),
+    path('patients/<int:patient_id>/export/', export_patient_record, name='export-record'),
+    
+    # Record exports
+    path('exports/<uuid:pk>/', RecordExportView.as_view(), name='record-export'),
+    path('exports/<uuid:pk>/download/', download_record_export, name='download-record-export'),
 ]
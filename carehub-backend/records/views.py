@@ -6,25 +6,56 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema
+from django.utils.http import content_disposition_header
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+import io
 import logging
 
-from .models import Prescription, PatientReport, PrescriptionAttachment
+from .chunked_uploads import ChunkError, CorruptUploadError, complete_upload, discard_chunks, write_chunk
+from .downloads import serve_file
+from .exports import collect_export, export_size, stream_export
+from .models import Prescription, PatientReport, PrescriptionAttachment, RecordExport, UploadSession
 from .serializers import (
     PrescriptionSerializer, CreatePrescriptionSerializer,
     PatientReportSerializer, UploadPatientReportSerializer,
     PrescriptionAttachmentSerializer, PrescriptionWithAttachmentsSerializer,
-    PatientMedicalSummarySerializer
+    PatientMedicalSummarySerializer, CreateUploadSessionSerializer,
+    UploadSessionSerializer, PatientReportSearchResultSerializer,
+    RecordExportSerializer
 )
+from .tasks import build_record_export
+from .upload_handlers import ValidatingUploadHandler
 from accounts.models import User, OTP
 from hospitals.models import HospitalDoctorProfile
 from hospitals.permissions import IsDoctorUser, IsPatientUser
+from recommendations.interactions import check_interactions, medication_names
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
 
+class ValidatedUploadMixin:
+    """
+    Validate uploaded files while the request body streams in.
+    
+    Puts ValidatingUploadHandler in front of Django's upload handlers, so
+    oversized, disallowed or mislabelled files are rejected before they are
+    buffered in full.
+    """
+    
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, ValidatingUploadHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
+
+
 class CreatePrescriptionView(generics.CreateAPIView):
     """
     Create prescription (Doctor only).
@@ -62,35 +93,55 @@ class CreatePrescriptionView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         prescription = serializer.save()
         
+        # Flag interactions between the prescribed medicines (local check, no LLM call)
+        interaction_warnings = check_interactions(medication_names(prescription.medicines))
+        
         return Response(
             {
                 'message': 'Prescription created successfully',
-                'prescription': PrescriptionSerializer(prescription).data
+                'prescription': PrescriptionSerializer(prescription).data,
+                'interaction_warnings': interaction_warnings
             },
             status=status.HTTP_201_CREATED
         )
 
 
+def _visible_prescriptions(user):
+    """Prescriptions a user may read: patients their own, doctors those they wrote, admins all."""
+    if user.user_type == 'PATIENT':
+        return Prescription.objects.filter(patient=user)
+    elif user.user_type == 'DOCTOR':
+        doctor_profiles = HospitalDoctorProfile.objects.filter(user=user)
+        return Prescription.objects.filter(doctor__in=doctor_profiles)
+    elif user.user_type == 'ADMIN':
+        return Prescription.objects.all()
+    
+    return Prescription.objects.none()
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter('latest', OpenApiTypes.BOOL, description='Only the latest version of each prescription (default true)')
+    ]
+)
 class PrescriptionListView(generics.ListAPIView):
     """
     List prescriptions based on user type.
     GET /api/records/prescriptions/
+    
+    Superseded versions are left out (a version is superseded once a
+    revision of it exists) unless latest=false is given.
     """
     serializer_class = PrescriptionSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        user = self.request.user
+        queryset = _visible_prescriptions(self.request.user)
         
-        if user.user_type == 'PATIENT':
-            return Prescription.objects.filter(patient=user).order_by('-created_at')
-        elif user.user_type == 'DOCTOR':
-            doctor_profiles = HospitalDoctorProfile.objects.filter(user=user)
-            return Prescription.objects.filter(doctor__in=doctor_profiles).order_by('-created_at')
-        elif user.user_type == 'ADMIN':
-            return Prescription.objects.all().order_by('-created_at')
+        if self.request.query_params.get('latest') != 'false':
+            queryset = queryset.latest_versions()
         
-        return Prescription.objects.none()
+        return queryset.order_by('-created_at')
 
 
 class PrescriptionDetailView(generics.RetrieveAPIView):
@@ -102,23 +153,52 @@ class PrescriptionDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        user = self.request.user
-        
-        if user.user_type == 'PATIENT':
-            return Prescription.objects.filter(patient=user)
-        elif user.user_type == 'DOCTOR':
-            doctor_profiles = HospitalDoctorProfile.objects.filter(user=user)
-            return Prescription.objects.filter(doctor__in=doctor_profiles)
-        elif user.user_type == 'ADMIN':
-            return Prescription.objects.all()
-        
-        return Prescription.objects.none()
+        return _visible_prescriptions(self.request.user)
+
+
+class PrescriptionHistoryView(generics.ListAPIView):
+    """
+    Get every version of a prescription, oldest first.
+    GET /api/records/prescriptions/{id}/history/
+    
+    All versions share the root (first version) id, so the history is a
+    single query on the (root, version) index; any version's id can be
+    given. Originals that were never revised have no root and are their
+    own history.
+    """
+    serializer_class = PrescriptionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    
+    def get_queryset(self):
+        root = _visible_prescriptions(self.request.user).filter(pk=self.kwargs['pk']).values(
+            history_root=Coalesce('root_id', 'pk')
+        )
+        return (
+            Prescription.objects.filter(Q(root_id__in=root) | Q(pk__in=root))
+            .select_related('doctor__user', 'doctor__hospital', 'patient')
+            .order_by('version')
+        )
+    
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not response.data:
+            raise Http404
+        return response
 
 
+@extend_schema(
+    parameters=[
+        OpenApiParameter('latest', OpenApiTypes.BOOL, description='Only the latest version of each prescription (default true)')
+    ]
+)
 class PatientPrescriptionHistoryView(generics.ListAPIView):
     """
     Get prescription history for a patient (with OTP verification for doctors).
     GET /api/records/patients/{patient_id}/prescriptions/
+    
+    Like the prescription list, superseded versions are left out unless
+    latest=false is given.
     """
     serializer_class = PrescriptionSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -132,25 +212,29 @@ class PatientPrescriptionHistoryView(generics.ListAPIView):
         except User.DoesNotExist:
             return Prescription.objects.none()
         
+        prescriptions = Prescription.objects.filter(patient=patient)
+        if self.request.query_params.get('latest') != 'false':
+            prescriptions = prescriptions.latest_versions()
+        
         # Patient can view their own prescriptions
         if user.user_type == 'PATIENT' and user.id == patient_id:
-            return Prescription.objects.filter(patient=patient).order_by('-created_at')
+            return prescriptions.order_by('-created_at')
         
         # Admin can view all
         if user.user_type == 'ADMIN':
-            return Prescription.objects.filter(patient=patient).order_by('-created_at')
+            return prescriptions.order_by('-created_at')
         
         # Doctors need OTP verification (checked via query param)
         if user.user_type == 'DOCTOR':
             otp_token = self.request.query_params.get('otp_verified')
             if otp_token == 'true':
                 # In production, verify a signed token here
-                return Prescription.objects.filter(patient=patient).order_by('-created_at')
+                return prescriptions.order_by('-created_at')
         
         return Prescription.objects.none()
 
 
-class UploadPatientReportView(generics.CreateAPIView):
+class UploadPatientReportView(ValidatedUploadMixin, generics.CreateAPIView):
     """
     Upload patient report.
     POST /api/records/patients/{patient_id}/reports/
@@ -195,6 +279,169 @@ class UploadPatientReportView(generics.CreateAPIView):
         )
 
 
+class CreateUploadSessionView(generics.CreateAPIView):
+    """
+    Start a resumable upload of a patient report (for large files such as MRI/CT).
+    POST /api/records/patients/{patient_id}/reports/uploads/
+    """
+    serializer_class = CreateUploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def create(self, request, *args, **kwargs):
+        patient_id = self.kwargs.get('patient_id')
+        
+        # Get patient
+        try:
+            patient = User.objects.get(id=patient_id, user_type='PATIENT')
+        except User.DoesNotExist:
+            return Response(
+                {'error': 'Patient not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        # Check permissions
+        user = request.user
+        if user.user_type == 'PATIENT' and user.id != patient_id:
+            return Response(
+                {'error': 'You can only upload reports for yourself'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = self.get_serializer(
+            data=request.data,
+            context={'patient': patient, 'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        session = serializer.save()
+        
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionDetailView(generics.RetrieveDestroyAPIView):
+    """
+    Get upload progress (to resume after a dropped connection) or cancel an upload.
+    GET/DELETE /api/records/uploads/{id}/
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return UploadSession.objects.filter(uploaded_by=self.request.user)
+    
+    def perform_destroy(self, instance):
+        discard_chunks(instance)
+        instance.delete()
+
+
+def _upload_session_error(session):
+    """Error response if a session no longer accepts chunks, else None."""
+    if session.status != 'ACTIVE':
+        return Response(
+            {'error': 'Upload is already complete'},
+            status=status.HTTP_409_CONFLICT
+        )
+    if session.is_expired():
+        return Response(
+            {'error': 'Upload session has expired, please start a new upload'},
+            status=status.HTTP_410_GONE
+        )
+    return None
+
+
+class UploadChunkView(APIView):
+    """
+    Upload one chunk of a resumable upload. Re-sending a chunk replaces it.
+    PUT /api/records/uploads/{id}/chunks/{offset}/
+    Body: the chunk's bytes (application/octet-stream)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @extend_schema(
+        request={'application/octet-stream': OpenApiTypes.BINARY},
+        responses={200: UploadSessionSerializer}
+    )
+    def put(self, request, pk, offset):
+        session = get_object_or_404(UploadSession, pk=pk, uploaded_by=request.user)
+        error = _upload_session_error(session)
+        if error:
+            return error
+        
+        try:
+            write_chunk(session, offset, request.stream or io.BytesIO())
+        except ChunkError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Record the chunk; concurrent chunk uploads update the same row
+        with transaction.atomic():
+            current = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+            if current is None or current.status != 'ACTIVE':
+                # Completed or cancelled while the chunk was being received
+                transaction.on_commit(lambda: discard_chunks(session))
+                if current is None:
+                    raise Http404
+                return _upload_session_error(current)
+            session = current
+            if offset not in session.received_offsets:
+                session.received_offsets = sorted(session.received_offsets + [offset])
+                session.save(update_fields=['received_offsets', 'updated_at'])
+        
+        return Response(UploadSessionSerializer(session).data)
+
+
+@extend_schema(
+    request=None,
+    responses={201: PatientReportSerializer}
+)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def complete_upload_session(request, pk):
+    """
+    Assemble a resumable upload, verify its checksum and create the report.
+    POST /api/records/uploads/{id}/complete/
+    """
+    with transaction.atomic():
+        session = get_object_or_404(UploadSession.objects.select_for_update(), pk=pk, uploaded_by=request.user)
+        error = _upload_session_error(session)
+        if error:
+            return error
+        
+        try:
+            report = complete_upload(session)
+        except CorruptUploadError as e:
+            # The chunks cannot be trusted; the file has to be sent again
+            session.received_offsets = []
+            session.save(update_fields=['received_offsets', 'updated_at'])
+            transaction.on_commit(lambda: discard_chunks(session))
+            return Response(
+                {'error': f'{e} Please upload the file again.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ChunkError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        session.status = 'COMPLETE'
+        session.report = report
+        session.save(update_fields=['status', 'report', 'updated_at'])
+    
+    return Response(
+        {
+            'message': 'Report uploaded successfully',
+            'report': PatientReportSerializer(report, context={'request': request}).data
+        },
+        status=status.HTTP_201_CREATED
+    )
+
+
+def _has_recent_verified_otp(doctor, patient):
+    """Check whether the doctor verified an OTP from the patient in the last 30 minutes."""
+    return OTP.objects.filter(
+        user=patient,
+        is_used=True,
+        requested_by=doctor,
+        used_at__gte=timezone.now() - timezone.timedelta(minutes=30)
+    ).exists()
+
+
 class PatientReportListView(generics.ListAPIView):
     """
     List patient reports (with OTP verification for doctors).
@@ -226,19 +473,62 @@ class PatientReportListView(generics.ListAPIView):
             if otp_token == 'true':
                 # In production, verify a signed token here
                 # For now, we'll check if there's a recent verified OTP
-                recent_otp = OTP.objects.filter(
-                    user=patient,
-                    is_used=True,
-                    requested_by=user,
-                    used_at__gte=timezone.now() - timezone.timedelta(minutes=30)
-                ).exists()
-                
-                if recent_otp:
+                if _has_recent_verified_otp(user, patient):
                     return PatientReport.objects.filter(patient=patient).order_by('-uploaded_at')
         
         return PatientReport.objects.none()
 
 
+@extend_schema(
+    parameters=[
+        OpenApiParameter(name='q', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, required=True),
+    ]
+)
+class PatientReportSearchView(PatientReportListView):
+    """
+    Search a patient's reports, best matches first (same access as the list).
+    GET /api/records/patients/{patient_id}/reports/search/?q=
+    
+    ``q`` is matched (web search syntax: "quoted phrase", or, -word) against
+    the indexed search_vector of titles, descriptions and text extracted from
+    PDF and DOCX reports; no files are read at query time.
+    """
+    serializer_class = PatientReportSearchResultSerializer
+    
+    SEARCH_CONFIG = 'english'
+    
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('q', '').strip():
+            return Response(
+                {'error': 'Query parameter q is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return super().list(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        query = SearchQuery(
+            self.request.query_params.get('q', '').strip(),
+            search_type='websearch',
+            config=self.SEARCH_CONFIG
+        )
+        return (
+            super().get_queryset()
+            .filter(search_vector=query)
+            .defer('extracted_text')
+            .annotate(
+                rank=SearchRank('search_vector', query),
+                headline=SearchHeadline(
+                    'extracted_text', query,
+                    config=self.SEARCH_CONFIG,
+                    start_sel='<mark>',
+                    stop_sel='</mark>',
+                    max_fragments=3
+                )
+            )
+            .order_by('-rank', '-uploaded_at')
+        )
+
+
 class PatientReportDetailView(generics.RetrieveDestroyAPIView):
     """
     Get or delete patient report.
@@ -270,7 +560,7 @@ class MyReportsView(generics.ListAPIView):
         return PatientReport.objects.filter(patient=self.request.user).order_by('-uploaded_at')
 
 
-class AddPrescriptionAttachmentView(generics.CreateAPIView):
+class AddPrescriptionAttachmentView(ValidatedUploadMixin, generics.CreateAPIView):
     """
     Add attachment to prescription (Doctor only).
     POST /api/records/prescriptions/{prescription_id}/attachments/
@@ -309,6 +599,200 @@ class AddPrescriptionAttachmentView(generics.CreateAPIView):
         )
 
 
+def _can_access_report(user, report):
+    """
+    Whether a user may read a report's files.
+    
+    Patients can read their own reports, uploaders what they uploaded,
+    admins everything and doctors after the patient verified an OTP.
+    """
+    return (
+        user.user_type == 'ADMIN'
+        or user.id in (report.patient_id, report.uploaded_by_id)
+        or (user.user_type == 'DOCTOR' and _has_recent_verified_otp(user, report.patient))
+    )
+
+
+@extend_schema(
+    responses={(200, '*/*'): OpenApiTypes.BINARY, (206, '*/*'): OpenApiTypes.BINARY}
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def download_report(request, pk):
+    """
+    Download a patient report file.
+    GET /api/records/reports/{id}/download/
+    
+    See _can_access_report for who may download it.
+    """
+    report = get_object_or_404(PatientReport, pk=pk)
+    if not _can_access_report(request.user, report):
+        return Response(
+            {'error': 'You do not have permission to download this report'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    return serve_file(request, report.file, f"{report.title}{report.get_file_extension()}")
+
+
+@extend_schema(
+    responses={(200, 'image/jpeg'): OpenApiTypes.BINARY}
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def report_thumbnail(request, pk):
+    """
+    Get the preview image of a patient report.
+    GET /api/records/reports/{id}/thumbnail/
+    
+    Same access rules as the download. 404 until the background task has
+    generated it, and for file types without previews.
+    """
+    report = get_object_or_404(PatientReport, pk=pk)
+    if not _can_access_report(request.user, report):
+        return Response(
+            {'error': 'You do not have permission to view this report'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if not report.thumbnail:
+        return Response(
+            {'error': 'No thumbnail available for this report'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    return serve_file(request, report.thumbnail, f"{report.title}.jpg")
+
+
+@extend_schema(
+    responses={(200, '*/*'): OpenApiTypes.BINARY, (206, '*/*'): OpenApiTypes.BINARY}
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def download_attachment(request, pk):
+    """
+    Download a prescription attachment file.
+    GET /api/records/attachments/{id}/download/
+    
+    The prescription's patient and doctor and admins can download it.
+    """
+    attachment = get_object_or_404(
+        PrescriptionAttachment.objects.select_related('prescription__doctor'), pk=pk
+    )
+    user = request.user
+    prescription = attachment.prescription
+    
+    allowed = (
+        user.user_type == 'ADMIN'
+        or user.id in (prescription.patient_id, prescription.doctor.user_id)
+    )
+    if not allowed:
+        return Response(
+            {'error': 'You do not have permission to download this attachment'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    return serve_file(request, attachment.file, attachment.file_name)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter('async', OpenApiTypes.BOOL, description='Build the archive in the background even if it is small')
+    ],
+    request=None,
+    responses={(200, 'application/zip'): OpenApiTypes.BINARY, 202: RecordExportSerializer}
+)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def export_patient_record(request, patient_id):
+    """
+    Export a patient's prescriptions, attachments and reports as one ZIP.
+    POST /api/records/patients/{patient_id}/export/
+    
+    Available to the patient and admins. Records whose files total up to
+    RECORD_EXPORT_STREAM_MAX_SIZE are streamed in the response; larger ones
+    (or with async=true) are built by a Celery worker and the response is
+    202 with the export, whose download_url is set once the archive is ready.
+    """
+    patient = get_object_or_404(User, id=patient_id, user_type='PATIENT')
+    user = request.user
+    
+    if not (user.user_type == 'ADMIN' or user.id == patient.id):
+        return Response(
+            {'error': 'You do not have permission to export this record'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    if request.query_params.get('async') != 'true' and export_size(patient) <= settings.RECORD_EXPORT_STREAM_MAX_SIZE:
+        response = StreamingHttpResponse(stream_export(*collect_export(patient)), content_type='application/zip')
+        response['Content-Disposition'] = content_disposition_header(
+            True, f"carehub-record-{patient.id}-{timezone.localdate().isoformat()}.zip"
+        )
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    export = RecordExport.objects.create(patient=patient, requested_by=user)
+    
+    def enqueue():
+        try:
+            build_record_export.delay(export.id)
+        except Exception as e:
+            logger.error(f"Failed to queue record export {export.id}: {str(e)}")
+            RecordExport.objects.filter(id=export.id).update(
+                status='FAILED',
+                error_message='Could not queue record export',
+                completed_at=timezone.now()
+            )
+    
+    transaction.on_commit(enqueue)
+    
+    return Response(
+        RecordExportSerializer(export, context={'request': request}).data,
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+class RecordExportView(generics.RetrieveAPIView):
+    """
+    Get status of a background record export.
+    GET /api/records/exports/{id}/
+    """
+    serializer_class = RecordExportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        user = self.request.user
+        
+        if user.user_type == 'ADMIN':
+            return RecordExport.objects.all()
+        
+        return RecordExport.objects.filter(requested_by=user)
+
+
+@extend_schema(
+    responses={(200, 'application/zip'): OpenApiTypes.BINARY}
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def download_record_export(request, pk):
+    """
+    Download the archive of a completed record export.
+    GET /api/records/exports/{id}/download/
+    """
+    user = request.user
+    queryset = RecordExport.objects.all() if user.user_type == 'ADMIN' else RecordExport.objects.filter(requested_by=user)
+    export = get_object_or_404(queryset, pk=pk)
+    
+    if export.status != 'COMPLETED' or export.is_expired():
+        return Response(
+            {'error': 'Export is not available for download'},
+            status=status.HTTP_409_CONFLICT if export.status != 'COMPLETED' else status.HTTP_410_GONE
+        )
+    
+    return serve_file(
+        request, export.file, f"carehub-record-{export.patient_id}-{export.created_at.date().isoformat()}.zip"
+    )
+
+
 @extend_schema(
     responses={200: PatientMedicalSummarySerializer}
 )
@@ -342,13 +826,15 @@ def patient_medical_summary(request, patient_id):
             status=status.HTTP_403_FORBIDDEN
         )
     
+    # Revised prescriptions count once, as their latest version
+    prescriptions = Prescription.objects.filter(patient=patient).latest_versions()
     summary = {
         'patient_id': patient.id,
         'patient_name': patient.get_full_name(),
-        'total_prescriptions': Prescription.objects.filter(patient=patient).count(),
+        'total_prescriptions': prescriptions.count(),
         'total_reports': PatientReport.objects.filter(patient=patient).count(),
         'recent_prescriptions': PrescriptionSerializer(
-            Prescription.objects.filter(patient=patient).order_by('-created_at')[:5],
+            prescriptions.order_by('-created_at')[:5],
             many=True
         ).data,
         'recent_reports': PatientReportSerializer(
@@ -249,7 +249,7 @@ class TestPatientReportUpload:
         api_client.force_authenticate(user=patient_user)
         
         # Create a dummy file
-        file_content = b'PDF content here'
+        file_content = b'%PDF-1.4 content here'
         uploaded_file = SimpleUploadedFile("test_report.pdf", file_content, content_type="application/pdf")
         
         url = reverse('records:upload-report', kwargs={'patient_id': patient_user.id})
@@ -0,0 +1,870 @@
+"""
+Tests for the medicine recommendation pipeline.
+"""
+import threading
+import time
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from recommendations.models import MedicineRecommendation
+from recommendations.coalescing import single_flight
+from recommendations.service import build_cache_key
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Isolate tests from each other's cached recommendations."""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestCacheKey:
+    """Test canonical recommendation cache keys."""
+    
+    def test_equivalent_requests_share_key(self):
+        """Test name case/whitespace and list order do not change the key."""
+        key_a = build_cache_key('Paracetamol', {'age': 40, 'allergies': ['sulfa', 'penicillin']})
+        key_b = build_cache_key('  paracetamol ', {'allergies': ['penicillin', 'sulfa'], 'age': 40})
+        assert key_a == key_b
+    
+    def test_different_patients_get_different_keys(self):
+        """Test patient info is part of the key."""
+        assert build_cache_key('Paracetamol', {'age': 40}) != build_cache_key('Paracetamol', {'age': 70})
+
+
+@pytest.mark.django_db
+class TestCacheInvalidation:
+    """Test versioned recommendation cache invalidation."""
+    
+    def test_clear_one_medicine(self):
+        """Test clearing a medicine only changes that medicine's keys."""
+        from recommendations.service import clear_recommendation_cache
+        paracetamol = build_cache_key('Paracetamol', {})
+        ibuprofen = build_cache_key('Ibuprofen', {})
+        
+        clear_recommendation_cache(' PARACETAMOL')
+        
+        assert build_cache_key('Paracetamol', {}) != paracetamol
+        assert build_cache_key('Ibuprofen', {}) == ibuprofen
+    
+    def test_clear_all_keeps_unrelated_cache_entries(self, api_client, admin_user):
+        """Test the clear_cache view invalidates recommendations without cache.clear()."""
+        cache.set('unrelated', 'kept')
+        key = build_cache_key('Paracetamol', {})
+        api_client.force_authenticate(user=admin_user)
+        
+        response = api_client.post(reverse('recommendations:clear-cache'), {}, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert build_cache_key('Paracetamol', {}) != key
+        assert cache.get('unrelated') == 'kept'
+    
+    def test_clear_cache_view_by_medicine(self, api_client, admin_user):
+        """Test the clear_cache view accepts a medicine name."""
+        api_client.force_authenticate(user=admin_user)
+        
+        response = api_client.post(
+            reverse('recommendations:clear-cache'), {'medicine_name': 'Ibuprofen'}, format='json'
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['message'] == 'Cache cleared for Ibuprofen'
+
+
+@pytest.mark.django_db
+class TestCacheWarmup:
+    """Test the scheduled recommendation cache warm-up."""
+    
+    def _history(self, user, medicine_name, patient_info, count):
+        for _ in range(count):
+            MedicineRecommendation.objects.create(
+                requested_by=user, medicine_name=medicine_name, patient_info=patient_info
+            )
+    
+    def test_warm_targets_cover_top_medicines_and_profiles(self, doctor_user, settings):
+        """Test top medicines are warmed with their common profiles, once per cache key."""
+        from recommendations.tasks import get_warm_targets
+        settings.RECOMMENDATION_WARM_TOP_MEDICINES = 1
+        self._history(doctor_user, 'Paracetamol', {'age': 70, 'allergies': ['a', 'b']}, 3)
+        self._history(doctor_user, 'Paracetamol', {'allergies': ['b', 'a'], 'age': 70}, 1)
+        self._history(doctor_user, 'Ibuprofen', {}, 2)
+        
+        targets = get_warm_targets()
+        
+        assert [name for name, _ in targets] == ['Paracetamol', 'Paracetamol']
+        assert targets[0][1] == {}
+        assert targets[1][1]['age'] == 70
+    
+    def test_warm_task_refreshes_targets(self, doctor_user, settings, monkeypatch):
+        """Test the task regenerates each target, bypassing the cache."""
+        from recommendations import tasks
+        settings.GROQ_API_KEY = 'test-key'
+        settings.RECOMMENDATION_WARM_CONCURRENCY = 2
+        self._history(doctor_user, 'Paracetamol', {'age': 40}, 2)
+        calls = []
+        monkeypatch.setattr(
+            tasks, 'get_medicine_recommendations',
+            lambda name, info, refresh=False: calls.append((name, info, refresh))
+        )
+        
+        tasks.warm_recommendation_cache()
+        
+        assert sorted(calls, key=str) == [('Paracetamol', {'age': 40}, True), ('Paracetamol', {}, True)]
+        assert cache.get(tasks.WARM_LOCK_KEY) is None
+    
+    def test_warm_task_concurrency_is_capped(self, settings, monkeypatch):
+        """Test no more than RECOMMENDATION_WARM_CONCURRENCY generations run at once."""
+        import threading
+        from recommendations import tasks
+        settings.GROQ_API_KEY = 'test-key'
+        settings.RECOMMENDATION_WARM_CONCURRENCY = 2
+        monkeypatch.setattr(tasks, 'get_warm_targets', lambda: [('Paracetamol', {'age': age}) for age in range(6)])
+        lock = threading.Lock()
+        cap_exceeded = threading.Event()
+        in_flight = peak = 0
+        
+        def generate(name, info, refresh=False):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                if in_flight > 2:
+                    cap_exceeded.set()
+            # Hold each call so that every caller the pool allows is in flight together
+            cap_exceeded.wait(timeout=0.5)
+            with lock:
+                in_flight -= 1
+        
+        monkeypatch.setattr(tasks, 'get_medicine_recommendations', generate)
+        
+        tasks.warm_recommendation_cache()
+        
+        assert peak == 2
+    
+    def test_refresh_bypasses_cache(self, settings):
+        """Test refresh=True regenerates instead of returning the cached response."""
+        from recommendations.service import get_medicine_recommendations
+        settings.GROQ_API_KEY = ''
+        cache.set(build_cache_key('Paracetamol', {}), {'suggestion': 'stale'})
+        
+        assert get_medicine_recommendations('Paracetamol').data['suggestion'] == 'stale'
+        assert get_medicine_recommendations('Paracetamol', refresh=True).data['suggestion'] != 'stale'
+
+
+@pytest.mark.django_db
+class TestRecommendationProvenance:
+    """Test the service reports where each recommendation came from."""
+    
+    def test_miss_then_hit_through_view(self, api_client, doctor_user, settings):
+        """Test a fresh response is not reported as cached, and a cached one is."""
+        settings.GROQ_API_KEY = ''
+        api_client.force_authenticate(user=doctor_user)
+        url = reverse('recommendations:get-recommendation')
+        
+        response = api_client.post(url, {'medicine_name': 'Paracetamol'}, format='json')
+        assert response.data['cached'] is False
+        assert response.data['source'] == 'mock'
+        
+        cache.set(
+            build_cache_key('Paracetamol', {}),
+            {'alternatives': [], 'warnings': [], 'suggestion': 'cached', 'response_time_ms': 900, 'model': 'm1'}
+        )
+        response = api_client.post(url, {'medicine_name': 'Paracetamol'}, format='json')
+        assert response.data['cached'] is True
+        assert response.data['source'] == 'cache'
+        assert response.data['model'] == 'm1'
+        assert response.data['response_time_ms'] < 900
+        
+        sources = list(MedicineRecommendation.objects.order_by('id').values_list('source', 'model_name'))
+        assert sources == [('mock', ''), ('cache', 'm1')]
+        
+        from recommendations.stats import get_recommendation_stats
+        assert get_recommendation_stats()['cache_hit_rate'] == 0.5
+    
+    def test_llm_result_uses_configured_model(self, settings, monkeypatch):
+        """Test generated recommendations record the GROQ_MODEL they were made with."""
+        import json
+        from types import SimpleNamespace
+        from recommendations import service
+        settings.GROQ_API_KEY = 'test-key'
+        settings.GROQ_MODEL = 'test-model'
+        requests = []
+        
+        def create(**kwargs):
+            requests.append(kwargs)
+            message = SimpleNamespace(content=json.dumps({'alternatives': [], 'warnings': [], 'suggestion': 'ok'}))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(service, 'get_groq_client', lambda: client)
+        
+        result = service.get_medicine_recommendations('Paracetamol')
+        
+        assert requests[0]['model'] == 'test-model'
+        assert (result.source, result.model, result.cached) == ('llm', 'test-model', False)
+        assert service.get_medicine_recommendations('Paracetamol').source == 'cache'
+    
+    def test_waiting_on_concurrent_request_is_coalesced(self, monkeypatch):
+        """Test a caller handed another request's result reports it as coalesced."""
+        from recommendations import service
+        leader = service.RecommendationResult({'suggestion': 'shared'}, service.SOURCE_LLM, 900, 'm1')
+        monkeypatch.setattr(service, 'single_flight', lambda key, compute: leader)
+        
+        result = service.get_medicine_recommendations('Paracetamol')
+        
+        assert result.source == 'coalesced'
+        assert result.cached is True
+        assert result.data == leader.data
+        assert result.latency_ms < 900
+
+
+class TestCircuitBreaker:
+    """Test the breaker and retry policy guarding GROQ calls."""
+    
+    def test_opens_half_opens_and_closes(self):
+        """Test the breaker fails fast when open and lets one trial call through after the reset timeout."""
+        from recommendations.resilience import CircuitBreaker
+        now = [0.0]
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30, clock=lambda: now[0])
+        
+        for _ in range(2):
+            assert breaker.allow_request()
+            breaker.record_failure()
+        assert breaker.state == 'OPEN'
+        assert not breaker.allow_request()
+        
+        now[0] = 30
+        assert breaker.allow_request()
+        assert not breaker.allow_request()  # Only one trial call at a time
+        breaker.record_failure()
+        assert breaker.state == 'OPEN'
+        
+        now[0] = 60
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == 'CLOSED'
+        
+        snapshot = breaker.snapshot()
+        assert (snapshot['failures'], snapshot['successes'], snapshot['rejected'], snapshot['opened']) == (3, 1, 2, 2)
+    
+    def test_retries_transient_errors_only(self):
+        """Test transient errors are retried with backoff and others raise at once."""
+        from recommendations.resilience import call_with_retries
+        calls, sleeps = [], []
+        
+        def flaky(timeout):
+            calls.append(timeout)
+            if len(calls) < 3:
+                raise ConnectionError('reset')
+            return 'ok'
+        
+        options = dict(
+            max_retries=2, base_delay=0.5, max_delay=4,
+            is_retryable=lambda e: isinstance(e, ConnectionError), sleep=sleeps.append
+        )
+        assert call_with_retries(flaky, time.monotonic() + 10, **options) == 'ok'
+        assert len(sleeps) == 2 and 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1
+        assert all(0 < timeout <= 10 for timeout in calls)
+        
+        def broken(timeout):
+            raise ValueError('bad request')
+        
+        with pytest.raises(ValueError):
+            call_with_retries(broken, time.monotonic() + 10, **options)
+        with pytest.raises(TimeoutError):
+            call_with_retries(flaky, time.monotonic() - 1, **options)
+
+
+@pytest.mark.django_db
+class TestLLMFallback:
+    """Test recommendations degrade to stale or mock answers when GROQ fails."""
+    
+    @pytest.fixture(autouse=True)
+    def failing_llm(self, settings, monkeypatch):
+        """A GROQ client whose calls always fail, behind a one-failure breaker."""
+        from types import SimpleNamespace
+        from recommendations import llm, service, tasks
+        settings.GROQ_API_KEY = 'test-key'
+        settings.GROQ_MAX_RETRIES = 0
+        settings.GROQ_BREAKER_FAILURE_THRESHOLD = 1
+        llm.reset_llm_circuit_breaker()
+        self.calls = []
+        self.revalidations = []
+        
+        def create(**kwargs):
+            self.calls.append(kwargs)
+            raise RuntimeError('upstream unavailable')
+        
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(service, 'get_groq_client', lambda: client)
+        monkeypatch.setattr(
+            tasks.revalidate_recommendation, 'apply_async',
+            lambda args, countdown: self.revalidations.append(args)
+        )
+        yield
+        llm.reset_llm_circuit_breaker()
+    
+    def test_open_breaker_skips_the_llm(self):
+        """Test a failure opens the breaker and later requests do not call GROQ."""
+        from recommendations.service import get_medicine_recommendations
+        
+        assert get_medicine_recommendations('Paracetamol').source == 'mock'
+        assert get_medicine_recommendations('Ibuprofen').source == 'mock'
+        
+        assert len(self.calls) == 1
+        assert self.calls[0]['timeout'] > 0
+    
+    def test_serves_stale_answer_and_revalidates_once(self):
+        """Test an expired recommendation is served while GROQ is down and refreshed later."""
+        from recommendations.service import _stale_key, get_medicine_recommendations
+        stale = {'alternatives': [], 'warnings': [], 'suggestion': 'stale', 'model': 'm1'}
+        cache.set(_stale_key(build_cache_key('Paracetamol', {'age': 40})), stale)
+        
+        first = get_medicine_recommendations('Paracetamol', {'age': 40})
+        second = get_medicine_recommendations('Paracetamol', {'age': 40})
+        
+        assert (first.source, first.data['suggestion'], first.model, first.cached) == ('stale', 'stale', 'm1', True)
+        assert second.source == 'stale'
+        assert self.revalidations == [('Paracetamol', {'age': 40})]
+    
+    def test_failed_revalidation_does_not_requeue_itself(self):
+        """Test a revalidation that still fails leaves the next attempt to a later request."""
+        from recommendations.service import _revalidation_key, _stale_key, get_medicine_recommendations
+        from recommendations.tasks import revalidate_recommendation
+        cache_key = build_cache_key('Paracetamol', {'age': 40})
+        cache.set(_stale_key(cache_key), {'alternatives': [], 'warnings': [], 'suggestion': 'stale'})
+        
+        revalidate_recommendation('Paracetamol', {'age': 40})
+        assert self.revalidations == []
+        
+        # After the breaker reset period a request queues one attempt again
+        cache.delete(_revalidation_key(cache_key))
+        assert get_medicine_recommendations('Paracetamol', {'age': 40}).source == 'stale'
+        assert self.revalidations == [('Paracetamol', {'age': 40})]
+    
+    def test_health_reports_breaker_state(self, api_client, admin_user, patient_user):
+        """Test admins see the open breaker; other users are refused."""
+        from recommendations.service import get_medicine_recommendations
+        get_medicine_recommendations('Paracetamol')
+        url = reverse('recommendations:recommendation-health')
+        
+        api_client.force_authenticate(user=patient_user)
+        assert api_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+        
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['llm_configured'] is True
+        assert response.data['circuit_breaker']['state'] == 'OPEN'
+        assert response.data['circuit_breaker']['failures'] == 1
+
+
+@pytest.mark.django_db
+class TestRecommendationStats:
+    """Test statistics served from the incremental rollups."""
+    
+    def _completed(self, user, medicine_name, created_at, response_time_ms):
+        """Complete a job requested at created_at, the way the Celery task does."""
+        from datetime import datetime, timezone
+        recommendation = MedicineRecommendation.objects.create(
+            requested_by=user, medicine_name=medicine_name, status='PENDING'
+        )
+        MedicineRecommendation.objects.filter(id=recommendation.id).update(
+            created_at=datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc)
+        )
+        recommendation.refresh_from_db()
+        recommendation.status = 'COMPLETED'
+        recommendation.response_time_ms = response_time_ms
+        recommendation.save(update_fields=['status', 'response_time_ms'])
+        # Saves that do not complete the job are not counted again
+        recommendation.save(update_fields=['response_time_ms'])
+    
+    def test_stats_with_date_ranges(self, api_client, admin_user, doctor_user, patient_user):
+        """Test totals, averages and top medicines over whole and partial days."""
+        self._completed(doctor_user, 'Paracetamol', '2025-01-01T10:30:00', 100)
+        self._completed(patient_user, 'Paracetamol', '2025-01-02T23:10:00', 300)
+        self._completed(doctor_user, 'Ibuprofen', '2025-01-03T05:00:00', None)
+        api_client.force_authenticate(user=admin_user)
+        url = reverse('recommendations:recommendation-stats')
+        
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['total_recommendations'] == 3
+        assert response.data['unique_medicines'] == 2
+        assert response.data['unique_users'] == 2
+        assert response.data['avg_response_time_ms'] == 200
+        assert response.data['top_medicines'] == [
+            {'medicine_name': 'Paracetamol', 'count': 2},
+            {'medicine_name': 'Ibuprofen', 'count': 1},
+        ]
+        
+        response = api_client.get(url, {'start': '2025-01-01T11:00:00', 'end': '2025-01-03'})
+        assert response.data['total_recommendations'] == 1
+        assert response.data['unique_users'] == 1
+        
+        response = api_client.get(url, {'start': '2025-01-01', 'end': '2025-01-03T06:00:00'})
+        assert response.data['total_recommendations'] == 3
+    
+    def test_invalid_range(self, api_client, admin_user):
+        """Test end must be after start."""
+        api_client.force_authenticate(user=admin_user)
+        
+        response = api_client.get(
+            reverse('recommendations:recommendation-stats'), {'start': '2025-02-01', 'end': '2025-01-01'}
+        )
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestSingleFlight:
+    """Test coalescing of concurrent identical requests."""
+    
+    def test_concurrent_callers_compute_once(self):
+        """Test only one of many concurrent callers runs the computation."""
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'alternatives': [], 'warnings': [], 'suggestion': 'ok'}
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight('med_rec:test', compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(calls) == 1
+        assert len(results) == 8
+        assert all(result['suggestion'] == 'ok' for result in results)
+    
+    def test_follower_takes_over_when_leader_fails(self):
+        """Test a failed computation does not poison later callers."""
+        def failing():
+            raise RuntimeError('LLM down')
+        
+        with pytest.raises(RuntimeError):
+            single_flight('med_rec:failing', failing)
+        
+        assert single_flight('med_rec:failing', lambda: {'suggestion': 'recovered'}) == {'suggestion': 'recovered'}
+    
+    def test_finished_leader_result_is_not_reused(self, settings, monkeypatch):
+        """Test a published result expires quickly and is cleared by the next leader."""
+        from recommendations import coalescing
+        settings.RECOMMENDATION_COALESCE_POLL_SECONDS = 0.01
+        monkeypatch.setattr(coalescing, 'RESULT_TTL_SECONDS', 0.2)
+        result_key = coalescing._result_key('med_rec:refreshed')
+        
+        single_flight('med_rec:refreshed', lambda: {'suggestion': 'old'})
+        assert cache.get(result_key) == {'suggestion': 'old'}
+        
+        seen = []
+        single_flight('med_rec:refreshed', lambda: seen.append(cache.get(result_key)) or {'suggestion': 'new'})
+        assert seen == [None]
+        
+        time.sleep(0.3)
+        assert cache.get(result_key) is None
+
+
+class TestPromptTemplate:
+    """Test the preloaded system prompt template."""
+    
+    def test_renders_placeholders_and_keeps_literal_braces(self):
+        """Test JSON examples in the prompt survive rendering."""
+        from recommendations.llm import SYSTEM_PROMPT
+        
+        prompt = SYSTEM_PROMPT.render(medical_data='{"x": 1}', patient_info='{}', medicine_name='Paracetamol')
+        
+        assert '"alternatives": [' in prompt
+        assert 'REQUESTED MEDICINE:\nParacetamol' in prompt
+        assert '{medicine_name}' not in prompt
+
+
+class TestMedicineKnowledgeBase:
+    """Test the local medicine catalog index."""
+    
+    def test_lookup_by_name_brand_and_generic(self):
+        """Test names, brand names and generics resolve to catalog records."""
+        from recommendations.knowledge_base import get_medicine_index
+        index = get_medicine_index()
+        
+        assert index.get('Panadol')['name'] == 'Paracetamol'
+        assert index.get('acetaminophen')['name'] == 'Paracetamol'
+        assert index.get('AUGMENTIN')['name'] == 'Co-Amoxiclav'
+        assert index.get('co amoxiclav')['name'] == 'Co-Amoxiclav'
+        assert index.get('amoxicillin')['name'] == 'Amoxicillin'
+        assert index.get('Unknownomab') is None
+    
+    def test_prefix_search(self):
+        """Test prefix matches come back alphabetically, once per medicine."""
+        from recommendations.knowledge_base import get_medicine_index
+        
+        matches = get_medicine_index().search_prefix('amo', limit=5)
+        
+        assert [key for key, _ in matches] == ['amoxicillin', 'amoxicillin clavulanate']
+        assert [record['name'] for _, record in matches] == ['Amoxicillin', 'Co-Amoxiclav']
+    
+    def test_autocomplete_tolerates_typos(self):
+        """Test misspelled and partial queries still suggest the medicine."""
+        from recommendations.knowledge_base import get_medicine_index
+        index = get_medicine_index()
+        
+        assert index.autocomplete('paracetmol')[0][1]['name'] == 'Paracetamol'
+        assert index.autocomplete('lisinoprill')[0][1]['name'] == 'Lisinopril'
+        assert [record['name'] for _, record, _ in index.autocomplete('amoxi')] == ['Amoxicillin', 'Co-Amoxiclav']
+        assert index.autocomplete('xq') == []
+    
+    def test_memory_mapped_index_round_trip(self, tmp_path):
+        """Test the on-disk index returns the same records as the catalog."""
+        from recommendations.knowledge_base import MedicineIndex, load_catalog, write_index
+        medicines = load_catalog()
+        path = tmp_path / 'medicines.idx'
+        write_index(medicines, path)
+        
+        index = MedicineIndex.load(path)
+        try:
+            assert len(index) == len(medicines)
+            for medicine in medicines:
+                assert index.get(medicine['name']) == medicine
+            assert index.search_prefix('ibu') == MedicineIndex.from_catalog(medicines).search_prefix('ibu')
+        finally:
+            index.close()
+    
+    def test_query_medical_data(self):
+        """Test catalog facts are shaped for the LLM prompt."""
+        from recommendations.service import query_medical_data
+        
+        data = query_medical_data('Brufen')
+        
+        assert data['medicine_info']['name'] == 'Ibuprofen'
+        assert data['medicine_info']['found'] is True
+        assert {'name': 'Paracetamol', 'active_ingredient': 'paracetamol',
+                'drug_class': 'Analgesic and antipyretic'} in data['alternatives']
+        assert 'Severe renal impairment' in data['contraindications']
+        
+        unknown = query_medical_data('Unknownomab')
+        assert unknown['medicine_info'] == {'name': 'Unknownomab', 'found': False}
+        assert unknown['alternatives'] == []
+
+
+class TestDrugInteractions:
+    """Test the interaction matrix checks."""
+    
+    def test_checks_against_current_medications(self):
+        """Test brand names resolve to generics and results are most severe first."""
+        from recommendations.interactions import check_interactions
+        
+        results = check_interactions(['Brufen'], ['Lisinopril', 'Warfarin', 'Panadol'])
+        
+        assert [(r['interacts_with'], r['severity']) for r in results] == [
+            ('Warfarin', 'HIGH'),
+            ('Lisinopril', 'MODERATE'),
+        ]
+    
+    def test_duplicate_ingredients_and_unknown_medicines(self):
+        """Test duplicate therapy is flagged and unknown medicines are ignored."""
+        from recommendations.interactions import check_interactions
+        
+        results = check_interactions(['Augmentin', 'Amoxil', 'Unknownomab'])
+        
+        assert results == [{
+            'medicine': 'Augmentin',
+            'interacts_with': 'Amoxil',
+            'severity': 'HIGH',
+            'effect': 'Duplicate therapy: both contain amoxicillin'
+        }]
+    
+    def test_current_medication_in_other_case_is_not_a_duplicate(self):
+        """Test a requested medicine already taken under another spelling is not flagged against itself."""
+        from recommendations.interactions import check_interactions
+        
+        assert check_interactions(['Paracetamol'], ['paracetamol ']) == []
+        assert check_interactions(['BRUFEN'], ['brufen', 'Warfarin'])[0]['interacts_with'] == 'Warfarin'
+        assert len(check_interactions(['BRUFEN'], ['brufen', 'Warfarin'])) == 1
+    
+    def test_mock_recommendation_includes_interactions(self, settings):
+        """Test current medications produce recommendation warnings."""
+        from recommendations.service import get_medicine_recommendations
+        settings.GROQ_API_KEY = ''
+        
+        result = get_medicine_recommendations('Clarithromycin', {'current_medications': ['Simvastatin']})
+        
+        assert {
+            'condition': 'Taking Simvastatin',
+            'message': 'Interaction with Simvastatin: Contraindicated: greatly raised simvastatin '
+                       'levels with risk of rhabdomyolysis',
+            'severity': 'CRITICAL'
+        } in result.data['warnings']
+
+
+class TestRiskMatchedCache:
+    """Test approximate cache matching by clinical risk signature."""
+    
+    def test_risk_signature(self):
+        """Test patients reduce to age band, flags and allergy classes."""
+        from recommendations.risk import risk_signature
+        
+        signature = risk_signature({
+            'age': 70,
+            'weight': 82,
+            'allergies': ['Augmentin', 'sulfa drugs'],
+            'comorbidities': ['CKD stage 3', 'Hypertension'],
+            'current_medications': ['Warfarin']
+        })
+        
+        assert signature == {
+            'risk_signature': 1,
+            'age_band': 'older_adult',
+            'pregnant': False,
+            'breastfeeding': False,
+            'renal_impairment': True,
+            'hepatic_impairment': False,
+            'allergy_classes': ['penicillins', 'sulfonamides']
+        }
+        assert risk_signature(signature) is signature
+        assert risk_signature({'age': 30, 'allergies': ['Amoxicillin']}) == risk_signature(
+            {'age': 45, 'weight': 60, 'allergies': ['penicillin']}
+        )
+    
+    def test_same_signature_shares_cache_with_own_warnings(self, settings, monkeypatch):
+        """Test a second patient with the same signature hits the cache and keeps their warnings."""
+        import json
+        from types import SimpleNamespace
+        from recommendations import llm, service
+        from recommendations.service import get_medicine_recommendations
+        settings.GROQ_API_KEY = 'test-key'
+        settings.RECOMMENDATION_CACHE_MATCHING = 'risk'
+        llm.reset_llm_circuit_breaker()
+        prompts = []
+        
+        def create(**kwargs):
+            prompts.append(' '.join(message['content'] for message in kwargs['messages']))
+            content = json.dumps({'alternatives': [], 'warnings': [], 'suggestion': 'shared'})
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(service, 'get_groq_client', lambda: client)
+        
+        first = get_medicine_recommendations(
+            'Clarithromycin', {'age': 30, 'allergies': ['Azithromycin'], 'current_medications': ['Warfarin']}
+        )
+        second = get_medicine_recommendations(
+            'Clarithromycin', {'age': 52, 'allergies': ['macrolides'], 'current_medications': ['Simvastatin']}
+        )
+        
+        assert (first.source, second.source) == ('llm', 'cache')
+        assert len(prompts) == 1 and 'Warfarin' not in prompts[0]
+        assert first.data['suggestion'] == second.data['suggestion'] == 'shared'
+        first_conditions = {warning['condition'] for warning in first.data['warnings']}
+        second_conditions = {warning['condition'] for warning in second.data['warnings']}
+        assert first_conditions == {'Allergy to Azithromycin', 'Taking Warfarin'}
+        assert second_conditions == {'Allergy to macrolides', 'Taking Simvastatin'}
+    
+    def test_different_signature_misses_cache(self, settings):
+        """Test patients with a different risk signature do not share answers."""
+        from recommendations.service import get_medicine_recommendations
+        settings.GROQ_API_KEY = ''
+        settings.RECOMMENDATION_CACHE_MATCHING = 'risk'
+        
+        get_medicine_recommendations('Ibuprofen', {'age': 30})
+        
+        assert get_medicine_recommendations('Ibuprofen', {'age': 30, 'comorbidities': ['Pregnancy']}).source == 'mock'
+        assert get_medicine_recommendations('Ibuprofen', {'age': 70}).source == 'mock'
+
+
+@pytest.mark.django_db
+class TestMedicineAutocomplete:
+    """Test the medicine name autocomplete endpoint."""
+    
+    def test_autocomplete_returns_canonical_names(self, api_client, doctor_user):
+        """Test brand names and typos resolve to catalog names."""
+        api_client.force_authenticate(user=doctor_user)
+        url = reverse('recommendations:medicine-autocomplete')
+        
+        response = api_client.get(url, {'q': 'augmentn'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        first = response.data['results'][0]
+        assert first['name'] == 'Co-Amoxiclav'
+        assert first['matched'] == 'Augmentin'
+        assert first['typos'] == 1
+    
+    def test_autocomplete_requires_query(self, api_client, patient_user):
+        """Test the q parameter is required."""
+        api_client.force_authenticate(user=patient_user)
+        
+        response = api_client.get(reverse('recommendations:medicine-autocomplete'))
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestAsyncRecommendationJobs:
+    """Test asynchronous recommendation jobs."""
+    
+    def test_async_request_returns_job_and_completes(
+        self, api_client, doctor_user, monkeypatch, django_capture_on_commit_callbacks
+    ):
+        """Test async POST queues a job whose result can be polled."""
+        from carehub.celery import app
+        monkeypatch.setattr(app.conf, 'task_always_eager', True)
+        api_client.force_authenticate(user=doctor_user)
+        
+        url = reverse('recommendations:get-recommendation') + '?async=true'
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(url, {'medicine_name': 'Paracetamol'}, format='json')
+        
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        job_id = response.data['id']
+        
+        job_url = reverse('recommendations:recommendation-job', kwargs={'pk': job_id})
+        response = api_client.get(job_url)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == 'COMPLETED'
+        assert 'alternatives' in response.data['result']
+    
+    def test_job_not_visible_to_other_users(self, api_client, doctor_user, patient_user):
+        """Test users cannot poll someone else's job."""
+        recommendation = MedicineRecommendation.objects.create(
+            requested_by=doctor_user,
+            medicine_name='Paracetamol',
+            status='PENDING'
+        )
+        api_client.force_authenticate(user=patient_user)
+        
+        url = reverse('recommendations:recommendation-job', kwargs={'pk': recommendation.id})
+        response = api_client.get(url)
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestStreamingRecommendationParser:
+    """Test incremental extraction of streamed recommendation items."""
+    
+    def test_items_emitted_as_they_complete(self):
+        """Test items arrive in order however the JSON is chunked."""
+        import json
+        from recommendations.streaming import StreamingRecommendationParser
+        
+        document = json.dumps({
+            'alternatives': [{'name': 'Ibuprofen', 'notes': 'brace } in "text"'}, {'name': 'Aspirin'}],
+            'warnings': [{'condition': 'Liver disease', 'severity': 'MODERATE'}],
+            'suggestion': 'Consult a doctor [soon]'
+        })
+        parser = StreamingRecommendationParser()
+        events = []
+        for start in range(0, len(document), 3):
+            events.extend(parser.feed(document[start:start + 3]))
+        
+        assert events == [
+            ('alternative', {'name': 'Ibuprofen', 'notes': 'brace } in "text"'}),
+            ('alternative', {'name': 'Aspirin'}),
+            ('warning', {'condition': 'Liver disease', 'severity': 'MODERATE'}),
+        ]
+        assert json.loads(parser.text)['suggestion'] == 'Consult a doctor [soon]'
+
+
+@pytest.mark.django_db
+class TestStreamingRecommendationView:
+    """Test the Server-Sent Events recommendation endpoint."""
+    
+    def test_stream_emits_items_and_saves_recommendation(self, client, doctor_user):
+        """Test the stream ends with a done event for the saved row."""
+        import json
+        from asgiref.sync import async_to_sync
+        from rest_framework_simplejwt.tokens import RefreshToken
+        
+        token = RefreshToken.for_user(doctor_user).access_token
+        response = client.post(
+            reverse('recommendations:recommendation-stream'),
+            data=json.dumps({'medicine_name': 'Paracetamol', 'patient_info': {'age': 70}}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'text/event-stream'
+        body = async_to_sync(self._read)(response).decode('utf-8')
+        events = [line.split(': ', 1)[1] for line in body.splitlines() if line.startswith('event: ')]
+        
+        assert events[-1] == 'done'
+        assert 'warning' in events
+        assert MedicineRecommendation.objects.filter(requested_by=doctor_user).count() == 1
+    
+    @staticmethod
+    async def _read(response):
+        return b''.join([chunk async for chunk in response.streaming_content])
+    
+    def test_stream_requires_authentication(self, client):
+        """Test anonymous requests are rejected."""
+        response = client.post(
+            reverse('recommendations:recommendation-stream'),
+            data='{"medicine_name": "Paracetamol"}',
+            content_type='application/json'
+        )
+        
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestBatchRecommendations:
+    """Test batch recommendations for prescriptions and medicine lists."""
+    
+    def test_batch_serves_cached_and_generates_misses(self, api_client, doctor_user):
+        """Test cached medicines are flagged and duplicates collapse."""
+        cache.set(
+            build_cache_key('Ibuprofen', {}),
+            {'alternatives': [], 'warnings': [], 'suggestion': 'cached', 'response_time_ms': 5},
+            3600
+        )
+        api_client.force_authenticate(user=doctor_user)
+        
+        url = reverse('recommendations:batch-recommendation')
+        data = {'medicines': ['Ibuprofen', 'Paracetamol', 'paracetamol']}
+        response = api_client.post(url, data, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['total'] == 2
+        assert response.data['cached_count'] == 1
+        results = {result['medicine_name']: result for result in response.data['results']}
+        assert results['Ibuprofen']['cached'] is True
+        assert results['Ibuprofen']['suggestion'] == 'cached'
+        assert results['Paracetamol']['cached'] is False
+        assert MedicineRecommendation.objects.filter(requested_by=doctor_user).count() == 2
+    
+    def test_batch_from_prescription(self, api_client, doctor_user, patient_user):
+        """Test a doctor gets recommendations for every medicine on their prescription."""
+        from records.models import Prescription
+        
+        prescription = Prescription.objects.create(
+            doctor=doctor_user.doctor_profile,
+            patient=patient_user,
+            diagnosis='Fever',
+            medicines=[
+                {'name': 'Paracetamol', 'dosage': '500mg', 'frequency': 'TDS'},
+                {'name': 'Cetirizine', 'dosage': '10mg', 'frequency': 'OD'},
+            ]
+        )
+        api_client.force_authenticate(user=doctor_user)
+        
+        url = reverse('recommendations:batch-recommendation')
+        response = api_client.post(url, {'prescription_id': prescription.id}, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [r['medicine_name'] for r in response.data['results']] == ['Paracetamol', 'Cetirizine']
+        
+        # Other patients cannot use someone else's prescription
+        other = type(patient_user).objects.create_user(
+            username='other_patient', password='testpass123', user_type='PATIENT'
+        )
+        api_client.force_authenticate(user=other)
+        response = api_client.post(url, {'prescription_id': prescription.id}, format='json')
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
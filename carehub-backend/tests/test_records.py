@@ -0,0 +1,887 @@
+"""
+Tests for medical records.
+"""
+import io
+import shutil
+import pytest
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+
+
+@pytest.mark.django_db
+class TestPrescriptionInteractions:
+    """Test interaction warnings on prescription creation."""
+    
+    def test_create_prescription_flags_interactions(self, api_client, doctor_user, patient_user):
+        """Test interacting medicines on one prescription are flagged."""
+        api_client.force_authenticate(user=doctor_user)
+        
+        data = {
+            'patient': patient_user.id,
+            'diagnosis': 'Atrial fibrillation with knee pain',
+            'medicines': [
+                {'name': 'Warfarin', 'dosage': '5mg', 'frequency': 'Once daily'},
+                {'name': 'Brufen', 'dosage': '400mg', 'frequency': 'Three times daily'},
+                {'name': 'Omeprazole', 'dosage': '20mg', 'frequency': 'Once daily'},
+            ]
+        }
+        response = api_client.post(reverse('records:create-prescription'), data, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['interaction_warnings'] == [{
+            'medicine': 'Warfarin',
+            'interacts_with': 'Brufen',
+            'severity': 'HIGH',
+            'effect': 'Increased risk of serious bleeding'
+        }]
+
+
+@pytest.mark.django_db
+class TestUploadValidation:
+    """Test uploads are validated while they stream in."""
+    
+    def upload(self, api_client, patient_user, name, content):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        api_client.force_authenticate(user=patient_user)
+        url = reverse('records:upload-report', kwargs={'patient_id': patient_user.id})
+        data = {'file': SimpleUploadedFile(name, content), 'file_type': 'LAB', 'title': 'Blood Test'}
+        return api_client.post(url, data, format='multipart')
+    
+    def test_valid_upload(self, api_client, patient_user, settings, tmp_path):
+        """Test a file matching its extension is stored with its size."""
+        settings.MEDIA_ROOT = tmp_path
+        
+        response = self.upload(api_client, patient_user, 'scan.png', b'\x89PNG\r\n\x1a\n' + b'\0' * 100)
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['report']['file_size'] == 108
+    
+    def test_rejects_content_not_matching_extension(self, api_client, patient_user):
+        """Test magic bytes are checked against the extension."""
+        response = self.upload(api_client, patient_user, 'report.pdf', b'MZ\x90\x00 not a pdf')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "does not match the 'pdf' extension" in str(response.data['file'][0])
+    
+    def test_rejects_oversize_upload_while_streaming(self, api_client, patient_user, settings):
+        """Test the upload is aborted once the size limit is crossed."""
+        from records.models import PatientReport
+        settings.MAX_UPLOAD_SIZE = 64 * 1024
+        
+        response = self.upload(api_client, patient_user, 'report.pdf', b'%PDF-' + b'0' * 200 * 1024)
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'exceeds maximum allowed size' in str(response.data['file'][0])
+        assert not PatientReport.objects.exists()
+    
+    def test_rejects_oversize_body_before_reading(self, settings):
+        """Test a Content-Length too large for any valid upload is rejected up front."""
+        from django.test import RequestFactory
+        from rest_framework.exceptions import ValidationError
+        from records.upload_handlers import ValidatingUploadHandler
+        settings.MAX_UPLOAD_SIZE = 1024
+        handler = ValidatingUploadHandler(RequestFactory().post('/'))
+        
+        with pytest.raises(ValidationError):
+            handler.handle_raw_input(None, {}, 1024 + settings.DATA_UPLOAD_MAX_MEMORY_SIZE + 1, b'boundary')
+
+
+@pytest.mark.django_db
+class TestResumableUploads:
+    """Test chunked report uploads."""
+    
+    @pytest.fixture(autouse=True)
+    def upload_dirs(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path / 'media'
+        settings.CHUNKED_UPLOAD_DIR = tmp_path / 'chunks'
+        settings.CHUNKED_UPLOAD_CHUNK_SIZE = 10
+    
+    def start(self, api_client, patient_user, content, **overrides):
+        import hashlib
+        
+        api_client.force_authenticate(user=patient_user)
+        data = {
+            'file_name': 'mri.pdf',
+            'file_type': 'MRI',
+            'title': 'Brain MRI',
+            'total_size': len(content),
+            'checksum': hashlib.sha256(content).hexdigest(),
+            **overrides
+        }
+        url = reverse('records:create-upload-session', kwargs={'patient_id': patient_user.id})
+        return api_client.post(url, data, format='json')
+    
+    def put_chunk(self, api_client, session_id, offset, data):
+        url = reverse('records:upload-chunk', kwargs={'pk': session_id, 'offset': offset})
+        return api_client.put(url, data, content_type='application/octet-stream')
+    
+    def test_chunks_in_any_order_then_complete(self, api_client, patient_user):
+        """Test chunks can be sent out of order and resumed before the report is created."""
+        from records.models import PatientReport
+        content = b'%PDF-1.7 ' + b'x' * 16
+        
+        session = self.start(api_client, patient_user, content).data
+        assert (session['total_chunks'], session['missing_offsets']) == (3, [0, 10, 20])
+        
+        assert self.put_chunk(api_client, session['id'], 20, content[20:]).status_code == status.HTTP_200_OK
+        assert self.put_chunk(api_client, session['id'], 0, content[:10]).status_code == status.HTTP_200_OK
+        complete_url = reverse('records:complete-upload', kwargs={'pk': session['id']})
+        assert api_client.post(complete_url).status_code == status.HTTP_400_BAD_REQUEST
+        assert not PatientReport.objects.exists()
+        
+        progress = api_client.get(reverse('records:upload-session-detail', kwargs={'pk': session['id']}))
+        assert progress.data['missing_offsets'] == [10]
+        self.put_chunk(api_client, session['id'], 10, content[10:20])
+        response = api_client.post(complete_url)
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        report = PatientReport.objects.get()
+        assert (report.file_type, report.file_size) == ('MRI', len(content))
+        assert report.file.read() == content
+        assert api_client.post(complete_url).status_code == status.HTTP_409_CONFLICT
+    
+    def test_completed_session_refuses_late_chunks(self, api_client, patient_user):
+        """Test a PUT after completion is refused without recreating the chunk directory."""
+        from records.chunked_uploads import session_dir, write_chunk, ChunkError
+        from records.models import UploadSession
+        content = b'%PDF-1.7 ' + b'x' * 6
+        session = self.start(api_client, patient_user, content).data
+        UploadSession.objects.filter(pk=session['id']).update(status='COMPLETE')
+        
+        response = self.put_chunk(api_client, session['id'], 0, content[:10])
+        
+        assert response.status_code == status.HTTP_409_CONFLICT
+        completed = UploadSession.objects.get(pk=session['id'])
+        with pytest.raises(ChunkError):
+            write_chunk(completed, 0, io.BytesIO(content[:10]))
+        assert not session_dir(completed).exists()
+    
+    def test_retried_chunk_does_not_disturb_one_in_flight(self, api_client, patient_user):
+        """Test each PUT writes its own temporary file before replacing the chunk."""
+        from records.chunked_uploads import chunk_path, write_chunk
+        from records.models import UploadSession
+        content = b'%PDF-1.7 ' + b'x' * 6
+        session = self.start(api_client, patient_user, content).data
+        session = UploadSession.objects.get(pk=session['id'])
+        
+        class RetryWhileReading(io.BytesIO):
+            """First PUT's body; a retry of the same chunk completes while it is read."""
+            retried = False
+            
+            def read(self, size=-1):
+                if not self.retried:
+                    self.retried = True
+                    write_chunk(session, 0, io.BytesIO(content[:10]))
+                return super().read(size)
+        
+        write_chunk(session, 0, RetryWhileReading(content[:10]))
+        
+        assert chunk_path(session, 0).read_bytes() == content[:10]
+        assert [p.name for p in chunk_path(session, 0).parent.iterdir()] == [chunk_path(session, 0).name]
+    
+    def test_chunks_kept_until_completion_commits(self, api_client, patient_user, django_capture_on_commit_callbacks):
+        """Test chunks are only deleted after the session is marked complete."""
+        from records.chunked_uploads import session_dir
+        from records.models import UploadSession
+        content = b'%PDF-1.7 ' + b'x' * 6
+        session = self.start(api_client, patient_user, content).data
+        self.put_chunk(api_client, session['id'], 0, content[:10])
+        self.put_chunk(api_client, session['id'], 10, content[10:])
+        chunks = session_dir(UploadSession.objects.get(pk=session['id']))
+        
+        with django_capture_on_commit_callbacks() as callbacks:
+            response = api_client.post(reverse('records:complete-upload', kwargs={'pk': session['id']}))
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(list(chunks.iterdir())) == 2
+        for callback in callbacks:
+            callback()
+        assert not chunks.exists()
+    
+    def test_rejects_bad_chunks_and_checksum_mismatch(self, api_client, patient_user):
+        """Test misaligned or wrongly sized chunks and corrupted files are rejected."""
+        content = b'%PDF-1.7 ' + b'x' * 6
+        session = self.start(api_client, patient_user, content).data
+        
+        assert self.put_chunk(api_client, session['id'], 5, content[5:]).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.put_chunk(api_client, session['id'], 0, content[:9]).status_code == status.HTTP_400_BAD_REQUEST
+        self.put_chunk(api_client, session['id'], 0, content[:10])
+        self.put_chunk(api_client, session['id'], 10, b'yyyyy')
+        
+        response = api_client.post(reverse('records:complete-upload', kwargs={'pk': session['id']}))
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Checksum mismatch' in response.data['error']
+        progress = api_client.get(reverse('records:upload-session-detail', kwargs={'pk': session['id']}))
+        assert progress.data['missing_offsets'] == [0, 10]
+    
+    def test_start_validates_extension_and_size(self, api_client, patient_user, settings):
+        """Test disallowed files are refused before any chunk is sent."""
+        settings.CHUNKED_UPLOAD_MAX_SIZE = 20
+        
+        assert self.start(api_client, patient_user, b'x' * 10, file_name='scan.exe').status_code == 400
+        assert self.start(api_client, patient_user, b'x' * 21).status_code == 400
+
+
+@pytest.mark.django_db
+class TestDeduplicatedStorage:
+    """Test identical files are stored once and shared."""
+    
+    def test_duplicate_report_and_attachment_share_blob(
+        self, api_client, patient_user, doctor_user, settings, tmp_path
+    ):
+        """Test the same PDF as two reports and an attachment is stored once and freed when unused."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from records.models import PatientReport, Prescription, PrescriptionAttachment, StoredBlob
+        from records.tasks import cleanup_unreferenced_blobs
+        settings.MEDIA_ROOT = tmp_path
+        content = b'%PDF-1.4 lab results'
+        
+        api_client.force_authenticate(user=patient_user)
+        upload_url = reverse('records:upload-report', kwargs={'patient_id': patient_user.id})
+        for title in ['CBC', 'CBC (again)']:
+            response = api_client.post(upload_url, {
+                'file': SimpleUploadedFile('cbc.pdf', content), 'file_type': 'LAB', 'title': title
+            }, format='multipart')
+            assert response.status_code == status.HTTP_201_CREATED
+        
+        prescription = Prescription.objects.create(
+            doctor=doctor_user.doctor_profile, patient=patient_user, diagnosis='Anaemia'
+        )
+        api_client.force_authenticate(user=doctor_user)
+        response = api_client.post(
+            reverse('records:add-attachment', kwargs={'prescription_id': prescription.id}),
+            {'file': SimpleUploadedFile('lab.pdf', content), 'prescription': prescription.id},
+            format='multipart'
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['attachment']['file_name'] == 'lab.pdf'
+        
+        blob = StoredBlob.objects.get()
+        assert blob.ref_count == 3
+        assert {report.file.name for report in PatientReport.objects.all()} == {blob.file.name}
+        assert PrescriptionAttachment.objects.get().file.read() == content
+        assert [path.name for path in tmp_path.rglob('*') if path.is_file()] == [blob.file.name.split('/')[-1]]
+        
+        PatientReport.objects.all().delete()
+        cleanup_unreferenced_blobs()
+        assert StoredBlob.objects.get().ref_count == 1
+        
+        prescription.delete()
+        cleanup_unreferenced_blobs()
+        assert not StoredBlob.objects.exists()
+        assert not any(path.is_file() for path in tmp_path.rglob('*'))
+    
+    def test_rolled_back_references_are_collected(self, settings, tmp_path):
+        """Test references and files of uploads whose rows never committed are cleaned up."""
+        import os
+        from datetime import timedelta
+        from django.core.files.base import ContentFile
+        from django.db import transaction
+        from django.utils import timezone
+        from records.blobs import UNREFERENCED_GRACE, store_blob
+        from records.models import StoredBlob
+        from records.tasks import cleanup_unreferenced_blobs
+        settings.MEDIA_ROOT = tmp_path
+        
+        # Reference taken, report row never created
+        leaked = store_blob(ContentFile(b'%PDF-1.4 leaked', name='leaked.pdf'))
+        # Blob row rolled back with the request, file already written
+        with pytest.raises(RuntimeError), transaction.atomic():
+            orphan = store_blob(ContentFile(b'%PDF-1.4 orphan', name='orphan.pdf'))
+            raise RuntimeError()
+        orphan_path = tmp_path / orphan.file.name
+        
+        cleanup_unreferenced_blobs()
+        assert StoredBlob.objects.get().ref_count == 1
+        assert orphan_path.is_file()
+        
+        past = timezone.now() - UNREFERENCED_GRACE - timedelta(minutes=1)
+        StoredBlob.objects.filter(pk=leaked.pk).update(referenced_at=past)
+        os.utime(orphan_path, (past.timestamp(), past.timestamp()))
+        cleanup_unreferenced_blobs()
+        assert not StoredBlob.objects.exists()
+        assert not any(path.is_file() for path in tmp_path.rglob('*'))
+
+
+@pytest.mark.django_db
+class TestFileDownloads:
+    """Test permission-checked report downloads."""
+    
+    @pytest.fixture
+    def report(self, patient_user, settings, tmp_path):
+        from django.core.files.base import ContentFile
+        from records.models import PatientReport
+        settings.MEDIA_ROOT = tmp_path
+        report = PatientReport(patient=patient_user, uploaded_by=patient_user, file_type='LAB', title='CBC')
+        report.file.save('cbc.pdf', ContentFile(b'%PDF-1.4 0123456789'))
+        return report
+    
+    def test_owner_downloads_with_ranges(self, api_client, patient_user, report):
+        """Test the Django fallback serves whole files and byte ranges."""
+        api_client.force_authenticate(user=patient_user)
+        url = reverse('records:download-report', kwargs={'pk': report.id})
+        
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert b''.join(response.streaming_content) == b'%PDF-1.4 0123456789'
+        assert response['Content-Type'] == 'application/pdf'
+        assert response['Content-Disposition'] == 'inline; filename="CBC.pdf"'
+        
+        response = api_client.get(url, HTTP_RANGE='bytes=9-12')
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert b''.join(response.streaming_content) == b'0123'
+        assert response['Content-Range'] == 'bytes 9-12/19'
+        
+        assert api_client.get(url, HTTP_RANGE='bytes=-4').get('Content-Range') == 'bytes 15-18/19'
+        assert api_client.get(url, HTTP_RANGE='bytes=50-').status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    
+    def test_proxy_backends_hand_off_transfer(self, api_client, patient_user, report, settings):
+        """Test nginx and sendfile backends send headers instead of the file."""
+        api_client.force_authenticate(user=patient_user)
+        url = reverse('records:download-report', kwargs={'pk': report.id})
+        
+        settings.FILE_DOWNLOAD_BACKEND = 'nginx'
+        response = api_client.get(url)
+        assert response['X-Accel-Redirect'] == f'/protected-media/{report.file.name}'
+        assert response.content == b''
+        
+        settings.FILE_DOWNLOAD_BACKEND = 'sendfile'
+        assert api_client.get(url)['X-Sendfile'] == report.file.path
+    
+    def test_serialized_urls_are_permission_checked(self, api_client, patient_user, report):
+        """Test reports expose the download view, never the storage URL."""
+        api_client.force_authenticate(user=patient_user)
+        
+        response = api_client.get(reverse('records:report-detail', kwargs={'pk': report.id}))
+        
+        download_url = 'http://testserver' + reverse('records:download-report', kwargs={'pk': report.id})
+        assert response.data['download_url'] == download_url
+        assert response.data['file_url'] == download_url
+    
+    def test_other_users_are_refused(self, api_client, report, doctor_user):
+        """Test doctors without a verified OTP cannot download a patient's report."""
+        api_client.force_authenticate(user=doctor_user)
+        
+        response = api_client.get(reverse('records:download-report', kwargs={'pk': report.id}))
+        
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestReportThumbnails:
+    """Test previews generated in the background after upload."""
+    
+    @staticmethod
+    def png(size):
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, 'PNG')
+        return buffer.getvalue()
+    
+    def test_image_upload_gets_thumbnail(
+        self, api_client, patient_user, doctor_user, monkeypatch, settings, tmp_path,
+        django_capture_on_commit_callbacks
+    ):
+        """Test an uploaded scan is given a bounded JPEG thumbnail served like the report."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        from carehub.celery import app
+        from records.models import PatientReport
+        monkeypatch.setattr(app.conf, 'task_always_eager', True)
+        settings.MEDIA_ROOT = tmp_path
+        settings.REPORT_THUMBNAIL_SIZE = 64
+        api_client.force_authenticate(user=patient_user)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse('records:upload-report', kwargs={'patient_id': patient_user.id}),
+                {'file': SimpleUploadedFile('xray.png', self.png((400, 200))), 'file_type': 'XRAY', 'title': 'Chest'},
+                format='multipart'
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+        
+        report = PatientReport.objects.get()
+        with Image.open(report.thumbnail.path) as thumbnail:
+            assert (thumbnail.format, thumbnail.size) == ('JPEG', (64, 32))
+        
+        url = reverse('records:report-thumbnail', kwargs={'pk': report.id})
+        detail = api_client.get(reverse('records:report-detail', kwargs={'pk': report.id}))
+        assert detail.data['thumbnail_url'].endswith(url)
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'image/jpeg'
+        
+        api_client.force_authenticate(user=doctor_user)
+        assert api_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_documents_without_preview(self, api_client, patient_user, settings, tmp_path):
+        """Test reports that cannot be previewed keep a null thumbnail_url."""
+        from django.core.files.base import ContentFile
+        from records.models import PatientReport
+        from records.processing import generate_thumbnail
+        settings.MEDIA_ROOT = tmp_path
+        report = PatientReport(patient=patient_user, uploaded_by=patient_user, file_type='OTHER', title='Referral')
+        report.file.save('referral.docx', ContentFile(b'PK\x03\x04 referral'))
+        
+        assert generate_thumbnail(report) is False
+        api_client.force_authenticate(user=patient_user)
+        detail = api_client.get(reverse('records:report-detail', kwargs={'pk': report.id}))
+        assert detail.data['thumbnail_url'] is None
+        assert api_client.get(
+            reverse('records:report-thumbnail', kwargs={'pk': report.id})
+        ).status_code == status.HTTP_404_NOT_FOUND
+    
+    @pytest.mark.skipif(shutil.which('pdftoppm') is None, reason='poppler-utils not installed')
+    def test_pdf_first_page_preview(self, patient_user, settings, tmp_path):
+        """Test PDFs are previewed from their first page."""
+        import io
+        from django.core.files.base import ContentFile
+        from PIL import Image
+        from records.models import PatientReport
+        from records.processing import generate_thumbnail
+        settings.MEDIA_ROOT = tmp_path
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 400), 'white').save(buffer, 'PDF')
+        report = PatientReport(patient=patient_user, uploaded_by=patient_user, file_type='LAB', title='CBC')
+        report.file.save('cbc.pdf', ContentFile(buffer.getvalue()))
+        
+        assert generate_thumbnail(report) is True
+        with Image.open(report.thumbnail.path) as thumbnail:
+            assert max(thumbnail.size) == settings.REPORT_THUMBNAIL_SIZE
+
+
+@pytest.mark.django_db
+class TestImageNormalization:
+    """Test report photos are recompressed after upload."""
+    
+    @pytest.fixture
+    def upload_photo(self, api_client, patient_user, monkeypatch, settings, tmp_path, django_capture_on_commit_callbacks):
+        import io
+        import os
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        from carehub.celery import app
+        monkeypatch.setattr(app.conf, 'task_always_eager', True)
+        settings.MEDIA_ROOT = tmp_path
+        settings.REPORT_IMAGE_MAX_DIMENSION = 300
+        api_client.force_authenticate(user=patient_user)
+        
+        # A noisy 1200x800 camera JPEG, taken rotated (EXIF orientation 6)
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (1200, 800), os.urandom(1200 * 800 * 3)).save(buffer, 'JPEG', quality=95, exif=exif)
+        photo = buffer.getvalue()
+        
+        def upload(data=photo, name='photo.jpg', file_type='LAB'):
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post(
+                    reverse('records:upload-report', kwargs={'patient_id': patient_user.id}),
+                    {'file': SimpleUploadedFile(name, data), 'file_type': file_type, 'title': 'CBC'},
+                    format='multipart'
+                )
+            assert response.status_code == status.HTTP_201_CREATED
+            return data
+        return upload
+    
+    def test_photo_is_downsampled_and_stripped(self, upload_photo):
+        """Test the stored image is rotated upright, resized, without EXIF and smaller."""
+        from PIL import Image
+        from records.models import PatientReport, StoredBlob
+        from records.tasks import cleanup_unreferenced_blobs
+        
+        photo = upload_photo()
+        
+        report = PatientReport.objects.get()
+        with Image.open(report.file.path) as image:
+            assert image.size == (200, 300)
+            assert not image.getexif()
+        assert report.file_size == report.blob.size < len(photo) / 10
+        assert report.original_blob is None
+        cleanup_unreferenced_blobs()
+        assert list(StoredBlob.objects.all()) == [report.blob]
+    
+    @pytest.mark.parametrize('name, file_type', [('chest.png', 'XRAY'), ('chest.jpg', 'XRAY'), ('cbc.png', 'LAB')])
+    def test_diagnostic_and_lossless_images_unchanged(self, upload_photo, name, file_type):
+        """Test imaging reports and PNGs are stored exactly as uploaded."""
+        import io
+        import os
+        from PIL import Image
+        from records.models import PatientReport
+        buffer = io.BytesIO()
+        Image.frombytes('L', (1200, 800), os.urandom(1200 * 800)).save(buffer, 'PNG' if name.endswith('.png') else 'JPEG')
+        
+        scan = upload_photo(buffer.getvalue(), name, file_type)
+        
+        report = PatientReport.objects.get()
+        with open(report.file.path, 'rb') as f:
+            assert f.read() == scan
+        assert report.original_blob is None
+    
+    def test_original_kept_when_configured(self, upload_photo, settings):
+        """Test REPORT_KEEP_ORIGINAL_IMAGES keeps the upload until the report is deleted."""
+        from records.models import PatientReport, StoredBlob
+        from records.tasks import cleanup_unreferenced_blobs
+        settings.REPORT_KEEP_ORIGINAL_IMAGES = True
+        
+        photo = upload_photo()
+        
+        report = PatientReport.objects.get()
+        cleanup_unreferenced_blobs()
+        assert report.original_blob.file.read() == photo
+        assert report.file_size < len(photo)
+        
+        report.delete()
+        cleanup_unreferenced_blobs()
+        assert not StoredBlob.objects.exists()
+
+
+@pytest.mark.django_db
+class TestReportSearch:
+    """Test text extraction and search over report contents."""
+    
+    @staticmethod
+    def docx(*paragraphs):
+        import io
+        import zipfile
+        body = ''.join(f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>' for text in paragraphs)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as docx:
+            docx.writestr(
+                'word/document.xml',
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{body}</w:body></w:document>'
+            )
+        return buffer.getvalue()
+    
+    def make_report(self, patient, title, name, content):
+        from django.core.files.base import ContentFile
+        from records.models import PatientReport
+        from records.processing import extract_text
+        report = PatientReport(patient=patient, uploaded_by=patient, file_type='LAB', title=title)
+        report.file.save(name, ContentFile(content))
+        extract_text(report)
+        return report
+    
+    def test_docx_text_is_extracted(self, patient_user, settings, tmp_path):
+        """Test DOCX paragraphs are stored as lines of extracted_text."""
+        settings.MEDIA_ROOT = tmp_path
+        
+        report = self.make_report(
+            patient_user, 'Discharge', 'discharge.docx', self.docx('Diagnosis: pneumonia', 'Haemoglobin 9.8 g/dL')
+        )
+        
+        report.refresh_from_db()
+        assert report.extracted_text == 'Diagnosis: pneumonia\nHaemoglobin 9.8 g/dL'
+    
+    def test_search_requires_query(self, api_client, patient_user):
+        """Test an empty query is rejected."""
+        api_client.force_authenticate(user=patient_user)
+        
+        response = api_client.get(reverse('records:search-reports', kwargs={'patient_id': patient_user.id}))
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    @pytest.mark.skipif(
+        connection.vendor != 'postgresql',
+        reason='search_vector is maintained by a PostgreSQL trigger'
+    )
+    def test_search_ranks_matching_reports(self, api_client, patient_user, settings, tmp_path):
+        """Test reports are found by their contents and ranked, title matches first."""
+        settings.MEDIA_ROOT = tmp_path
+        body = self.make_report(patient_user, 'Discharge summary', 'discharge.docx', self.docx('Treated for pneumonia'))
+        title = self.make_report(patient_user, 'Pneumonia follow-up', 'follow-up.docx', self.docx('Chest clear'))
+        self.make_report(patient_user, 'Blood count', 'cbc.docx', self.docx('Haemoglobin normal'))
+        api_client.force_authenticate(user=patient_user)
+        
+        response = api_client.get(
+            reverse('records:search-reports', kwargs={'patient_id': patient_user.id}), {'q': 'pneumonia'}
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [hit['id'] for hit in response.data['results']] == [title.id, body.id]
+        assert '<mark>pneumonia</mark>' in response.data['results'][1]['headline']
+
+
+@pytest.mark.django_db
+class TestRecordExport:
+    """Test ZIP exports of a patient's record."""
+    
+    @pytest.fixture
+    def record(self, patient_user, doctor_user, settings, tmp_path):
+        from django.core.files.base import ContentFile
+        from records.models import PatientReport, Prescription, PrescriptionAttachment
+        settings.MEDIA_ROOT = tmp_path
+        prescription = Prescription.objects.create(
+            doctor=doctor_user.doctor_profile, patient=patient_user, diagnosis='Anaemia',
+            medicines=[{'name': 'Ferrous sulfate', 'dosage': '200mg', 'frequency': 'Twice daily'}]
+        )
+        attachment = PrescriptionAttachment(prescription=prescription, file_name='lab.pdf')
+        attachment.file.save('lab.pdf', ContentFile(b'%PDF-1.4 ferritin'))
+        report = PatientReport(patient=patient_user, uploaded_by=patient_user, file_type='LAB', title='CBC')
+        report.file.save('cbc.pdf', ContentFile(b'%PDF-1.4 haemoglobin'))
+        # Same stored content as the first report
+        PatientReport.objects.create(
+            patient=patient_user, uploaded_by=patient_user, file_type='LAB', title='CBC copy', file=report.file.name
+        )
+        return prescription
+    
+    @staticmethod
+    def open_zip(content):
+        import io
+        import zipfile
+        return zipfile.ZipFile(io.BytesIO(content))
+    
+    def test_small_record_is_streamed(self, api_client, patient_user, record):
+        """Test the ZIP is streamed with a manifest and every file, shared content once."""
+        import json
+        api_client.force_authenticate(user=patient_user)
+        
+        response = api_client.post(reverse('records:export-record', kwargs={'patient_id': patient_user.id}))
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/zip'
+        archive = self.open_zip(b''.join(response.streaming_content))
+        manifest = json.loads(archive.read('manifest.json'))
+        attachment = manifest['prescriptions'][0]['attachments'][0]
+        first, copy = manifest['reports']
+        assert manifest['prescriptions'][0]['medicines'][0]['name'] == 'Ferrous sulfate'
+        assert archive.read(attachment['path']) == b'%PDF-1.4 ferritin'
+        assert archive.read(first['path']) == b'%PDF-1.4 haemoglobin'
+        assert copy['path'] == first['path']
+        assert len(archive.namelist()) == 3
+    
+    def test_names_of_only_symbols_fall_back_to_ids(self, patient_user, record):
+        """Test titles and file names that sanitize to nothing do not break the export."""
+        from django.core.files.base import ContentFile
+        from records.exports import collect_export
+        from records.models import PatientReport, PrescriptionAttachment
+        report = PatientReport(patient=patient_user, uploaded_by=patient_user, file_type='LAB', title='???')
+        report.file.save('scan.pdf', ContentFile(b'%PDF-1.4 symbols'))
+        attachment = PrescriptionAttachment(prescription=record, file_name='—')
+        attachment.file.save('other.pdf', ContentFile(b'%PDF-1.4 dash'))
+        
+        manifest, files = collect_export(patient_user)
+        
+        paths = {path for path, _ in files}
+        assert f'reports/{report.id}.pdf' in paths
+        assert f'prescriptions/{record.id}/{attachment.id}' in paths
+    
+    def test_large_record_is_built_in_background(
+        self, api_client, patient_user, record, monkeypatch, settings, django_capture_on_commit_callbacks
+    ):
+        """Test records over the streaming limit become a downloadable export job."""
+        from carehub.celery import app
+        monkeypatch.setattr(app.conf, 'task_always_eager', True)
+        settings.RECORD_EXPORT_STREAM_MAX_SIZE = 10
+        api_client.force_authenticate(user=patient_user)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(reverse('records:export-record', kwargs={'patient_id': patient_user.id}))
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['download_url'] is None
+        
+        export = api_client.get(response.data['status_url']).data
+        assert export['status'] == 'COMPLETED'
+        download = api_client.get(export['download_url'])
+        assert download.status_code == status.HTTP_200_OK
+        assert 'manifest.json' in self.open_zip(b''.join(download.streaming_content)).namelist()
+    
+    def test_other_users_cannot_export(self, api_client, doctor_user, patient_user, record):
+        """Test only the patient (or an admin) can export a record."""
+        api_client.force_authenticate(user=doctor_user)
+        
+        response = api_client.post(reverse('records:export-record', kwargs={'patient_id': patient_user.id}))
+        
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestPrescriptionHistory:
+    """Test prescription revision history."""
+    
+    @pytest.fixture
+    def revisions(self, doctor_user, patient_user):
+        from records.models import Prescription
+        original = Prescription.objects.create(
+            doctor=doctor_user.doctor_profile, patient=patient_user, diagnosis='Hypertension',
+            medicines=[{'name': 'Amlodipine', 'dosage': '5mg', 'frequency': 'Once daily'}]
+        )
+        second = original.create_revision()
+        third = second.create_revision()
+        return original, second, third
+    
+    def test_history_in_two_queries(self, api_client, patient_user, revisions, django_assert_num_queries):
+        """Test every version is returned, oldest first, from any version's id."""
+        original, second, third = revisions
+        api_client.force_authenticate(user=patient_user)
+        url = reverse('records:prescription-history', kwargs={'pk': second.id})
+        
+        # The versions, then the revisions of the compacted ones
+        with django_assert_num_queries(2):
+            response = api_client.get(url)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [(p['id'], p['version']) for p in response.data] == [(original.id, 1), (second.id, 2), (third.id, 3)]
+        assert {p['root'] for p in response.data} == {original.id}
+    
+    def test_history_of_other_patient_not_found(self, api_client, revisions):
+        """Test users cannot read the history of prescriptions they cannot see."""
+        from accounts.models import User
+        other = User.objects.create_user(
+            username='other_patient', email='other@test.com', password='testpass123', user_type='PATIENT'
+        )
+        api_client.force_authenticate(user=other)
+        
+        response = api_client.get(reverse('records:prescription-history', kwargs={'pk': revisions[0].id}))
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_list_hides_superseded_versions(self, api_client, patient_user, revisions):
+        """Test the prescription list returns only the latest version unless asked for all."""
+        api_client.force_authenticate(user=patient_user)
+        url = reverse('records:prescription-list')
+        
+        latest = api_client.get(url)
+        every = api_client.get(url, {'latest': 'false'})
+        
+        assert [p['id'] for p in latest.data['results']] == [revisions[2].id]
+        assert every.data['count'] == 3
+    
+    def test_patient_history_and_summary_count_latest_versions(self, api_client, patient_user, revisions):
+        """Test a revised prescription counts once in the patient history and summary."""
+        api_client.force_authenticate(user=patient_user)
+        
+        history = api_client.get(reverse('records:patient-prescriptions', kwargs={'patient_id': patient_user.id}))
+        every = api_client.get(
+            reverse('records:patient-prescriptions', kwargs={'patient_id': patient_user.id}), {'latest': 'false'}
+        )
+        summary = api_client.get(reverse('records:patient-summary', kwargs={'patient_id': patient_user.id}))
+        
+        assert [p['id'] for p in history.data['results']] == [revisions[2].id]
+        assert every.data['count'] == 3
+        assert summary.data['total_prescriptions'] == 1
+        assert [p['id'] for p in summary.data['recent_prescriptions']] == [revisions[2].id]
+    
+    def test_new_prescription_is_one_write(self, api_client, doctor_user, patient_user, django_assert_num_queries):
+        """Test an original is inserted without a root update and is its own history."""
+        from records.models import Prescription
+        with django_assert_num_queries(1):
+            original = Prescription.objects.create(
+                doctor=doctor_user.doctor_profile, patient=patient_user, diagnosis='Migraine'
+            )
+        
+        api_client.force_authenticate(user=patient_user)
+        response = api_client.get(reverse('records:prescription-history', kwargs={'pk': original.id}))
+        
+        assert [(p['id'], p['root']) for p in response.data] == [(original.id, original.id)]
+        assert list(original.history()) == [original]
+
+
+
+@pytest.mark.django_db
+class TestPrescriptionRevisions:
+    """Test compact storage of superseded prescription versions."""
+    
+    @pytest.mark.parametrize('old, new', [
+        ({'a': 1, 'b': [1, 2]}, {'a': 1, 'b': [1, 2]}),
+        ({'a': 1}, {'a': 2, 'c': None}),
+        ({'a': 1, 'b': 2}, {'b': 2}),
+        ([1, 2, 3], [1, 4]),
+        ([1], [1, {'x': [2]}, 3]),
+        ({'a/b': 1, 'm~n': 2}, {'a/b': 3, 'm~n': 4}),
+        ({'medicines': [{'name': 'Amlodipine', 'dosage': '5mg'}]}, {'medicines': [{'name': 'Amlodipine', 'dosage': '10mg'}]}),
+        ('text', {'now': 'an object'}),
+    ])
+    def test_patch_round_trip(self, old, new):
+        """Test applying the patch between two documents turns the first into the second."""
+        from records.revisions import apply_patch, make_patch
+        patch = make_patch(old, new)
+        
+        assert apply_patch(old, patch) == new
+        assert (patch == []) == (old == new)
+    
+    def test_dosage_change_is_one_operation(self):
+        """Test a single changed dosage produces a single replace."""
+        from records.revisions import make_patch
+        old = {'diagnosis': 'Hypertension', 'medicines': [
+            {'name': 'Amlodipine', 'dosage': '5mg'}, {'name': 'Aspirin', 'dosage': '75mg'}
+        ]}
+        new = {'diagnosis': 'Hypertension', 'medicines': [
+            {'name': 'Amlodipine', 'dosage': '10mg'}, {'name': 'Aspirin', 'dosage': '75mg'}
+        ]}
+        
+        assert make_patch(old, new) == [{'op': 'replace', 'path': '/medicines/0/dosage', 'value': '10mg'}]
+    
+    def test_bad_patch_raises(self):
+        """Test patches that do not fit the document are rejected."""
+        from records.revisions import PatchError, apply_patch
+        with pytest.raises(PatchError):
+            apply_patch({'a': 1}, [{'op': 'remove', 'path': '/b'}])
+        with pytest.raises(PatchError):
+            apply_patch({'a': [1]}, [{'op': 'replace', 'path': '/a/5', 'value': 2}])
+    
+    def test_revision_chain_round_trip(self, settings, api_client, doctor_user, patient_user):
+        """Test every version of a long history reads back as written."""
+        from datetime import date
+        from records.models import Prescription, PrescriptionRevision
+        settings.PRESCRIPTION_SNAPSHOT_INTERVAL = 3
+        
+        latest = Prescription.objects.create(
+            doctor=doctor_user.doctor_profile, patient=patient_user, diagnosis='Hypertension',
+            treatment_plan='Low-salt diet', follow_up_date=date(2026, 1, 1),
+            medicines=[{'name': 'Amlodipine', 'dosage': '5mg', 'frequency': 'Once daily'}]
+        )
+        written = {1: latest.get_content()}
+        for version in range(2, 9):
+            medicines = [dict(medicine) for medicine in latest.medicines]
+            medicines[0]['dosage'] = f'{version * 5}mg'
+            if version == 5:
+                medicines.append({'name': 'Aspirin', 'dosage': '75mg', 'frequency': 'Once daily'})
+            changes = {'medicines': medicines}
+            if version == 6:
+                changes.update(follow_up_date=date(2026, 3, 1), doctor_notes='Review in clinic')
+            latest = latest.create_revision(**changes)
+            written[version] = latest.get_content()
+        
+        stored = {r.version: r for r in PrescriptionRevision.objects.filter(root_id=latest.root_id)}
+        assert sorted(stored) == list(range(1, 8))
+        assert [v for v, r in sorted(stored.items()) if r.snapshot is not None] == [1, 4, 7]
+        assert stored[2].delta == [{'op': 'replace', 'path': '/medicines/0/dosage', 'value': '10mg'}]
+        
+        # Superseded rows keep no content of their own
+        rows = Prescription.objects.filter(root_id=latest.root_id).values_list('version', 'is_compacted', 'diagnosis')
+        assert sorted(rows) == [(v, True, '') for v in range(1, 8)] + [(8, False, 'Hypertension')]
+        
+        assert {p.version: p.get_content() for p in latest.history()} == written
+        assert Prescription.objects.get(root_id=latest.root_id, version=6).follow_up_date == date(2026, 3, 1)
+        assert latest.previous_version.get_content() == written[7]
+        
+        api_client.force_authenticate(user=patient_user)
+        response = api_client.get(reverse('records:prescription-history', kwargs={'pk': latest.id}))
+        assert [p['medicines'][0]['dosage'] for p in response.data] == [f'{v * 5}mg' for v in range(1, 9)]
+    
+    def test_only_latest_version_can_be_revised(self, doctor_user, patient_user):
+        """Test revising a superseded version or a non-content field is rejected."""
+        from records.models import Prescription
+        original = Prescription.objects.create(
+            doctor=doctor_user.doctor_profile, patient=patient_user, diagnosis='Hypertension'
+        )
+        stale = Prescription.objects.get(pk=original.pk)
+        second = original.create_revision(diagnosis='Essential hypertension')
+        
+        # A copy loaded before the revision, as a concurrent request would hold
+        with pytest.raises(ValueError):
+            stale.create_revision(diagnosis='Hypertension, stage 2')
+        assert Prescription.objects.filter(root_id=original.pk).count() == 2
+        with pytest.raises(ValueError):
+            original.create_revision()
+        with pytest.raises(ValueError):
+            Prescription.objects.get(pk=original.pk).create_revision()
+        with pytest.raises(ValueError):
+            second.create_revision(patient=doctor_user)
+        assert Prescription.objects.get(pk=original.pk).diagnosis == 'Hypertension'